@@ -1,14 +1,18 @@
 from ipaddress import IPv4Address, IPv4Network
 
+import jwt
 from flask import request, _request_ctx_stack, current_app, g
 from notifications_python_client.authentication import decode_jwt_token, get_token_issuer
 from notifications_python_client.errors import TokenDecodeError, TokenExpiredError, TokenIssuerError
 from sqlalchemy.exc import DataError
 from sqlalchemy.orm.exc import NoResultFound
 
-from app.dao.services_dao import dao_fetch_service_by_id_with_api_keys
+from app.dao.services_dao import dao_fetch_cached_service_by_id_with_api_keys
 from flask import jsonify
 
+# service id -> id of the api key that service last authenticated with, so it can be checked first next time
+last_used_api_key_ids = {}
+
 
 class AuthError(Exception):
     def __init__(self, message, code):
@@ -147,7 +151,7 @@ def requires_auth():
     client = __get_token_issuer(auth_token)
 
     try:
-        service = dao_fetch_service_by_id_with_api_keys(client)
+        service = dao_fetch_cached_service_by_id_with_api_keys(client)
     except DataError:
         raise AuthError("Invalid token: service id is not the right data type", 403)
     except NoResultFound:
@@ -159,7 +163,7 @@ def requires_auth():
     if not service.active:
         raise AuthError("Invalid token: service is archived", 403)
 
-    for api_key in service.api_keys:
+    for api_key in _api_keys_in_likely_order(auth_token, service):
         try:
             get_decode_errors(auth_token, api_key.secret)
         except TokenDecodeError:
@@ -168,6 +172,7 @@ def requires_auth():
         if api_key.expiry_date:
             raise AuthError("Invalid token: API key revoked", 403)
 
+        last_used_api_key_ids[str(service.id)] = str(api_key.id)
         g.service_id = api_key.service_id
         _request_ctx_stack.top.authenticated_service = service
         _request_ctx_stack.top.api_user = api_key
@@ -178,6 +183,22 @@ def requires_auth():
         raise AuthError("Invalid token: signature, api token is not valid", 403)
 
 
+def _api_keys_in_likely_order(auth_token, service):
+    """
+    Each key's secret has to be decrypted and checked against the token's signature, so start with the key named by
+    the token's `kid` header if it has one, then the key the service last used - usually only one check is needed.
+    """
+    likely_key_ids = [
+        jwt.get_unverified_header(auth_token).get('kid'),
+        last_used_api_key_ids.get(str(service.id))
+    ]
+
+    def likelihood(api_key):
+        return likely_key_ids.index(str(api_key.id)) if str(api_key.id) in likely_key_ids else len(likely_key_ids)
+
+    return sorted(service.api_keys, key=likelihood)
+
+
 def __get_token_issuer(auth_token):
     try:
         client = get_token_issuer(auth_token)
@@ -1,3 +1,4 @@
+import codecs
 from datetime import datetime, timedelta
 
 from flask import current_app
@@ -25,6 +26,40 @@ def get_job_from_s3(service_id, job_id):
     return obj.get()['Body'].read().decode('utf-8')
 
 
+def stream_job_from_s3(service_id, job_id, start_byte=0):
+    """
+    Yields the lines of a job's CSV file as they are read from S3, rather than reading the whole body into memory.
+
+    The body is read in fixed size chunks and decoded incrementally, so multi-byte characters and line endings that
+    straddle a chunk boundary are handled correctly. If start_byte is given only the rest of the file from there is
+    fetched - it must be the start of a line. Close the generator if you stop reading before the end of the file.
+    """
+    bucket_name = current_app.config['CSV_UPLOAD_BUCKET_NAME']
+    file_location = FILE_LOCATION_STRUCTURE.format(service_id, job_id)
+    chunk_size = current_app.config['S3_JOB_READ_CHUNK_SIZE']
+    s3_object = get_s3_object(bucket_name, file_location)
+    if start_byte:
+        body = s3_object.get(Range='bytes={}-'.format(start_byte))['Body']
+    else:
+        body = s3_object.get()['Body']
+
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    remainder = ''
+    try:
+        for chunk in iter(lambda: body.read(chunk_size), b''):
+            lines = (remainder + decoder.decode(chunk)).splitlines(keepends=True)
+            # the last line may be incomplete (or be a '\r' whose '\n' is in the next chunk) so hold it back
+            remainder = lines.pop() if lines else ''
+            yield from lines
+
+        remainder += decoder.decode(b'', final=True)
+        if remainder:
+            yield remainder
+    finally:
+        # also run if the caller closes the generator part way through the file, so the connection is given back
+        body.close()
+
+
 def remove_job_from_s3(service_id, job_id):
     bucket_name = current_app.config['CSV_UPLOAD_BUCKET_NAME']
     file_location = FILE_LOCATION_STRUCTURE.format(service_id, job_id)
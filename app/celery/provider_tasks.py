@@ -9,6 +9,7 @@ from app.dao import notifications_dao
 from app.dao.notifications_dao import update_notification_status_by_id
 from app.statsd_decorators import statsd
 from app.delivery import send_to_providers
+from app.delivery.throttle import ProviderThrottledException
 
 
 @worker_process_shutdown.connect
@@ -24,6 +25,8 @@ def deliver_sms(self, notification_id):
         if not notification:
             raise NoResultFound()
         send_to_providers.send_sms_to_provider(notification)
+    except ProviderThrottledException:
+        retry_throttled(self, notification_id)
     except Exception as e:
         try:
             current_app.logger.exception(
@@ -37,6 +40,52 @@ def deliver_sms(self, notification_id):
             update_notification_status_by_id(notification_id, 'technical-failure')
 
 
+@notify_celery.task(bind=True, name="deliver_sms_batch", max_retries=48, default_retry_delay=300)
+@statsd(namespace="tasks")
+def deliver_sms_batch(self, notification_ids):
+    try:
+        notifications = notifications_dao.dao_get_notifications_by_ids(notification_ids)
+        send_individually = send_to_providers.send_sms_batch_to_provider(notifications)
+    except ProviderThrottledException:
+        current_app.logger.info("Provider throttled, deferring batch of {} notifications".format(len(notification_ids)))
+        try:
+            self.retry(queue=QueueNames.RETRY, countdown=current_app.config['PROVIDER_THROTTLE_RETRY_DELAY_SECONDS'])
+        except self.MaxRetriesExceededError:
+            send_individually = notification_ids
+    except Exception:
+        # send_sms_batch_to_provider doesn't raise once the provider has the messages, so none of them were sent
+        current_app.logger.exception(
+            "SMS batch delivery of {} notifications failed, sending them individually".format(len(notification_ids))
+        )
+        send_individually = notification_ids
+
+    for notification_id in send_individually:
+        deliver_sms.apply_async([str(notification_id)], queue=QueueNames.SEND_BULK)
+
+
+@notify_celery.task(bind=True, name="deliver_email_batch", max_retries=48, default_retry_delay=300)
+@statsd(namespace="tasks")
+def deliver_email_batch(self, notification_ids):
+    try:
+        notifications = notifications_dao.dao_get_notifications_by_ids(notification_ids)
+        send_individually = send_to_providers.send_email_batch_to_provider(notifications)
+    except ProviderThrottledException:
+        current_app.logger.info("Provider throttled, deferring batch of {} notifications".format(len(notification_ids)))
+        try:
+            self.retry(queue=QueueNames.RETRY, countdown=current_app.config['PROVIDER_THROTTLE_RETRY_DELAY_SECONDS'])
+        except self.MaxRetriesExceededError:
+            send_individually = notification_ids
+    except Exception:
+        # send_email_batch_to_provider doesn't raise once the provider has the messages, so none of them were sent
+        current_app.logger.exception(
+            "Email batch delivery of {} notifications failed, sending them individually".format(len(notification_ids))
+        )
+        send_individually = notification_ids
+
+    for notification_id in send_individually:
+        deliver_email.apply_async([str(notification_id)], queue=QueueNames.SEND_BULK)
+
+
 @notify_celery.task(bind=True, name="deliver_email", max_retries=48, default_retry_delay=300)
 @statsd(namespace="tasks")
 def deliver_email(self, notification_id):
@@ -45,6 +94,8 @@ def deliver_email(self, notification_id):
         if not notification:
             raise NoResultFound()
         send_to_providers.send_email_to_provider(notification)
+    except ProviderThrottledException:
+        retry_throttled(self, notification_id)
     except InvalidEmailError as e:
         current_app.logger.exception(e)
         update_notification_status_by_id(notification_id, 'technical-failure')
@@ -59,3 +110,18 @@ def deliver_email(self, notification_id):
                 "RETRY FAILED: task send_email_to_provider failed for notification {}".format(notification_id)
             )
             update_notification_status_by_id(notification_id, 'technical-failure')
+
+
+def retry_throttled(task, notification_id):
+    """
+    The provider is already sending as fast as it can, so come back to the notification shortly rather than waiting
+    for the usual retry delay. Priority sends go back on the priority queue so they don't wait behind other retries.
+    """
+    current_app.logger.info("Provider throttled, deferring {} for {}".format(task.name, notification_id))
+    delivery_info = task.request.delivery_info or {}
+    queue = QueueNames.PRIORITY if delivery_info.get('routing_key') == QueueNames.PRIORITY else QueueNames.RETRY
+    try:
+        task.retry(queue=queue, countdown=current_app.config['PROVIDER_THROTTLE_RETRY_DELAY_SECONDS'])
+    except task.MaxRetriesExceededError:
+        current_app.logger.error("RETRY FAILED: task {} throttled for {}".format(task.name, notification_id))
+        update_notification_status_by_id(notification_id, 'technical-failure')
@@ -5,7 +5,7 @@ from datetime import (
 
 from celery.signals import worker_process_shutdown
 from flask import current_app
-from sqlalchemy import and_
+from sqlalchemy import and_, func
 from sqlalchemy.exc import SQLAlchemyError
 from notifications_utils.s3 import s3upload
 
@@ -18,6 +18,7 @@ from app.dao.stats_template_usage_by_month_dao import insert_or_update_stats_for
 from app.performance_platform import total_sent_notifications, processing_time
 from app import performance_platform_client
 from app.dao.date_util import get_month_start_and_end_date_in_utc
+from app.dao.fact_notification_status_dao import update_fact_notification_status
 from app.dao.inbound_sms_dao import delete_inbound_sms_created_more_than_a_week_ago
 from app.dao.invited_user_dao import delete_invitations_created_more_than_two_days_ago
 from app.dao.jobs_dao import (
@@ -25,10 +26,7 @@ from app.dao.jobs_dao import (
     dao_set_scheduled_jobs_to_pending,
     dao_get_jobs_older_than_limited_by
 )
-from app.dao.monthly_billing_dao import (
-    get_service_ids_that_need_billing_populated,
-    create_or_update_monthly_billing
-)
+from app.dao.monthly_billing_dao import create_or_update_monthly_billing_for_all_services
 from app.dao.notifications_dao import (
     dao_timeout_notifications,
     is_delivery_slow_for_provider,
@@ -258,6 +256,14 @@ def switch_current_sms_provider_on_slow_delivery():
             dao_toggle_sms_provider(current_provider.identifier)
 
 
+@notify_celery.task(name='update-fact-notification-status')
+@statsd(namespace="tasks")
+def update_fact_notification_status_for_recent_days():
+    today = convert_utc_to_bst(datetime.utcnow()).date()
+    for days_ago in range(1, current_app.config['FACT_NOTIFICATION_STATUS_DAYS_TO_REFRESH'] + 1):
+        update_fact_notification_status(today - timedelta(days=days_ago))
+
+
 @notify_celery.task(name='timeout-job-statistics')
 @statsd(namespace="tasks")
 def timeout_job_statistics():
@@ -327,9 +333,8 @@ def populate_monthly_billing():
     # this will overwrite the existing amount.
     yesterday = datetime.utcnow() - timedelta(days=1)
     yesterday_in_bst = convert_utc_to_bst(yesterday)
-    start_date, end_date = get_month_start_and_end_date_in_utc(yesterday_in_bst)
-    services = get_service_ids_that_need_billing_populated(start_date=start_date, end_date=end_date)
-    [create_or_update_monthly_billing(service_id=s.service_id, billing_month=end_date) for s in services]
+    _, end_date = get_month_start_and_end_date_in_utc(yesterday_in_bst)
+    create_or_update_monthly_billing_for_all_services(billing_month=end_date)
 
 
 @notify_celery.task(name="run-letter-jobs")
@@ -386,6 +391,8 @@ def check_job_status():
     where job_status == 'in progress'
     and template_type in ('sms', 'email')
     and scheduled_at or created_at is older that 30 minutes.
+    and it hasn't been updated for 30 minutes - big jobs are processed a slice at a time, updating the job after
+    each one, so they can still be making progress after 30 minutes.
     if any results then
         raise error
         process the rows in the csv that are missing (in another task) just do the check here.
@@ -393,9 +400,12 @@ def check_job_status():
     thirty_minutes_ago = datetime.utcnow() - timedelta(minutes=30)
     thirty_five_minutes_ago = datetime.utcnow() - timedelta(minutes=35)
 
+    last_progress = func.coalesce(Job.updated_at, Job.processing_started)
+
     jobs_not_complete_after_30_minutes = Job.query.filter(
         Job.job_status == JOB_STATUS_IN_PROGRESS,
-        and_(thirty_five_minutes_ago < Job.processing_started, Job.processing_started < thirty_minutes_ago)
+        Job.processing_started < thirty_minutes_ago,
+        and_(thirty_five_minutes_ago < last_progress, last_progress < thirty_minutes_ago)
     ).order_by(Job.processing_started).all()
 
     job_ids = [str(x.id) for x in jobs_not_complete_after_30_minutes]
@@ -1,29 +1,126 @@
+from collections import Counter
+
 from celery.signals import worker_process_shutdown
 from sqlalchemy.exc import SQLAlchemyError
 
-from app import notify_celery
+from app import notify_celery, redis_store
 from flask import current_app
 
 from app.statsd_decorators import statsd
 from app.dao.statistics_dao import (
     create_or_update_job_sending_statistics,
-    update_job_stats_outcome_count
+    dao_add_job_statistics_counts,
+    update_job_stats_outcome_count,
+    update_job_stats_outcome_counts
 )
 from app.dao.notifications_dao import get_notification_by_id
-from app.models import NOTIFICATION_STATUS_TYPES_COMPLETED
+from app.models import (
+    LETTER_TYPE,
+    NOTIFICATION_STATUS_SUCCESS,
+    NOTIFICATION_STATUS_TYPES_COMPLETED,
+    NOTIFICATION_STATUS_TYPES_FAILED
+)
 from app.config import QueueNames
 
+JOB_STATISTICS_CACHE_KEY = 'job-statistics-counts'
+
+# KEYS: the job statistics counts hash
+TAKE_JOB_STATISTICS_SCRIPT = """
+local counts = redis.call('HGETALL', KEYS[1])
+redis.call('DEL', KEYS[1])
+return counts
+"""
+
 
 def create_initial_notification_statistic_tasks(notification):
     if notification.job_id and notification.status:
+        if increment_cached_job_statistics(
+            Counter({(str(notification.job_id), notification.notification_type, 'sent'): 1})
+        ):
+            return
         record_initial_job_statistics.apply_async((str(notification.id),), queue=QueueNames.STATISTICS)
 
 
 def create_outcome_notification_statistic_tasks(notification):
     if notification.job_id and notification.status in NOTIFICATION_STATUS_TYPES_COMPLETED:
+        outcome = _job_statistics_outcome(notification)
+        if outcome and increment_cached_job_statistics(
+            Counter({(str(notification.job_id), notification.notification_type, outcome): 1})
+        ):
+            return
         record_outcome_job_statistics.apply_async((str(notification.id),), queue=QueueNames.STATISTICS)
 
 
+def create_outcome_job_statistic_tasks(notifications):
+    """
+    Records the outcomes of a batch of notifications with one task per job, rather than one per notification.
+    """
+    counts = Counter()
+    for notification in notifications:
+        outcome = _job_statistics_outcome(notification)
+        if notification.job_id and outcome:
+            counts[(str(notification.job_id), notification.notification_type, outcome)] += 1
+
+    if not counts or increment_cached_job_statistics(counts):
+        return
+
+    for job_id, notification_type in {(job_id, notification_type) for job_id, notification_type, _ in counts}:
+        record_outcome_job_statistics_counts.apply_async(
+            (
+                job_id,
+                notification_type,
+                counts[(job_id, notification_type, 'delivered')],
+                counts[(job_id, notification_type, 'failed')]
+            ),
+            queue=QueueNames.STATISTICS
+        )
+
+
+def _job_statistics_outcome(notification):
+    if notification.status in NOTIFICATION_STATUS_TYPES_FAILED:
+        return 'failed'
+    if notification.status in NOTIFICATION_STATUS_SUCCESS and notification.notification_type != LETTER_TYPE:
+        return 'delivered'
+    return None
+
+
+def increment_cached_job_statistics(counts):
+    """
+    Adds to the job statistics counts kept in redis, which flush_job_statistics writes to the database every
+    JOB_STATISTICS_FLUSH_INTERVAL_SECONDS. This saves a task per notification, and every worker queueing to update
+    the same job statistics row.
+
+    counts maps (job_id, notification_type, 'sent', 'delivered' or 'failed') to the number to add. Returns False if
+    redis isn't available, in which case the caller should record the statistics itself.
+    """
+    if not redis_store.active:
+        return False
+
+    try:
+        pipe = redis_store.redis_store.pipeline()
+        for (job_id, notification_type, outcome), count in counts.items():
+            pipe.hincrby(JOB_STATISTICS_CACHE_KEY, '{}:{}:{}'.format(job_id, notification_type, outcome), count)
+        pipe.execute()
+    except Exception:
+        current_app.logger.exception('Redis error incrementing cached job statistics')
+        return False
+    return True
+
+
+def take_cached_job_statistics():
+    if not redis_store.active:
+        return Counter()
+
+    flat_counts = redis_store.redis_store.register_script(TAKE_JOB_STATISTICS_SCRIPT)(keys=[JOB_STATISTICS_CACHE_KEY])
+    counts = Counter()
+    for field, count in zip(flat_counts[::2], flat_counts[1::2]):
+        if isinstance(field, bytes):
+            field = field.decode('utf-8')
+        job_id, notification_type, outcome = field.split(':')
+        counts[(job_id, notification_type, outcome)] = int(count)
+    return counts
+
+
 @worker_process_shutdown.connect
 def worker_process_shutdown(sender, signal, pid, exitcode):
     current_app.logger.info('Statistics worker shutdown: PID: {} Exitcode: {}'.format(pid, exitcode))
@@ -71,3 +168,34 @@ def record_outcome_job_statistics(self, notification_id):
                 notification.id if notification else "missing ID"
             )
         )
+
+
+@notify_celery.task(bind=True, name='record_outcome_job_statistics_counts', max_retries=20, default_retry_delay=10)
+@statsd(namespace="tasks")
+def record_outcome_job_statistics_counts(self, job_id, notification_type, delivered_count, failed_count):
+    try:
+        if update_job_stats_outcome_counts(job_id, notification_type, delivered_count, failed_count) == 0:
+            self.retry(queue=QueueNames.RETRY)
+    except SQLAlchemyError as e:
+        current_app.logger.exception(e)
+        self.retry(queue=QueueNames.RETRY)
+    except self.MaxRetriesExceededError:
+        current_app.logger.error(
+            "RETRY FAILED: task record_outcome_job_statistics_counts failed for job {}".format(job_id)
+        )
+
+
+@notify_celery.task(name='flush-job-statistics')
+@statsd(namespace="tasks")
+def flush_job_statistics():
+    counts = take_cached_job_statistics()
+    if not counts:
+        return
+
+    try:
+        dao_add_job_statistics_counts(counts)
+    except SQLAlchemyError:
+        # put them back for the next run rather than losing them
+        current_app.logger.exception("Error flushing statistics for {} jobs".format(len(counts)))
+        increment_cached_job_statistics(counts)
+        raise
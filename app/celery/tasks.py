@@ -1,6 +1,11 @@
+import csv
+import io
+import itertools
 import json
 from datetime import datetime
 from collections import namedtuple
+from contextlib import closing
+from time import monotonic
 
 from celery.signals import worker_process_shutdown
 from flask import current_app
@@ -14,7 +19,6 @@ from notifications_utils.template import (
 )
 from requests import (
     HTTPError,
-    request,
     RequestException
 )
 from sqlalchemy.exc import SQLAlchemyError
@@ -27,6 +31,7 @@ from app import (
 )
 from app.aws import s3
 from app.celery import provider_tasks
+from app.clients import get_http_session
 from app.config import QueueNames
 from app.dao.inbound_sms_dao import dao_get_inbound_sms_by_id
 from app.dao.jobs_dao import (
@@ -45,7 +50,7 @@ from app.dao.notifications_dao import (
 from app.dao.provider_details_dao import get_current_provider
 from app.dao.service_inbound_api_dao import get_service_inbound_api_for_service
 from app.dao.services_dao import dao_fetch_service_by_id, fetch_todays_total_message_count
-from app.dao.templates_dao import dao_get_template_by_id
+from app.dao.templates_dao import dao_get_template_version_dict
 from app.models import (
     DVLA_RESPONSE_STATUS_SENT,
     EMAIL_TYPE,
@@ -62,8 +67,17 @@ from app.models import (
     NOTIFICATION_TECHNICAL_FAILURE,
     SMS_TYPE,
 )
-from app.notifications.process_notifications import persist_notification
+from app.notifications.process_notifications import (
+    build_notification,
+    persist_notification,
+    persist_notifications
+)
 from app.notifications.notifications_ses_callback import process_ses_response
+from app.notifications.process_client_response import (
+    apply_status_updates,
+    return_status_updates_to_buffer,
+    take_buffered_status_updates
+)
 from app.service.utils import service_allowed_to_send_to
 from app.statsd_decorators import statsd
 from notifications_utils.s3 import s3upload
@@ -99,21 +113,62 @@ def process_job(job_id):
     job.processing_started = start
     dao_update_job(job)
 
-    db_template = dao_get_template_by_id(job.template_id, job.template_version)
+    template_dict = dao_get_template_version_dict(job.template_id, job.template_version)
 
-    TemplateClass = get_template_class(db_template.template_type)
-    template = TemplateClass(db_template.__dict__)
+    TemplateClass = get_template_class(template_dict['template_type'])
+    template = TemplateClass(template_dict)
 
     current_app.logger.info("Starting job {} processing {} notifications".format(job_id, job.notification_count))
 
-    for row_number, recipient, personalisation in RecipientCSV(
-            s3.get_job_from_s3(str(service.id), str(job_id)),
-            template_type=template.template_type,
-            placeholders=template.placeholders
-    ).enumerated_recipients_and_personalisation:
-        process_row(row_number, recipient, personalisation, template, job, service)
+    process_job_slice_from(job, template, service, JobPosition(row_number=0, byte_offset=0, header=None))
+
+
+@notify_celery.task(name="process-job-slice")
+@statsd(namespace="tasks")
+def process_job_slice(job_id, row_number, byte_offset, header=None):
+    job = dao_get_job_by_id(job_id)
+
+    if job.job_status != JOB_STATUS_IN_PROGRESS:
+        current_app.logger.info("Job {} is {}, not processing from row {}".format(job_id, job.job_status, row_number))
+        return
+
+    template_dict = dao_get_template_version_dict(job.template_id, job.template_version)
+    template = get_template_class(template_dict['template_type'])(template_dict)
+
+    process_job_slice_from(job, template, job.service, JobPosition(row_number, byte_offset, header))
 
-    job_complete(job, service, template.template_type, start=start)
+
+def process_job_slice_from(job, template, service, position):
+    """
+    Processes up to JOB_ROWS_PER_SLICE rows of the job starting from position, then puts a process_job_slice task for
+    the rest of the job on the back of the jobs queue. Every running job gets a turn in between, rather than the first
+    job to start filling the queues with all of its rows before anyone else's are looked at. The next slice is held
+    back if needed to keep each job to JOB_MAX_ROWS_PER_SECOND.
+    """
+    slice_started = monotonic()
+    rows_processed = 0
+
+    with closing(get_job_row_chunks(job, template, position)) as chunks:
+        for rows, next_position in chunks:
+            process_rows(rows, template, job, service)
+            rows_processed += len(rows)
+
+            if rows_processed >= current_app.config['JOB_ROWS_PER_SLICE']:
+                # stops the job being picked up as stalled by check_job_status while it is still making progress
+                job.updated_at = datetime.utcnow()
+                dao_update_job(job)
+
+                countdown = (
+                    rows_processed / current_app.config['JOB_MAX_ROWS_PER_SECOND'] - (monotonic() - slice_started)
+                )
+                process_job_slice.apply_async(
+                    [str(job.id), next_position.row_number, next_position.byte_offset, next_position.header],
+                    queue=QueueNames.JOBS,
+                    countdown=max(0, countdown)
+                )
+                return
+
+    job_complete(job, service, template.template_type, start=job.processing_started)
 
 
 def job_complete(job, service, template_type, resumed=False, start=None):
@@ -140,6 +195,138 @@ def job_complete(job, service, template_type, resumed=False, start=None):
         )
 
 
+JobPosition = namedtuple('JobPosition', ['row_number', 'byte_offset', 'header'])
+
+
+def get_recipients_and_personalisation_for_job(job, template):
+    """
+    Streams the job's CSV from S3 and yields (row_number, recipient, personalisation) a chunk of rows at a time, so
+    rows can be sent as soon as they are read and memory use doesn't grow with the size of the file.
+    """
+    with closing(get_job_row_chunks(job, template, JobPosition(row_number=0, byte_offset=0, header=None))) as chunks:
+        for rows, _ in chunks:
+            yield from rows
+
+
+def get_job_row_chunks(job, template, start):
+    """
+    Streams the job's CSV from S3 from the start position, yielding the (row_number, recipient, personalisation) of
+    each chunk of JOB_CSV_ROWS_PER_CHUNK rows along with the position just after the chunk.
+
+    Each chunk is given the header row and parsed with RecipientCSV, and its row numbers are offset so they match
+    the row's position in the whole file. Past the first row only the rest of the file is fetched from S3, and the
+    header comes from the start position. The S3 stream is closed when the generator is.
+    """
+    service_id, job_id = str(job.service_id), str(job.id)
+    header = start.header
+    if start.byte_offset and header is None:
+        # slices queued before the header was passed along with the position
+        with closing(s3.stream_job_from_s3(service_id, job_id)) as header_lines:
+            header = next(filter(None, _csv_reader(header_lines)), None)
+
+    stream = s3.stream_job_from_s3(service_id, job_id, start.byte_offset)
+    try:
+        lines = _ByteCountingLines(stream, start.byte_offset)
+        csv_rows = _csv_reader(lines)
+        if not start.byte_offset:
+            header = next(filter(None, csv_rows), None)
+        if header is None:
+            return
+
+        offset = start.row_number
+        for chunk in _chunks(csv_rows, current_app.config['JOB_CSV_ROWS_PER_CHUNK']):
+            rows = [
+                (row_number + offset, recipient, personalisation)
+                for row_number, recipient, personalisation in RecipientCSV(
+                    _to_csv_string([header] + chunk),
+                    template_type=template.template_type,
+                    placeholders=template.placeholders
+                ).enumerated_recipients_and_personalisation
+            ]
+            offset += len(chunk)
+            # the csv reader only takes the lines it needs, so this is the offset of the start of the next row
+            yield rows, JobPosition(row_number=offset, byte_offset=lines.byte_offset, header=header)
+    finally:
+        stream.close()
+
+
+class _ByteCountingLines:
+    def __init__(self, lines, byte_offset):
+        self._lines = lines
+        self.byte_offset = byte_offset
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        line = next(self._lines)
+        self.byte_offset += len(line.encode('utf-8'))
+        return line
+
+
+def _csv_reader(lines):
+    # the same dialect RecipientCSV parses with, so a row's fields survive being written out again for it
+    return csv.reader(lines, skipinitialspace=True)
+
+
+def _to_csv_string(rows):
+    output = io.StringIO()
+    csv.writer(output, lineterminator='\n').writerows(rows)
+    return output.getvalue()
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    chunk = list(itertools.islice(iterator, size))
+    while chunk:
+        yield chunk
+        chunk = list(itertools.islice(iterator, size))
+
+
+def process_rows(rows, template, job, service):
+    """
+    SMS and email rows are saved in batches of JOB_SAVE_BATCH_SIZE, one task per batch. Letters are still saved a
+    row at a time.
+    """
+    if template.template_type == LETTER_TYPE:
+        for row_number, recipient, personalisation in rows:
+            process_row(row_number, recipient, personalisation, template, job, service)
+        return
+
+    for batch in _chunks(rows, current_app.config['JOB_SAVE_BATCH_SIZE']):
+        process_row_batch(batch, template, job, service)
+
+
+def process_row_batch(rows, template, job, service):
+    encrypted = encryption.encrypt([
+        {
+            'id': create_uuid(),
+            'template': str(template.id),
+            'template_version': job.template_version,
+            'job': str(job.id),
+            'to': recipient,
+            'row_number': row_number,
+            'personalisation': dict(personalisation)
+        }
+        for row_number, recipient, personalisation in rows
+    ])
+
+    send_fns = {
+        SMS_TYPE: save_sms_batch,
+        EMAIL_TYPE: save_email_batch
+    }
+
+    send_fn = send_fns[template.template_type]
+
+    send_fn.apply_async(
+        (
+            str(service.id),
+            encrypted,
+        ),
+        queue=QueueNames.DATABASE if not service.research_mode else QueueNames.RESEARCH_MODE
+    )
+
+
 def process_row(row_number, recipient, personalisation, template, job, service):
     template_type = template.template_type
     encrypted = encryption.encrypt({
@@ -219,7 +406,7 @@ def save_sms(self,
 
         provider_tasks.deliver_sms.apply_async(
             [str(saved_notification.id)],
-            queue=QueueNames.SEND_SMS if not service.research_mode else QueueNames.RESEARCH_MODE
+            queue=QueueNames.SEND_BULK if not service.research_mode else QueueNames.RESEARCH_MODE
         )
 
         current_app.logger.info(
@@ -266,7 +453,7 @@ def save_email(self,
 
         provider_tasks.deliver_email.apply_async(
             [str(saved_notification.id)],
-            queue=QueueNames.SEND_EMAIL if not service.research_mode else QueueNames.RESEARCH_MODE
+            queue=QueueNames.SEND_BULK if not service.research_mode else QueueNames.RESEARCH_MODE
         )
 
         current_app.logger.info("Email {} created at {}".format(saved_notification.id, saved_notification.created_at))
@@ -274,6 +461,81 @@ def save_email(self,
         handle_exception(self, notification, notification_id, e)
 
 
+@notify_celery.task(bind=True, name="save-sms-batch", max_retries=5, default_retry_delay=300)
+@statsd(namespace="tasks")
+def save_sms_batch(self, service_id, encrypted_notifications):
+    save_notifications_batch(self, service_id, encrypted_notifications, SMS_TYPE)
+
+
+@notify_celery.task(bind=True, name="save-email-batch", max_retries=5, default_retry_delay=300)
+@statsd(namespace="tasks")
+def save_email_batch(self, service_id, encrypted_notifications):
+    save_notifications_batch(self, service_id, encrypted_notifications, EMAIL_TYPE)
+
+
+def save_notifications_batch(task, service_id, encrypted_notifications, notification_type):
+    notifications = encryption.decrypt(encrypted_notifications)
+    service = dao_fetch_service_by_id(service_id)
+
+    allowed_notifications = []
+    for notification in notifications:
+        if service_allowed_to_send_to(notification['to'], service, KEY_TYPE_NORMAL):
+            allowed_notifications.append(notification)
+        else:
+            current_app.logger.info(
+                "{} {} failed as restricted service".format(notification_type, notification['id'])
+            )
+
+    try:
+        saved_notifications = persist_notifications([
+            build_notification(
+                template_id=notification['template'],
+                template_version=notification['template_version'],
+                recipient=notification['to'],
+                service=service,
+                personalisation=notification.get('personalisation'),
+                notification_type=notification_type,
+                api_key_id=None,
+                key_type=KEY_TYPE_NORMAL,
+                created_at=datetime.utcnow(),
+                job_id=notification.get('job', None),
+                job_row_number=notification.get('row_number', None),
+                notification_id=notification['id']
+            )
+            for notification in allowed_notifications
+        ])
+    except SQLAlchemyError as e:
+        # notifications that were saved by an earlier attempt are skipped, so it is safe to retry the whole batch
+        current_app.logger.exception(
+            "Retry {task} of {count} notifications for job {job}".format(
+                task=task.__name__,
+                count=len(notifications),
+                job=notifications[0].get('job', None) if notifications else None
+            )
+        )
+        try:
+            task.retry(queue=QueueNames.RETRY, exc=e)
+        except task.MaxRetriesExceededError:
+            current_app.logger.exception('Retry {} has retried the max number of times'.format(task.__name__))
+        return
+
+    if service.research_mode:
+        deliver_task = provider_tasks.deliver_sms if notification_type == SMS_TYPE else provider_tasks.deliver_email
+        for saved_notification in saved_notifications:
+            deliver_task.apply_async([str(saved_notification.id)], queue=QueueNames.RESEARCH_MODE)
+    elif saved_notifications:
+        if notification_type == SMS_TYPE:
+            deliver_batch_task = provider_tasks.deliver_sms_batch
+        else:
+            deliver_batch_task = provider_tasks.deliver_email_batch
+
+        # job traffic has its own queue and workers, so a big job doesn't hold up API and priority sends
+        deliver_batch_task.apply_async(
+            [[str(saved_notification.id) for saved_notification in saved_notifications]],
+            queue=QueueNames.SEND_BULK
+        )
+
+
 @notify_celery.task(bind=True, name="save-letter", max_retries=5, default_retry_delay=300)
 @statsd(namespace="tasks")
 def save_letter(
@@ -494,15 +756,21 @@ def send_inbound_sms_to_service(self, inbound_sms_id, service_id):
     }
 
     try:
-        response = request(
-            method="POST",
+        response = get_http_session(
+            'inbound-api',
+            pool_size=current_app.config['INBOUND_API_HTTP_POOL_SIZE'],
+            pool_connections=current_app.config['INBOUND_API_HTTP_POOL_CONNECTIONS']
+        ).post(
             url=inbound_api.url,
             data=json.dumps(data),
             headers={
                 'Content-Type': 'application/json',
                 'Authorization': 'Bearer {}'.format(inbound_api.bearer_token)
             },
-            timeout=60
+            timeout=(
+                current_app.config['INBOUND_API_CONNECT_TIMEOUT_SECONDS'],
+                current_app.config['INBOUND_API_READ_TIMEOUT_SECONDS']
+            )
         )
         current_app.logger.info('send_inbound_sms_to_service sending {} to {}, response {}'.format(
             inbound_sms_id,
@@ -548,22 +816,55 @@ def process_incomplete_job(job_id):
 
     current_app.logger.info("Resuming job {} from row {}".format(job_id, resume_from_row))
 
-    db_template = dao_get_template_by_id(job.template_id, job.template_version)
+    template_dict = dao_get_template_version_dict(job.template_id, job.template_version)
 
-    TemplateClass = get_template_class(db_template.template_type)
-    template = TemplateClass(db_template.__dict__)
+    TemplateClass = get_template_class(template_dict['template_type'])
+    template = TemplateClass(template_dict)
 
-    for row_number, recipient, personalisation in RecipientCSV(
-            s3.get_job_from_s3(str(job.service_id), str(job.id)),
-            template_type=template.template_type,
-            placeholders=template.placeholders
-    ).enumerated_recipients_and_personalisation:
-        if row_number > resume_from_row:
-            process_row(row_number, recipient, personalisation, template, job, job.service)
+    rows = get_recipients_and_personalisation_for_job(job, template)
+    process_rows(
+        (
+            (row_number, recipient, personalisation)
+            for row_number, recipient, personalisation in rows
+            if row_number > resume_from_row
+        ),
+        template,
+        job,
+        job.service
+    )
 
     job_complete(job, job.service, template, resumed=True)
 
 
+@notify_celery.task(name="process-status-updates")
+@statsd(namespace="tasks")
+def process_status_updates():
+    batch_size = current_app.config['STATUS_UPDATE_BATCH_SIZE']
+    updates = take_buffered_status_updates(batch_size)
+    if not updates:
+        return
+
+    try:
+        apply_status_updates(updates)
+    except Exception:
+        current_app.logger.exception("Error applying {} buffered status updates".format(len(updates)))
+        # try them one at a time, so one bad update doesn't hold back the rest of the batch, and put those that still
+        # fail back for the next run rather than losing the receipts
+        failed = []
+        for update in updates:
+            try:
+                apply_status_updates([update])
+            except Exception:
+                failed.append(update)
+        if failed:
+            return_status_updates_to_buffer(failed)
+            raise
+
+    if len(updates) == batch_size:
+        # there are more waiting, and they've been held long enough already
+        process_status_updates.apply_async(queue=QueueNames.DATABASE)
+
+
 @notify_celery.task(bind=True, name="process-ses-result", max_retries=5, default_retry_delay=300)
 @statsd(namespace="tasks")
 def process_ses_results(self, response):
@@ -1,3 +1,9 @@
+import os
+
+from requests import Session
+from requests.adapters import HTTPAdapter
+
+
 class ClientException(Exception):
     '''
     Base Exceptions for sending notifications that fail
@@ -12,6 +18,25 @@ class Client(object):
     pass
 
 
+_http_sessions = {}
+
+
+def get_http_session(name, pool_size, pool_connections=1):
+    '''
+    A requests session for `name` that keeps connections alive, so each request doesn't need a new TCP and TLS
+    handshake. Sessions are per process - celery forks its workers after the app is set up, and a socket mustn't be
+    shared between processes.
+    '''
+    key = (os.getpid(), name)
+    if key not in _http_sessions:
+        session = Session()
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_size)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        _http_sessions[key] = session
+    return _http_sessions[key]
+
+
 STATISTICS_REQUESTED = 'requested'
 STATISTICS_DELIVERED = 'delivered'
 STATISTICS_FAILURE = 'failure'
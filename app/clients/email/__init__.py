@@ -16,5 +16,18 @@ class EmailClient(Client):
     def send_email(self, *args, **kwargs):
         raise NotImplemented('TODO Need to implement.')
 
+    def send_email_batch(self, messages):
+        '''
+        Send a list of messages, each a dict of send_email keyword arguments. Returns a list with, for each message in
+        order, the reference the provider gave it or the exception raised sending it.
+        '''
+        results = []
+        for message in messages:
+            try:
+                results.append(self.send_email(**message))
+            except Exception as e:
+                results.append(e)
+        return results
+
     def get_name(self):
         raise NotImplemented('TODO Need to implement.')
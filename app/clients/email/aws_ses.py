@@ -1,3 +1,6 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from time import sleep
+
 import boto3
 import botocore
 from flask import current_app
@@ -116,3 +119,56 @@ class AwsSesClient(EmailClient):
             self.statsd_client.timing("clients.ses.request-time", elapsed_time)
             self.statsd_client.incr("clients.ses.success")
             return response['MessageId']
+
+    def send_email_batch(self, messages, on_sent=None):
+        '''
+        Sends messages on a pool of threads, so up to AWS_SES_MAX_CONCURRENT_REQUESTS are in flight at once rather
+        than waiting for each SES round trip in turn. Requests are started no faster than AWS_SES_MAX_SEND_RATE a
+        second.
+
+        on_sent, if given, is called on this thread with a list of (index, reference) for the messages SES has accepted
+        as soon as they come back, rather than once the whole batch is done, so their references can be saved before
+        any receipts for them arrive. It mustn't raise.
+        '''
+        app = current_app._get_current_object()
+        interval = 1.0 / app.config['AWS_SES_MAX_SEND_RATE']
+
+        def send(message):
+            with app.app_context():
+                try:
+                    return self.send_email(**message)
+                except Exception as e:
+                    return e
+
+        with ThreadPoolExecutor(max_workers=app.config['AWS_SES_MAX_CONCURRENT_REQUESTS']) as executor:
+            futures = []
+            pending = {}
+            next_start_time = monotonic()
+            for index, message in enumerate(messages):
+                wait = next_start_time - monotonic()
+                if wait > 0:
+                    sleep(wait)
+                future = executor.submit(send, message)
+                futures.append(future)
+                pending[future] = index
+                next_start_time = max(next_start_time, monotonic() - interval) + interval
+
+                if on_sent:
+                    _report_sent(on_sent, pending, [future for future in pending if future.done()])
+
+            if on_sent:
+                for future in as_completed(list(pending)):
+                    _report_sent(on_sent, pending, [future])
+
+            return [future.result() for future in futures]
+
+
+def _report_sent(on_sent, pending, done):
+    sent = []
+    for future in done:
+        index = pending.pop(future)
+        result = future.result()
+        if not isinstance(result, Exception):
+            sent.append((index, result))
+    if sent:
+        on_sent(sent)
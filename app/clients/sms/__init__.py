@@ -21,5 +21,18 @@ class SmsClient(Client):
     def send_sms(self, *args, **kwargs):
         raise NotImplemented('TODO Need to implement.')
 
+    def send_sms_batch(self, messages):
+        '''
+        Send a list of messages, each a dict of send_sms arguments. Returns the exceptions for the messages that
+        couldn't be sent, keyed by their reference.
+        '''
+        failures = {}
+        for message in messages:
+            try:
+                self.send_sms(**message)
+            except Exception as e:
+                failures[message['reference']] = e
+        return failures
+
     def get_name(self):
         raise NotImplemented('TODO Need to implement.')
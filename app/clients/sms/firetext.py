@@ -2,10 +2,10 @@ import json
 import logging
 
 from monotonic import monotonic
-from requests import request, RequestException
+from requests import RequestException
 
 from app.clients.sms import (SmsClient, SmsClientResponseException)
-from app.clients import STATISTICS_DELIVERED, STATISTICS_FAILURE
+from app.clients import STATISTICS_DELIVERED, STATISTICS_FAILURE, get_http_session
 
 logger = logging.getLogger(__name__)
 
@@ -65,10 +65,19 @@ class FiretextClient(SmsClient):
         self.name = 'firetext'
         self.url = "https://www.firetext.co.uk/api/sendsms/json"
         self.statsd_client = statsd_client
+        self.timeout = (
+            current_app.config.get('SMS_PROVIDER_CONNECT_TIMEOUT_SECONDS'),
+            current_app.config.get('SMS_PROVIDER_READ_TIMEOUT_SECONDS')
+        )
+        self.pool_size = current_app.config.get('SMS_PROVIDER_HTTP_POOL_SIZE')
 
     def get_name(self):
         return self.name
 
+    @property
+    def session(self):
+        return get_http_session(self.name, self.pool_size)
+
     def record_outcome(self, success, response):
         status_code = response.status_code if response else 503
 
@@ -98,11 +107,10 @@ class FiretextClient(SmsClient):
 
         start_time = monotonic()
         try:
-            response = request(
-                "POST",
+            response = self.session.post(
                 self.url,
                 data=data,
-                timeout=60
+                timeout=self.timeout
             )
             response.raise_for_status()
             try:
@@ -22,3 +22,8 @@ class LoadtestingClient(FiretextClient):
         self.name = 'loadtesting'
         self.url = "https://www.firetext.co.uk/api/sendsms/json"
         self.statsd_client = statsd_client
+        self.timeout = (
+            config.config.get('SMS_PROVIDER_CONNECT_TIMEOUT_SECONDS'),
+            config.config.get('SMS_PROVIDER_READ_TIMEOUT_SECONDS')
+        )
+        self.pool_size = config.config.get('SMS_PROVIDER_HTTP_POOL_SIZE')
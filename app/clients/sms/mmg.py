@@ -1,7 +1,7 @@
 import json
 from monotonic import monotonic
-from requests import (request, RequestException)
-from app.clients import (STATISTICS_DELIVERED, STATISTICS_FAILURE)
+from requests import RequestException
+from app.clients import (STATISTICS_DELIVERED, STATISTICS_FAILURE, get_http_session)
 from app.clients.sms import (SmsClient, SmsClientResponseException)
 
 mmg_response_map = {
@@ -67,6 +67,11 @@ class MMGClient(SmsClient):
         self.from_number = current_app.config.get('FROM_NUMBER')
         self.name = 'mmg'
         self.statsd_client = statsd_client
+        self.timeout = (
+            current_app.config.get('SMS_PROVIDER_CONNECT_TIMEOUT_SECONDS'),
+            current_app.config.get('SMS_PROVIDER_READ_TIMEOUT_SECONDS')
+        )
+        self.pool_size = current_app.config.get('SMS_PROVIDER_HTTP_POOL_SIZE')
         self.mmg_url = current_app.config.get('MMG_URL')
 
     def record_outcome(self, success, response):
@@ -88,6 +93,10 @@ class MMGClient(SmsClient):
     def get_name(self):
         return self.name
 
+    @property
+    def session(self):
+        return get_http_session(self.name, self.pool_size)
+
     def send_sms(self, to, content, reference, multi=True, sender=None):
         data = {
             "reqType": "BULK",
@@ -100,15 +109,14 @@ class MMGClient(SmsClient):
 
         start_time = monotonic()
         try:
-            response = request(
-                "POST",
+            response = self.session.post(
                 self.mmg_url,
                 data=json.dumps(data),
                 headers={
                     'Content-Type': 'application/json',
                     'Authorization': 'Basic {}'.format(self.api_key)
                 },
-                timeout=60
+                timeout=self.timeout
             )
 
             response.raise_for_status()
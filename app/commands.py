@@ -4,6 +4,7 @@ from decimal import Decimal
 from flask_script import Command, Option
 
 from app import db
+from app.dao.fact_notification_status_dao import update_fact_notification_status
 from app.dao.monthly_billing_dao import (
     create_or_update_monthly_billing,
     get_monthly_billing_by_notification_type,
@@ -230,6 +231,22 @@ class BackfillProcessingTime(Command):
             send_processing_time_for_start_and_end(process_start_date, process_end_date)
 
 
+class BackfillFactNotificationStatus(Command):
+    option_list = (
+        Option('-s', '--start_date', dest='start_date', help="Date (%Y-%m-%d) start date inclusive"),
+        Option('-e', '--end_date', dest='end_date', help="Date (%Y-%m-%d) end date inclusive"),
+    )
+
+    def run(self, start_date, end_date):
+        start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
+        end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
+
+        for i in range((end_date - start_date).days + 1):
+            process_day = start_date + timedelta(days=i)
+            print('Counting notification statuses for {}'.format(process_day))
+            update_fact_notification_status(process_day)
+
+
 class PopulateServiceEmailReplyTo(Command):
 
     def run(self):
@@ -24,6 +24,7 @@ class QueueNames(object):
     DATABASE = 'database-tasks'
     SEND_SMS = 'send-sms-tasks'
     SEND_EMAIL = 'send-email-tasks'
+    SEND_BULK = 'send-bulk-tasks'
     RESEARCH_MODE = 'research-mode-tasks'
     STATISTICS = 'statistics-tasks'
     JOBS = 'job-tasks'
@@ -39,6 +40,7 @@ class QueueNames(object):
             QueueNames.DATABASE,
             QueueNames.SEND_SMS,
             QueueNames.SEND_EMAIL,
+            QueueNames.SEND_BULK,
             QueueNames.RESEARCH_MODE,
             QueueNames.STATISTICS,
             QueueNames.JOBS,
@@ -51,6 +53,7 @@ class TaskNames(object):
     DVLA_JOBS = 'send-jobs-to-dvla'
     DVLA_NOTIFICATIONS = 'send-api-notifications-to-dvla'
     PROCESS_INCOMPLETE_JOBS = 'process-incomplete-jobs'
+    PROCESS_STATUS_UPDATES = 'process-status-updates'
 
 
 class Config(object):
@@ -116,10 +119,50 @@ class Config(object):
     SQLALCHEMY_TRACK_MODIFICATIONS = True
     PAGE_SIZE = 50
     API_PAGE_SIZE = 250
+    NOTIFICATIONS_EXPORT_BATCH_SIZE = 1000
     SMS_CHAR_COUNT_LIMIT = 495
     TEST_MESSAGE_FILENAME = 'Test message'
     ONE_OFF_MESSAGE_FILENAME = 'Report'
     MAX_VERIFY_CODE_COUNT = 10
+    S3_JOB_READ_CHUNK_SIZE = 64 * 1024
+    JOB_CSV_ROWS_PER_CHUNK = 1000
+    JOB_SAVE_BATCH_SIZE = 100
+    # jobs are processed a slice at a time, going to the back of the queue between slices so running jobs take turns
+    JOB_ROWS_PER_SLICE = 5000
+    JOB_MAX_ROWS_PER_SECOND = 1000
+    # delivery receipts are held in redis for this long so they can be applied to the database together
+    STATUS_UPDATE_BUFFER_SECONDS = 0.3
+    STATUS_UPDATE_BATCH_SIZE = 1000
+    # updates that fail this many times are moved to a dead letter list rather than retried again
+    STATUS_UPDATE_MAX_ATTEMPTS = 5
+    JOB_STATISTICS_FLUSH_INTERVAL_SECONDS = 10
+    SERVICE_API_KEYS_CACHE_TTL_SECONDS = 30
+    TEMPLATE_VERSION_CACHE_TTL_SECONDS = 24 * 60 * 60
+    EMAIL_BRANDING_CACHE_TTL_SECONDS = 60
+    TODAYS_NOTIFICATION_STATUS_CACHE_TTL_SECONDS = 30
+    # receipts and timeouts keep changing the statuses of the last few days' notifications, so these are recounted
+    FACT_NOTIFICATION_STATUS_DAYS_TO_REFRESH = 4
+    AWS_SES_MAX_CONCURRENT_REQUESTS = 10
+    AWS_SES_MAX_SEND_RATE = 50
+    PROVIDER_ROUTING_CACHE_TTL_SECONDS = 10
+    SMS_PROVIDER_FAILOVER_WEIGHT_STEP = 10
+    SMS_PROVIDER_HTTP_POOL_SIZE = 10
+    SMS_PROVIDER_CONNECT_TIMEOUT_SECONDS = 5
+    SMS_PROVIDER_READ_TIMEOUT_SECONDS = 30
+    INBOUND_API_HTTP_POOL_SIZE = 10
+    INBOUND_API_HTTP_POOL_CONNECTIONS = 50
+    INBOUND_API_CONNECT_TIMEOUT_SECONDS = 5
+    INBOUND_API_READ_TIMEOUT_SECONDS = 30
+    # messages per second each provider will accept from us, shared between all delivery workers
+    PROVIDER_SEND_RATE_PER_SECOND = {
+        'mmg': 100,
+        'firetext': 100,
+        'ses': 50,
+    }
+    PROVIDER_THROTTLE_MAX_WAIT_SECONDS = 5
+    # the most of a provider's send rate that job traffic can use, leaving the rest for priority and API sends
+    PROVIDER_BULK_SEND_RATE_SHARE = 0.8
+    PROVIDER_THROTTLE_RETRY_DELAY_SECONDS = 10
 
     NOTIFY_SERVICE_ID = 'd6aa2c68-a2d9-4437-ab19-3ae8eb202553'
     NOTIFY_USER_ID = '6af522d0-2915-4e52-83a3-3690455a5fe6'
@@ -222,6 +265,11 @@ class Config(object):
             'schedule': crontab(hour=5, minute=0),
             'options': {'queue': QueueNames.PERIODIC}
         },
+        'update-fact-notification-status': {
+            'task': 'update-fact-notification-status',
+            'schedule': crontab(minute=15),
+            'options': {'queue': QueueNames.PERIODIC}
+        },
         'populate_monthly_billing': {
             'task': 'populate_monthly_billing',
             'schedule': crontab(hour=5, minute=10),
@@ -246,6 +294,17 @@ class Config(object):
             'task': 'daily-stats-template-usage-by-month',
             'schedule': crontab(hour=0, minute=50),
             'options': {'queue': QueueNames.PERIODIC}
+        },
+        'flush-job-statistics': {
+            'task': 'flush-job-statistics',
+            'schedule': timedelta(seconds=JOB_STATISTICS_FLUSH_INTERVAL_SECONDS),
+            'options': {'queue': QueueNames.STATISTICS}
+        },
+        # picks up any delivery receipts left in the buffer if the task scheduled for them was lost
+        'process-status-updates': {
+            'task': TaskNames.PROCESS_STATUS_UPDATES,
+            'schedule': crontab(),
+            'options': {'queue': QueueNames.PERIODIC}
         }
     }
     CELERY_QUEUES = []
@@ -258,6 +317,8 @@ class Config(object):
     STATSD_PORT = 8125
 
     SENDING_NOTIFICATIONS_TIMEOUT_PERIOD = 259200  # 3 days
+    TIMEOUT_NOTIFICATIONS_BATCH_SIZE = 10000
+    DELETE_NOTIFICATIONS_BATCH_SIZE = 10000
 
     SIMULATED_EMAIL_ADDRESSES = (
         'simulate-delivered@notifications.service.gov.uk',
@@ -3,6 +3,7 @@ from datetime import datetime
 
 from app import db, encryption
 from app.models import ApiKey
+from app.dao.services_dao import invalidate_cached_service_api_keys
 
 from app.dao.dao_utils import (
     transactional,
@@ -16,6 +17,7 @@ def save_model_api_key(api_key):
     if not api_key.id:
         api_key.id = uuid.uuid4()  # must be set now so version history model can use same id
     api_key.secret = uuid.uuid4()
+    invalidate_cached_service_api_keys(api_key.service_id or api_key.service.id)
     db.session.add(api_key)
 
 
@@ -24,6 +26,7 @@ def save_model_api_key(api_key):
 def expire_api_key(service_id, api_key_id):
     api_key = ApiKey.query.filter_by(id=api_key_id, service_id=service_id).one()
     api_key.expiry_date = datetime.utcnow()
+    invalidate_cached_service_api_keys(service_id)
     db.session.add(api_key)
 
 
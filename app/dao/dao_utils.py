@@ -1,9 +1,14 @@
 import itertools
 from functools import wraps, partial
 
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
 from app import db
 from app.history_meta import create_history
 
+AFTER_COMMIT_CALLBACKS = 'after_commit_callbacks'
+
 
 def transactional(func):
     @wraps(func)
@@ -20,6 +25,25 @@ def transactional(func):
     return commit_or_rollback
 
 
+def after_commit(callback):
+    """
+    Calls callback once the current transaction has been committed, or forgets it if the transaction is rolled back.
+    For invalidating caches shared with other processes, which could otherwise reload the old rows before the commit.
+    """
+    db.session.info.setdefault(AFTER_COMMIT_CALLBACKS, []).append(callback)
+
+
+@event.listens_for(Session, 'after_commit')
+def _run_after_commit_callbacks(session):
+    for callback in session.info.pop(AFTER_COMMIT_CALLBACKS, []):
+        callback()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_after_commit_callbacks(session):
+    session.info.pop(AFTER_COMMIT_CALLBACKS, None)
+
+
 def version_class(model_class, history_cls=None):
     create_hist = partial(create_history, history_cls=history_cls)
 
@@ -0,0 +1,177 @@
+import json
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import Date, DateTime, func, literal
+from sqlalchemy.dialects.postgresql import insert
+
+from app import db, redis_store
+from app.dao.dao_utils import transactional
+from app.models import FactNotificationStatus, Notification, NotificationHistory
+from app.statsd_decorators import statsd
+from app.utils import convert_utc_to_bst, get_london_day_bounds_in_utc
+
+NotificationStatusCount = namedtuple(
+    'NotificationStatusCount',
+    ['service_id', 'notification_type', 'key_type', 'status', 'count']
+)
+
+NOTIFICATION_STATUS_CACHE_KEY = 'notification-status-{}'
+
+
+def cache_key_for_notification_status(day, service_id=None):
+    if service_id:
+        return 'service-{}-notification-status-{}'.format(service_id, day)
+    return NOTIFICATION_STATUS_CACHE_KEY.format(day)
+
+
+@statsd(namespace="dao")
+@transactional
+def update_fact_notification_status(process_day):
+    """
+    Replaces the counts for process_day, a day in London, with that day's notifications counted by service,
+    notification type, key type and status. Days from the last week are counted from notifications, so they include
+    test key notifications, and older ones from notification_history.
+    """
+    start, end = get_london_day_bounds_in_utc(process_day)
+    table = Notification if start >= datetime.utcnow() - timedelta(days=7) else NotificationHistory
+
+    counts = db.session.query(
+        literal(process_day, type_=Date),
+        table.service_id,
+        table.notification_type,
+        table.key_type,
+        table.status,
+        func.count(table.id),
+        literal(datetime.utcnow(), type_=DateTime)
+    ).filter(
+        table.created_at >= start,
+        table.created_at < end
+    ).group_by(
+        table.service_id,
+        table.notification_type,
+        table.key_type,
+        table.status
+    )
+
+    FactNotificationStatus.query.filter(
+        FactNotificationStatus.bst_date == process_day
+    ).delete(synchronize_session=False)
+    db.session.execute(
+        insert(FactNotificationStatus.__table__).from_select(
+            [
+                'bst_date', 'service_id', 'notification_type', 'key_type', 'notification_status',
+                'notification_count', 'created_at'
+            ],
+            counts
+        )
+    )
+
+
+@statsd(namespace="dao")
+def fetch_notification_status_counts(start_date, end_date, service_id=None):
+    """
+    NotificationStatusCounts for the days in London from start_date to end_date. Days are read from the daily counts
+    in ft_notification_status once they've been refreshed after they ended. Yesterday, today and any earlier day the
+    refresh hasn't caught up with yet are counted from notifications by fetch_notification_status_for_day instead,
+    so late delivery receipts and the time before the first refresh of the day aren't missed.
+    """
+    today = convert_utc_to_bst(datetime.utcnow()).date()
+    first_live_day = _first_day_not_refreshed_since_it_ended(start_date, today)
+
+    query = db.session.query(
+        FactNotificationStatus.service_id,
+        FactNotificationStatus.notification_type,
+        FactNotificationStatus.key_type,
+        FactNotificationStatus.notification_status,
+        func.sum(FactNotificationStatus.notification_count)
+    ).filter(
+        FactNotificationStatus.bst_date >= start_date,
+        FactNotificationStatus.bst_date <= min(end_date, first_live_day - timedelta(days=1))
+    ).group_by(
+        FactNotificationStatus.service_id,
+        FactNotificationStatus.notification_type,
+        FactNotificationStatus.key_type,
+        FactNotificationStatus.notification_status
+    )
+    if service_id:
+        query = query.filter(FactNotificationStatus.service_id == service_id)
+
+    counts = [
+        NotificationStatusCount(str(row[0]), row[1], row[2], row[3], int(row[4]))
+        for row in query.all()
+    ]
+
+    day = max(start_date, first_live_day)
+    while day <= min(end_date, today):
+        counts += fetch_notification_status_for_day(day, service_id)
+        day += timedelta(days=1)
+    return counts
+
+
+def _first_day_not_refreshed_since_it_ended(start_date, today):
+    # days more than a week ago may have left notifications, so their counts can only come from the fact table. A
+    # recent day without any fact rows hasn't been refreshed at all yet, e.g. before the backfill has run
+    yesterday = today - timedelta(days=1)
+    first_day = max(start_date, today - timedelta(days=6))
+    last_refreshed = dict(db.session.query(
+        FactNotificationStatus.bst_date,
+        func.max(FactNotificationStatus.created_at)
+    ).filter(
+        FactNotificationStatus.bst_date >= first_day,
+        FactNotificationStatus.bst_date < yesterday
+    ).group_by(
+        FactNotificationStatus.bst_date
+    ).all())
+
+    day = first_day
+    while day < yesterday:
+        refreshed_at = last_refreshed.get(day)
+        if refreshed_at is None or refreshed_at < get_london_day_bounds_in_utc(day)[1]:
+            return day
+        day += timedelta(days=1)
+    return yesterday
+
+
+@statsd(namespace="dao")
+def fetch_todays_notification_status(service_id=None):
+    return fetch_notification_status_for_day(convert_utc_to_bst(datetime.utcnow()).date(), service_id)
+
+
+@statsd(namespace="dao")
+def fetch_notification_status_for_day(day, service_id=None):
+    """
+    NotificationStatusCounts for a day in London, counted from notifications. They're kept in redis for
+    TODAYS_NOTIFICATION_STATUS_CACHE_TTL_SECONDS, so busy dashboards don't count them again on every request.
+    """
+    cache_key = cache_key_for_notification_status(day, service_id)
+    cached_counts = redis_store.get(cache_key)
+    if cached_counts:
+        return [NotificationStatusCount(*row) for row in json.loads(cached_counts.decode('utf-8'))]
+
+    start, end = get_london_day_bounds_in_utc(day)
+    query = db.session.query(
+        Notification.service_id,
+        Notification.notification_type,
+        Notification.key_type,
+        Notification.status,
+        func.count(Notification.id)
+    ).filter(
+        Notification.created_at >= start,
+        Notification.created_at < end
+    ).group_by(
+        Notification.service_id,
+        Notification.notification_type,
+        Notification.key_type,
+        Notification.status
+    )
+    if service_id:
+        query = query.filter(Notification.service_id == service_id)
+
+    counts = [NotificationStatusCount(str(row[0]), row[1], row[2], row[3], row[4]) for row in query.all()]
+
+    redis_store.set(
+        cache_key, json.dumps(counts), ex=current_app.config['TODAYS_NOTIFICATION_STATUS_CACHE_TTL_SECONDS']
+    )
+    return counts
@@ -1,10 +1,13 @@
+import uuid
+from collections import defaultdict
 from datetime import datetime
 
+from sqlalchemy.dialects.postgresql import insert
 
 from app import db
 from app.dao.dao_utils import transactional
 from app.dao.date_util import get_month_start_and_end_date_in_utc, get_financial_year
-from app.dao.notification_usage_dao import get_billing_data_for_month
+from app.dao.notification_usage_dao import billing_data_query, get_billing_data_for_month_for_all_services
 from app.models import (
     SMS_TYPE,
     EMAIL_TYPE,
@@ -29,8 +32,20 @@ def get_service_ids_that_need_billing_populated(start_date, end_date):
 @statsd(namespace="dao")
 def create_or_update_monthly_billing(service_id, billing_month):
     start_date, end_date = get_month_start_and_end_date_in_utc(billing_month)
-    _update_monthly_billing(service_id, start_date, end_date, SMS_TYPE)
-    _update_monthly_billing(service_id, start_date, end_date, EMAIL_TYPE)
+    billing_data = billing_data_query(start_date, end_date, [SMS_TYPE, EMAIL_TYPE], service_id=service_id).all()
+    _update_monthly_billing([service_id], start_date, end_date, billing_data)
+
+
+@statsd(namespace="dao")
+def create_or_update_monthly_billing_for_all_services(billing_month):
+    """
+    Updates the billing totals for billing_month of every service with billable units that month. The totals of all
+    of them come from one query and are written with one upsert.
+    """
+    start_date, end_date = get_month_start_and_end_date_in_utc(billing_month)
+    service_ids = [s.service_id for s in get_service_ids_that_need_billing_populated(start_date, end_date)]
+    billing_data = get_billing_data_for_month_for_all_services(start_date, end_date)
+    _update_monthly_billing(service_ids, start_date, end_date, billing_data)
 
 
 def _monthly_billing_data_to_json(billing_data):
@@ -50,28 +65,39 @@ def _monthly_billing_data_to_json(billing_data):
 
 @statsd(namespace="dao")
 @transactional
-def _update_monthly_billing(service_id, start_date, end_date, notification_type):
-    billing_data = get_billing_data_for_month(
-        service_id=service_id,
-        start_date=start_date,
-        end_date=end_date,
-        notification_type=notification_type
-    )
-    monthly_totals = _monthly_billing_data_to_json(billing_data)
-    row = get_monthly_billing_entry(service_id, start_date, notification_type)
-    if row:
-        row.monthly_totals = monthly_totals
-        row.updated_at = datetime.utcnow()
-    else:
-        row = MonthlyBilling(
-            service_id=service_id,
-            notification_type=notification_type,
-            monthly_totals=monthly_totals,
-            start_date=start_date,
-            end_date=end_date
-        )
-
-    db.session.add(row)
+def _update_monthly_billing(service_ids, start_date, end_date, billing_data):
+    billing_data_by_service = defaultdict(list)
+    for row in billing_data:
+        billing_data_by_service[(str(row.service_id), row.notification_type)].append(row)
+
+    now = datetime.utcnow()
+    rows = [
+        {
+            'id': uuid.uuid4(),
+            'service_id': service_id,
+            'notification_type': notification_type,
+            'monthly_totals': _monthly_billing_data_to_json(
+                billing_data_by_service[(str(service_id), notification_type)]
+            ),
+            'start_date': start_date,
+            'end_date': end_date,
+            'updated_at': now
+        }
+        for service_id in service_ids
+        for notification_type in [SMS_TYPE, EMAIL_TYPE]
+    ]
+
+    if not rows:
+        return
+
+    statement = insert(MonthlyBilling.__table__).values(rows)
+    db.session.execute(statement.on_conflict_do_update(
+        constraint='uix_monthly_billing',
+        set_={
+            'monthly_totals': statement.excluded.monthly_totals,
+            'updated_at': statement.excluded.updated_at
+        }
+    ))
 
 
 def get_monthly_billing_entry(service_id, start_date, notification_type):
@@ -1,7 +1,7 @@
 from datetime import datetime, timedelta
 
 from sqlalchemy import Float, Integer
-from sqlalchemy import func, case, cast
+from sqlalchemy import func, case, cast, and_, or_
 from sqlalchemy import literal_column
 
 from app import db
@@ -9,7 +9,6 @@ from app.dao.date_util import get_financial_year
 from app.models import (
     NotificationHistory,
     Rate,
-    Service,
     NOTIFICATION_STATUS_TYPES_BILLABLE,
     KEY_TYPE_TEST,
     SMS_TYPE,
@@ -21,62 +20,26 @@ from app.utils import get_london_month_from_utc_column
 
 @statsd(namespace="dao")
 def get_billing_data_for_month(service_id, start_date, end_date, notification_type):
-    results = []
-
-    if notification_type == EMAIL_TYPE:
-        return billing_data_per_month_query(0, service_id, start_date, end_date, EMAIL_TYPE)
-
-    elif notification_type == SMS_TYPE:
-        rates = get_rates_for_daterange(start_date, end_date, SMS_TYPE)
-
-        if not rates:
-            return []
-
-        # so the start end date in the query are the valid from the rate, not the month
-        # - this is going to take some thought
-        for r, n in zip(rates, rates[1:]):
-            results.extend(
-                billing_data_per_month_query(
-                    r.rate, service_id, max(r.valid_from, start_date),
-                    min(n.valid_from, end_date), SMS_TYPE
-                )
-            )
-        results.extend(
-            billing_data_per_month_query(
-                rates[-1].rate, service_id, max(rates[-1].valid_from, start_date),
-                end_date, SMS_TYPE
-            )
-        )
-
-    return results
+    return billing_data_query(start_date, end_date, [notification_type], service_id=service_id).all()
 
 
 @statsd(namespace="dao")
 def get_monthly_billing_data(service_id, year):
     start_date, end_date = get_financial_year(year)
-    rates = get_rates_for_daterange(start_date, end_date, SMS_TYPE)
+    result = billing_data_query(start_date, end_date, [SMS_TYPE], service_id=service_id).all()
 
-    if not rates:
-        return []
-
-    result = []
-    for r, n in zip(rates, rates[1:]):
-        result.extend(billing_data_per_month_query(r.rate, service_id, r.valid_from, n.valid_from, SMS_TYPE))
-    result.extend(billing_data_per_month_query(rates[-1].rate, service_id, rates[-1].valid_from, end_date, SMS_TYPE))
-
-    return [(datetime.strftime(x[0], "%B"), x[1], x[2], x[3], x[4], x[5]) for x in result]
-
-
-def billing_data_filter(notification_type, start_date, end_date, service_id):
     return [
-        NotificationHistory.notification_type == notification_type,
-        NotificationHistory.created_at.between(start_date, end_date),
-        NotificationHistory.service_id == service_id,
-        NotificationHistory.status.in_(NOTIFICATION_STATUS_TYPES_BILLABLE),
-        NotificationHistory.key_type != KEY_TYPE_TEST
+        (datetime.strftime(x.month, "%B"), x.billing_units, x.rate_multiplier, x.international, x.notification_type,
+         x.rate)
+        for x in result
     ]
 
 
+@statsd(namespace="dao")
+def get_billing_data_for_month_for_all_services(start_date, end_date):
+    return billing_data_query(start_date, end_date, [SMS_TYPE, EMAIL_TYPE]).all()
+
+
 def get_rates_for_daterange(start_date, end_date, notification_type):
     rates = Rate.query.filter(Rate.notification_type == notification_type).order_by(Rate.valid_from).all()
 
@@ -105,34 +68,76 @@ def is_between(date, start_date, end_date):
     return start_date <= date <= end_date
 
 
-@statsd(namespace="dao")
-def billing_data_per_month_query(rate, service_id, start_date, end_date, notification_type):
+def rate_validity_ranges(notification_type):
+    """
+    The rates for notification_type, each with the time it's valid until - when the next rate starts. The latest
+    rate's valid_to is null.
+    """
+    return db.session.query(
+        Rate.rate.label('rate'),
+        Rate.valid_from.label('valid_from'),
+        func.lead(Rate.valid_from).over(order_by=Rate.valid_from).label('valid_to')
+    ).filter(
+        Rate.notification_type == notification_type
+    ).subquery()
+
+
+def billing_data_query(start_date, end_date, notification_types, service_id=None):
+    """
+    The billing units of notifications created between start_date and end_date, grouped by service, notification type,
+    month, rate, rate multiplier and whether they're international. Every rate window and service is covered by the
+    one query: sms notifications are joined to the rate that was valid when they were created, and are left out if
+    there wasn't one. Emails are billed at a rate of 0.
+    """
+    rates = rate_validity_ranges(SMS_TYPE)
     month = get_london_month_from_utc_column(NotificationHistory.created_at)
-    if notification_type == SMS_TYPE:
-        filter_subq = func.sum(NotificationHistory.billable_units).label('billing_units')
-    elif notification_type == EMAIL_TYPE:
-        filter_subq = func.count(NotificationHistory.billable_units).label('billing_units')
+    is_sms = NotificationHistory.notification_type == SMS_TYPE
 
-    results = db.session.query(
+    filters = [
+        NotificationHistory.notification_type.in_(notification_types),
+        NotificationHistory.created_at.between(start_date, end_date),
+        NotificationHistory.status.in_(NOTIFICATION_STATUS_TYPES_BILLABLE),
+        NotificationHistory.key_type != KEY_TYPE_TEST,
+        or_(~is_sms, rates.c.valid_from != None)  # noqa
+    ]
+    if service_id:
+        filters.append(NotificationHistory.service_id == service_id)
+
+    return db.session.query(
+        NotificationHistory.service_id,
         month.label('month'),
-        filter_subq,
+        case(
+            [(is_sms, func.sum(NotificationHistory.billable_units))],
+            else_=func.count(NotificationHistory.billable_units)
+        ).label('billing_units'),
         rate_multiplier().label('rate_multiplier'),
         NotificationHistory.international,
         NotificationHistory.notification_type,
-        cast(rate, Float()).label('rate')
+        cast(func.coalesce(rates.c.rate, 0), Float()).label('rate')
+    ).outerjoin(
+        rates,
+        and_(
+            is_sms,
+            NotificationHistory.created_at >= rates.c.valid_from,
+            or_(rates.c.valid_to == None, NotificationHistory.created_at < rates.c.valid_to)  # noqa
+        )
     ).filter(
-        *billing_data_filter(notification_type, start_date, end_date, service_id)
+        *filters
     ).group_by(
+        NotificationHistory.service_id,
         NotificationHistory.notification_type,
         month,
+        rates.c.valid_from,
+        rates.c.rate,
         NotificationHistory.rate_multiplier,
         NotificationHistory.international
     ).order_by(
+        NotificationHistory.service_id,
+        NotificationHistory.notification_type,
         month,
+        rates.c.valid_from,
         rate_multiplier()
-    ).all()
-
-    return results
+    )
 
 
 def rate_multiplier():
@@ -1,6 +1,8 @@
 import functools
+from collections import OrderedDict
 from datetime import (
     datetime,
+    time,
     timedelta,
     date
 )
@@ -14,13 +16,14 @@ from notifications_utils.recipients import (
     InvalidEmailError,
 )
 from werkzeug.datastructures import MultiDict
-from sqlalchemy import (desc, func, or_, asc)
+from sqlalchemy import (desc, func, or_, asc, tuple_)
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import joinedload
 from sqlalchemy.sql.expression import case
 from sqlalchemy.sql import functions
 from notifications_utils.international_billing_rates import INTERNATIONAL_BILLING_RATES
 
-from app import db, create_uuid
+from app import db, create_uuid, statsd_client
 from app.dao import days_ago
 from app.models import (
     Notification,
@@ -121,6 +124,67 @@ def dao_create_notification(notification):
         db.session.add(NotificationHistory.from_original(notification))
 
 
+@statsd(namespace="dao")
+@transactional
+def dao_create_notifications_bulk(notifications):
+    """
+    Creates many notifications, and their history, with one multi-row INSERT per table in a single transaction.
+
+    The inserts skip rows whose primary key already exists rather than raising an error, so that a replayed batch
+    is harmless. Returns the notifications that were created. The notifications are not added to the session.
+    """
+    if not notifications:
+        return []
+
+    for notification in notifications:
+        if not notification.id:
+            notification.id = create_uuid()
+        if not notification.status:
+            notification.status = NOTIFICATION_CREATED
+
+    inserted_ids = {
+        str(row.id) for row in db.session.execute(
+            insert(Notification.__table__).values(
+                [_column_values(Notification, notification) for notification in notifications]
+            ).on_conflict_do_nothing(
+                index_elements=[Notification.id]
+            ).returning(
+                Notification.id
+            )
+        )
+    }
+    created_notifications = [
+        notification for notification in notifications if str(notification.id) in inserted_ids
+    ]
+
+    history_values = [
+        _column_values(NotificationHistory, notification)
+        for notification in created_notifications
+        if _should_record_notification_in_history_table(notification)
+    ]
+    if history_values:
+        db.session.execute(
+            insert(NotificationHistory.__table__).values(
+                history_values
+            ).on_conflict_do_nothing(
+                index_elements=[NotificationHistory.id]
+            )
+        )
+
+    return created_notifications
+
+
+def _column_values(model, notification):
+    # Core inserts don't apply column defaults to values that are explicitly None, so fill in the scalar ones here
+    values = {}
+    for column in model.__table__.columns:
+        value = getattr(notification, column.key, None)
+        if value is None and column.default is not None and column.default.is_scalar:
+            value = column.default.arg
+        values[column.key] = value
+    return values
+
+
 def _should_record_notification_in_history_table(notification):
     if notification.api_key_id and notification.key_type == KEY_TYPE_TEST:
         return False
@@ -192,6 +256,124 @@ def update_notification_status_by_reference(reference, status):
     )
 
 
+@statsd(namespace="dao")
+@transactional
+def dao_update_notification_statuses_by_id(statuses):
+    """
+    Applies many (notification_id, status) updates at once, following the same rules as
+    update_notification_status_by_id. Returns the notifications that were updated.
+    """
+    return _update_notification_statuses(
+        'id',
+        statuses,
+        updatable_statuses=[NOTIFICATION_CREATED, NOTIFICATION_SENDING, NOTIFICATION_PENDING, NOTIFICATION_SENT],
+        check_international=True
+    )
+
+
+@statsd(namespace="dao")
+@transactional
+def dao_update_notification_statuses_by_reference(statuses):
+    """
+    Applies many (reference, status) updates at once, following the same rules as
+    update_notification_status_by_reference. Returns the notifications that were updated.
+    """
+    return _update_notification_statuses(
+        'reference',
+        statuses,
+        updatable_statuses=[NOTIFICATION_SENDING, NOTIFICATION_PENDING],
+        check_international=False
+    )
+
+
+def _update_notification_statuses(key_column, statuses, updatable_statuses, check_international):
+    """
+    Updates the notifications and their history with one UPDATE ... FROM (VALUES ...) statement per table.
+
+    statuses are in the order they were received. Several updates for the same notification are combined first into
+    the one it would have ended up with if they'd been applied one at a time. The returned rows have the id,
+    reference, status, notification_type, job_id and sent_at of each updated notification.
+    """
+    latest_statuses = OrderedDict()
+    for key, status in statuses:
+        key = str(key)
+        if key not in latest_statuses:
+            latest_statuses[key] = status
+        elif latest_statuses[key] in updatable_statuses:
+            latest_statuses[key] = _decide_permanent_temporary_failure(latest_statuses[key], status)
+
+    if not latest_statuses:
+        return []
+
+    params = {
+        'updated_at': datetime.utcnow(),
+        'updatable_statuses': tuple(updatable_statuses),
+        'pending': NOTIFICATION_PENDING,
+        'permanent_failure': NOTIFICATION_PERMANENT_FAILURE,
+        'temporary_failure': NOTIFICATION_TEMPORARY_FAILURE,
+    }
+    values = []
+    for i, (key, status) in enumerate(latest_statuses.items()):
+        values.append('(:key_{0}, :status_{0})'.format(i))
+        params['key_{}'.format(i)] = key
+        params['status_{}'.format(i)] = status
+
+    international_filter = ''
+    if check_international:
+        international_filter = 'AND (NOT notifications.international OR notifications.phone_prefix IN :dlr_prefixes)'
+        params['dlr_prefixes'] = tuple(
+            prefix for prefix in INTERNATIONAL_BILLING_RATES if country_records_delivery(prefix)
+        )
+
+    updated = db.session.execute(
+        """
+        UPDATE notifications SET
+            notification_status = CASE
+                WHEN notifications.notification_status = :pending AND updates.status = :permanent_failure
+                THEN :temporary_failure
+                ELSE updates.status
+            END,
+            updated_at = :updated_at
+        FROM (VALUES {values}) AS updates (update_key, status)
+        WHERE {key_match}
+        AND notifications.notification_status IN :updatable_statuses
+        {international_filter}
+        RETURNING notifications.id, notifications.reference, notifications.notification_status AS status,
+            notifications.notification_type, notifications.job_id, notifications.sent_at
+        """.format(
+            values=', '.join(values),
+            key_match=(
+                'notifications.id = updates.update_key::uuid' if key_column == 'id'
+                else 'notifications.reference = updates.update_key'
+            ),
+            international_filter=international_filter
+        ),
+        params
+    ).fetchall()
+
+    if updated:
+        history_params = {'updated_at': params['updated_at']}
+        history_values = []
+        for i, notification in enumerate(updated):
+            history_values.append('(:id_{0}, :status_{0})'.format(i))
+            history_params['id_{}'.format(i)] = str(notification.id)
+            history_params['status_{}'.format(i)] = notification.status
+
+        # research mode and test key notifications have no history, so there's nothing to update for them
+        db.session.execute(
+            """
+            UPDATE notification_history SET
+                notification_status = updates.status,
+                updated_at = :updated_at
+            FROM (VALUES {values}) AS updates (id, status)
+            WHERE notification_history.id = updates.id::uuid
+            """.format(values=', '.join(history_values)),
+            history_params
+        )
+
+    return updated
+
+
 @statsd(namespace="dao")
 def dao_update_notification(notification):
     notification.updated_at = datetime.utcnow()
@@ -203,6 +385,51 @@ def dao_update_notification(notification):
     db.session.commit()
 
 
+@statsd(namespace="dao")
+@transactional
+def dao_update_notifications_sent_to_provider(sent, sent_by):
+    """
+    Records that notifications have just been sent to the provider sent_by, with one UPDATE ... FROM (VALUES ...)
+    statement per table. sent is a list of (id, billable_units, reference) - a reference of None leaves the
+    notification's reference as it is. Only notifications still created are moved to sending, as a delivery receipt may
+    already have updated the others, but they all get sent_at, sent_by and billable_units so they're still billed.
+    """
+    if not sent:
+        return
+
+    params = {
+        'sent_at': datetime.utcnow(),
+        'sent_by': sent_by,
+        'sending': NOTIFICATION_SENDING,
+        'created': NOTIFICATION_CREATED,
+    }
+    values = []
+    for i, (notification_id, billable_units, reference) in enumerate(sent):
+        values.append('(:id_{0}, :billable_units_{0}, :reference_{0})'.format(i))
+        params['id_{}'.format(i)] = str(notification_id)
+        params['billable_units_{}'.format(i)] = billable_units
+        params['reference_{}'.format(i)] = reference
+
+    for table in ['notifications', 'notification_history']:
+        db.session.execute(
+            """
+            UPDATE {table} SET
+                notification_status = CASE
+                    WHEN {table}.notification_status = :created THEN :sending
+                    ELSE {table}.notification_status
+                END,
+                sent_at = :sent_at,
+                sent_by = :sent_by,
+                billable_units = updates.billable_units::integer,
+                reference = COALESCE(updates.reference::varchar, {table}.reference),
+                updated_at = :sent_at
+            FROM (VALUES {values}) AS updates (id, billable_units, reference)
+            WHERE {table}.id = updates.id::uuid
+            """.format(table=table, values=', '.join(values)),
+            params
+        )
+
+
 @statsd(namespace="dao")
 def get_notification_for_job(service_id, job_id, notification_id):
     return Notification.query.filter_by(service_id=service_id, job_id=job_id, id=notification_id).one()
@@ -220,6 +447,22 @@ def get_notifications_for_job(service_id, job_id, filter_dict=None, page=1, page
     )
 
 
+@statsd(namespace="dao")
+def get_notifications_for_job_to_export(service_id, job_id, filter_dict=None):
+    """
+    A query for all the job's notifications, in row order, that streams them from a server side cursor
+    NOTIFICATIONS_EXPORT_BATCH_SIZE at a time rather than loading them all.
+    """
+    query = Notification.query.filter_by(service_id=service_id, job_id=job_id)
+    query = _filter_query(query, filter_dict)
+    return query.options(
+        joinedload('template'),
+        joinedload('job')
+    ).order_by(
+        asc(Notification.job_row_number)
+    ).yield_per(current_app.config['NOTIFICATIONS_EXPORT_BATCH_SIZE'])
+
+
 @statsd(namespace="dao")
 def get_notification_with_personalisation(service_id, notification_id, key_type):
     filter_dict = {'service_id': service_id, 'id': notification_id}
@@ -234,6 +477,11 @@ def get_notification_by_id(notification_id):
     return Notification.query.filter_by(id=notification_id).first()
 
 
+@statsd(namespace="dao")
+def dao_get_notifications_by_ids(notification_ids):
+    return Notification.query.filter(Notification.id.in_(notification_ids)).all()
+
+
 def get_notifications(filter_dict=None):
     return _filter_query(Notification.query, filter_dict=filter_dict)
 
@@ -258,14 +506,99 @@ def get_notifications_for_service(
     filters = [Notification.service_id == service_id]
 
     if limit_days is not None:
-        days_ago = date.today() - timedelta(days=limit_days)
-        filters.append(func.date(Notification.created_at) >= days_ago)
+        filters.append(Notification.created_at >= datetime.combine(
+            date.today() - timedelta(days=limit_days), time.min
+        ))
 
     if older_than is not None:
         older_than_created_at = db.session.query(
             Notification.created_at).filter(Notification.id == older_than).as_scalar()
         filters.append(Notification.created_at < older_than_created_at)
 
+    query = _get_notifications_for_service_query(
+        filters, filter_dict, key_type, personalisation, include_jobs, include_from_test_key, client_reference
+    )
+
+    return query.order_by(desc(Notification.created_at)).paginate(
+        page=page,
+        per_page=page_size
+    )
+
+
+@statsd(namespace="dao")
+def get_notifications_for_service_after_cursor(
+    service_id,
+    filter_dict=None,
+    page_size=None,
+    key_type=None,
+    personalisation=False,
+    include_jobs=False,
+    older_than=None,
+    older_than_id=None,
+    client_reference=None
+):
+    """
+    A page of a service's notifications, newest first, for clients paging through them. Rather than counting and
+    offsetting like get_notifications_for_service, it seeks straight past older_than, the (created_at, id) of the
+    last notification on the previous page, or past the notification with id older_than_id.
+    """
+    if page_size is None:
+        page_size = current_app.config['PAGE_SIZE']
+
+    if older_than_id is not None:
+        older_than = db.session.query(
+            Notification.created_at, Notification.id
+        ).filter(
+            Notification.id == older_than_id
+        ).first()
+        if older_than is None:
+            return []
+
+    filters = [Notification.service_id == service_id]
+    if older_than is not None:
+        filters.append(tuple_(Notification.created_at, Notification.id) < tuple_(*older_than))
+
+    query = _get_notifications_for_service_query(
+        filters, filter_dict, key_type, personalisation, include_jobs, False, client_reference
+    )
+
+    return query.order_by(desc(Notification.created_at), desc(Notification.id)).limit(page_size).all()
+
+
+@statsd(namespace="dao")
+def get_notifications_for_service_to_export(
+    service_id,
+    filter_dict=None,
+    limit_days=None,
+    include_jobs=False,
+    include_from_test_key=False
+):
+    """
+    A query for the same notifications as get_notifications_for_service, newest first, that streams them from a
+    server side cursor NOTIFICATIONS_EXPORT_BATCH_SIZE at a time rather than paging through them.
+    """
+    filters = [Notification.service_id == service_id]
+
+    if limit_days is not None:
+        filters.append(Notification.created_at >= datetime.combine(
+            date.today() - timedelta(days=limit_days), time.min
+        ))
+
+    query = _get_notifications_for_service_query(
+        filters, filter_dict, None, False, include_jobs, include_from_test_key, None
+    )
+
+    return query.options(
+        joinedload('template'),
+        joinedload('job')
+    ).order_by(
+        desc(Notification.created_at), desc(Notification.id)
+    ).yield_per(current_app.config['NOTIFICATIONS_EXPORT_BATCH_SIZE'])
+
+
+def _get_notifications_for_service_query(
+    filters, filter_dict, key_type, personalisation, include_jobs, include_from_test_key, client_reference
+):
     if not include_jobs or (key_type and key_type != KEY_TYPE_NORMAL):
         # we can't say "job_id == None" here, because letters sent via the API still have a job_id :(
         filters.append(Notification.api_key_id != None)  # noqa
@@ -284,11 +617,7 @@ def get_notifications_for_service(
         query = query.options(
             joinedload('template')
         )
-
-    return query.order_by(desc(Notification.created_at)).paginate(
-        page=page,
-        per_page=page_size
-    )
+    return query
 
 
 def _filter_query(query, filter_dict=None):
@@ -312,31 +641,70 @@ def _filter_query(query, filter_dict=None):
 
 
 @statsd(namespace="dao")
-@transactional
 def delete_notifications_created_more_than_a_week_ago_by_type(notification_type):
-    seven_days_ago = date.today() - timedelta(days=7)
+    """
+    Deletes the notifications of notification_type created before the day a week ago, along with their sender
+    mappings. They're deleted in created_at order, DELETE_NOTIFICATIONS_BATCH_SIZE at a time, with each batch
+    committed before the next so neither the locks nor the memory used grow with the number deleted.
+    """
+    seven_days_ago = datetime.combine(date.today() - timedelta(days=7), time.min)
+    batch_size = current_app.config['DELETE_NOTIFICATIONS_BATCH_SIZE']
 
     # Following could be refactored when NotificationSmsReplyTo and NotificationLetterContact in models.py
+    delete_sender_mappings = ''
     if notification_type in [EMAIL_TYPE, SMS_TYPE]:
-        subq = db.session.query(Notification.id).filter(
-            func.date(Notification.created_at) < seven_days_ago,
-            Notification.notification_type == notification_type
-        ).subquery()
         if notification_type == EMAIL_TYPE:
             notification_sender_mapping_table = NotificationEmailReplyTo
         if notification_type == SMS_TYPE:
             notification_sender_mapping_table = NotificationSmsSender
-        db.session.query(
-            notification_sender_mapping_table
-        ).filter(
-            notification_sender_mapping_table.notification_id.in_(subq)
-        ).delete(synchronize_session='fetch')
-
-    deleted = db.session.query(Notification).filter(
-        func.date(Notification.created_at) < seven_days_ago,
-        Notification.notification_type == notification_type,
-    ).delete(synchronize_session='fetch')
-    return deleted
+        delete_sender_mappings = """
+            deleted_sender_mappings AS (
+                DELETE FROM {} WHERE notification_id IN (SELECT id FROM batch)
+            ),
+        """.format(notification_sender_mapping_table.__tablename__)
+
+    total_deleted = 0
+    last_deleted = None
+    while True:
+        batch = db.session.execute(
+            """
+            WITH batch AS (
+                SELECT id, created_at FROM notifications
+                WHERE notification_type = :notification_type
+                AND created_at < :seven_days_ago
+                {after_last_deleted}
+                ORDER BY created_at, id
+                LIMIT :batch_size
+            ),
+            {delete_sender_mappings}
+            deleted AS (
+                DELETE FROM notifications WHERE id IN (SELECT id FROM batch)
+                RETURNING id
+            )
+            SELECT
+                (SELECT count(*) FROM deleted) AS deleted_count,
+                (SELECT created_at FROM batch ORDER BY created_at DESC, id DESC LIMIT 1) AS last_created_at,
+                (SELECT id FROM batch ORDER BY created_at DESC, id DESC LIMIT 1) AS last_id
+            """.format(
+                after_last_deleted='AND (created_at, id) > (:last_created_at, :last_id)' if last_deleted else '',
+                delete_sender_mappings=delete_sender_mappings
+            ),
+            {
+                'notification_type': notification_type,
+                'seven_days_ago': seven_days_ago,
+                'batch_size': batch_size,
+                'last_created_at': last_deleted[0] if last_deleted else None,
+                'last_id': last_deleted[1] if last_deleted else None,
+            }
+        ).first()
+        db.session.commit()
+
+        total_deleted += batch.deleted_count
+        statsd_client.incr('delete-notifications.{}'.format(notification_type), batch.deleted_count)
+
+        if batch.deleted_count < batch_size:
+            return total_deleted
+        last_deleted = (batch.last_created_at, str(batch.last_id))
 
 
 @statsd(namespace="dao")
@@ -350,18 +718,60 @@ def dao_delete_notifications_and_history_by_id(notification_id):
     ).delete(synchronize_session='fetch')
 
 
-def _timeout_notifications(current_statuses, new_status, timeout_start, updated_at):
-    for table in [NotificationHistory, Notification]:
-        q = table.query.filter(
-            table.created_at < timeout_start,
-            table.status.in_(current_statuses),
-            table.notification_type != LETTER_TYPE
-        )
-        last_update_count = q.update(
-            {'status': new_status, 'updated_at': updated_at},
-            synchronize_session=False
-        )
-    return last_update_count
+def _timeout_notifications(current_statuses, new_status, timeout_start, updated_at, batch_size):
+    """
+    Walks the timed out notifications in batches of batch_size, ordered by id, updating each batch and its history
+    with one statement and committing it before moving on, so no batch holds its row locks for long. Returns the
+    number of notifications updated.
+    """
+    total_updated = 0
+    last_id = None
+    while True:
+        batch = db.session.execute(
+            """
+            WITH batch AS (
+                SELECT id FROM notifications
+                WHERE created_at < :timeout_start
+                AND notification_status IN :current_statuses
+                AND notification_type != :letter_type
+                {after_last_id}
+                ORDER BY id
+                LIMIT :batch_size
+                FOR UPDATE
+            ), updated AS (
+                UPDATE notifications SET notification_status = :new_status, updated_at = :updated_at
+                FROM batch
+                WHERE notifications.id = batch.id
+                RETURNING notifications.id
+            ), updated_history AS (
+                UPDATE notification_history SET notification_status = :new_status, updated_at = :updated_at
+                FROM updated
+                WHERE notification_history.id = updated.id
+                AND notification_history.notification_status IN :current_statuses
+            )
+            SELECT
+                (SELECT count(*) FROM updated) AS updated_count,
+                (SELECT count(*) FROM batch) AS batch_count,
+                (SELECT id FROM batch ORDER BY id DESC LIMIT 1) AS last_id
+            """.format(after_last_id='AND id > :last_id' if last_id else ''),
+            {
+                'timeout_start': timeout_start,
+                'current_statuses': tuple(current_statuses),
+                'letter_type': LETTER_TYPE,
+                'last_id': last_id,
+                'batch_size': batch_size,
+                'new_status': new_status,
+                'updated_at': updated_at,
+            }
+        ).first()
+        db.session.commit()
+
+        total_updated += batch.updated_count
+        statsd_client.incr('timeout-notifications.{}'.format(new_status), batch.updated_count)
+
+        if batch.batch_count < batch_size:
+            return total_updated
+        last_id = str(batch.last_id)
 
 
 def dao_timeout_notifications(timeout_period_in_seconds):
@@ -379,7 +789,12 @@ def dao_timeout_notifications(timeout_period_in_seconds):
     """
     timeout_start = datetime.utcnow() - timedelta(seconds=timeout_period_in_seconds)
     updated_at = datetime.utcnow()
-    timeout = functools.partial(_timeout_notifications, timeout_start=timeout_start, updated_at=updated_at)
+    timeout = functools.partial(
+        _timeout_notifications,
+        timeout_start=timeout_start,
+        updated_at=updated_at,
+        batch_size=current_app.config['TIMEOUT_NOTIFICATIONS_BATCH_SIZE']
+    )
 
     # Notifications still in created status are marked with a technical-failure:
     updated = timeout([NOTIFICATION_CREATED], NOTIFICATION_TECHNICAL_FAILURE)
@@ -387,8 +802,6 @@ def dao_timeout_notifications(timeout_period_in_seconds):
     # Notifications still in sending or pending status are marked with a temporary-failure:
     updated += timeout([NOTIFICATION_SENDING, NOTIFICATION_PENDING], NOTIFICATION_TEMPORARY_FAILURE)
 
-    db.session.commit()
-
     return updated
 
 
@@ -1,15 +1,22 @@
 from datetime import datetime
 
+from flask import current_app
 from sqlalchemy import asc, desc
 
-from app.dao.dao_utils import transactional
+from app.dao.dao_utils import after_commit, transactional
 from app.provider_details.switch_providers import (
     provider_is_inactive,
     provider_is_primary,
+    shift_weight,
     switch_providers
 )
 from app.models import ProviderDetails, ProviderDetailsHistory
-from app import db
+from app.utils import ExpiringLRUCache
+from app import db, redis_store
+
+PROVIDER_ROUTING_VERSION_CACHE_KEY = 'provider-routing-version'
+
+provider_routing_cache = ExpiringLRUCache(max_size=10)
 
 
 def get_provider_details():
@@ -54,7 +61,16 @@ def dao_get_provider_versions(provider_id):
 @transactional
 def dao_toggle_sms_provider(identifier):
     alternate_provider = get_alternative_sms_provider(identifier)
-    dao_switch_sms_provider_to_provider_with_identifier(alternate_provider.identifier)
+    current_provider = get_provider_details_by_identifier(identifier)
+
+    if current_provider.weight and alternate_provider.active:
+        # traffic is being split by weight, so move some of it across rather than all of it at once
+        for provider in shift_weight(
+            current_provider, alternate_provider, current_app.config['SMS_PROVIDER_FAILOVER_WEIGHT_STEP']
+        ):
+            dao_update_provider_details(provider)
+    else:
+        dao_switch_sms_provider_to_provider_with_identifier(alternate_provider.identifier)
 
 
 @transactional
@@ -71,6 +87,7 @@ def dao_switch_sms_provider_to_provider_with_identifier(identifier):
 
     if conflicting_provider:
         switch_providers(conflicting_provider, new_provider)
+        provider_routing_changed()
     else:
         current_provider = get_current_provider('sms')
         if not provider_is_primary(current_provider, new_provider, identifier):
@@ -90,6 +107,44 @@ def get_provider_details_by_notification_type(notification_type, supports_intern
     return ProviderDetails.query.filter(*filters).order_by(asc(ProviderDetails.priority)).all()
 
 
+def get_active_provider_weights_by_notification_type(notification_type, supports_international=False):
+    """
+    (identifier, weight) of the active providers in priority order, cached in this process. A change to the providers
+    bumps a version number in redis, so the other processes reload on their next send; without redis they reload when
+    the cache expires.
+    """
+    routing_version = redis_store.get(PROVIDER_ROUTING_VERSION_CACHE_KEY)
+    cache_key = (notification_type, supports_international)
+
+    cached = provider_routing_cache.get(cache_key)
+    if cached is not None and cached[0] == routing_version:
+        return cached[1]
+
+    provider_weights = [
+        (provider.identifier, provider.weight)
+        for provider in get_provider_details_by_notification_type(notification_type, supports_international)
+        if provider.active
+    ]
+    provider_routing_cache.set(
+        cache_key,
+        (routing_version, provider_weights),
+        ttl=current_app.config['PROVIDER_ROUTING_CACHE_TTL_SECONDS']
+    )
+    return provider_weights
+
+
+def provider_routing_changed():
+    """
+    Drops the cached provider routing in every process, once the current transaction has been committed - before
+    then another process could reload the old rows and cache them under the new version.
+    """
+    def invalidate():
+        provider_routing_cache.clear()
+        redis_store.incr(PROVIDER_ROUTING_VERSION_CACHE_KEY)
+
+    after_commit(invalidate)
+
+
 @transactional
 def dao_update_provider_details(provider_details):
     provider_details.version += 1
@@ -97,6 +152,7 @@ def dao_update_provider_details(provider_details):
     history = ProviderDetailsHistory.from_original(provider_details)
     db.session.add(provider_details)
     db.session.add(history)
+    provider_routing_changed()
 
 
 def dao_get_sms_provider_with_equal_priority(identifier, priority):
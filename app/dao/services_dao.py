@@ -1,16 +1,19 @@
 import uuid
+from collections import Counter, defaultdict, namedtuple
 from datetime import date, datetime, timedelta, time
 
 from sqlalchemy import asc, func, extract
 from sqlalchemy.orm import joinedload
 from flask import current_app
 
-from app import db
+from app import db, redis_store
 from app.dao.dao_utils import (
+    after_commit,
     transactional,
     version_class
 )
 from app.dao.date_util import get_financial_year
+from app.dao.fact_notification_status_dao import fetch_notification_status_counts, fetch_todays_notification_status
 from app.dao.service_sms_sender_dao import insert_service_sms_sender
 from app.dao.stats_template_usage_by_month_dao import dao_get_template_usage_stats_by_service
 from app.models import (
@@ -41,9 +44,24 @@ from app.models import (
 )
 from app.service.statistics import format_monthly_template_notification_stats
 from app.statsd_decorators import statsd
-from app.utils import get_london_month_from_utc_column, get_london_midnight_in_utc
+from app.utils import (
+    ExpiringLRUCache,
+    convert_utc_to_bst,
+    get_london_month_from_utc_column
+)
 from app.dao.annual_billing_dao import dao_insert_annual_billing
 
+service_api_keys_cache = ExpiringLRUCache(max_size=1000)
+
+StatsRow = namedtuple('StatsRow', ['notification_type', 'status', 'count'])
+ServiceStatsRow = namedtuple(
+    'ServiceStatsRow',
+    [
+        'service_id', 'name', 'restricted', 'research_mode', 'active', 'created_at',
+        'notification_type', 'status', 'count'
+    ]
+)
+
 DEFAULT_SERVICE_PERMISSIONS = [
     SMS_TYPE,
     EMAIL_TYPE,
@@ -104,6 +122,47 @@ def dao_fetch_service_by_id_with_api_keys(service_id, only_active=False):
     return query.one()
 
 
+def cache_key_for_service_api_keys_version(service_id):
+    return 'service-{}-api-keys-version'.format(service_id)
+
+
+def dao_fetch_cached_service_by_id_with_api_keys(service_id):
+    """
+    Returns the service with its api keys from this process's cache, only going to the database when it isn't cached
+    or has expired. The cached copy is loaded in a session of its own so it's never expired by a request's commit; it's
+    merged into the current session without querying before it's returned.
+
+    A change to the service or its keys bumps a version number in redis, so every process reloads on its next request
+    rather than, say, accepting a revoked key until its copy expires. Without redis they reload when the cache expires.
+    """
+    version = redis_store.get(cache_key_for_service_api_keys_version(service_id))
+
+    cached = service_api_keys_cache.get(str(service_id))
+    if cached is not None and cached[0] == version:
+        service = cached[1]
+    else:
+        session = db.create_session({'expire_on_commit': False})()
+        try:
+            service = session.query(Service).filter_by(id=service_id).options(joinedload('api_keys')).one()
+        finally:
+            session.close()
+        service_api_keys_cache.set(
+            str(service_id), (version, service), ttl=current_app.config['SERVICE_API_KEYS_CACHE_TTL_SECONDS']
+        )
+    return db.session.merge(service, load=False)
+
+
+def invalidate_cached_service_api_keys(service_id):
+    """
+    Drops the service's cached api keys in every process, once the current transaction has been committed.
+    """
+    def invalidate():
+        service_api_keys_cache.delete(str(service_id))
+        redis_store.incr(cache_key_for_service_api_keys_version(service_id))
+
+    after_commit(invalidate)
+
+
 def dao_fetch_all_services_by_user(user_id, only_active=False):
     query = Service.query.filter(
         Service.users.any(id=user_id)
@@ -131,6 +190,7 @@ def dao_archive_service(service_id):
         joinedload('templates.template_redacted'),
         joinedload('api_keys'),
     ).filter(Service.id == service_id).one()
+    invalidate_cached_service_api_keys(service_id)
 
     service.active = False
     service.name = '_archived_' + service.name
@@ -187,6 +247,7 @@ def dao_create_service(service, user, service_id=None, service_permissions=None)
 @transactional
 @version_class(Service)
 def dao_update_service(service):
+    invalidate_cached_service_api_keys(service.id)
     db.session.add(service)
 
 
@@ -259,42 +320,66 @@ def delete_service_and_all_associated_db_objects(service):
 
 @statsd(namespace="dao")
 def dao_fetch_stats_for_service(service_id):
-    return _stats_for_service_query(service_id).all()
+    today = convert_utc_to_bst(datetime.utcnow()).date()
+    return _stats_rows(
+        fetch_notification_status_counts(today - timedelta(days=7), today, service_id=service_id),
+        include_from_test_key=False
+    )
 
 
 @statsd(namespace="dao")
 def dao_fetch_todays_stats_for_service(service_id):
-    return _stats_for_service_query(service_id).filter(
-        func.date(Notification.created_at) == date.today()
-    ).all()
+    return _stats_rows(fetch_todays_notification_status(service_id=service_id), include_from_test_key=False)
 
 
 def fetch_todays_total_message_count(service_id):
-    result = db.session.query(
-        func.count(Notification.id).label('count')
+    start_date = datetime.combine(date.today(), time.min)
+    end_date = start_date + timedelta(days=1)
+
+    return db.session.query(
+        func.count(Notification.id)
     ).filter(
         Notification.service_id == service_id,
         Notification.key_type != KEY_TYPE_TEST,
-        func.date(Notification.created_at) == date.today()
-    ).group_by(
-        Notification.notification_type,
-        Notification.status,
-    ).first()
-    return 0 if result is None else result.count
+        Notification.created_at >= start_date,
+        Notification.created_at < end_date
+    ).scalar()
 
 
-def _stats_for_service_query(service_id):
-    return db.session.query(
-        Notification.notification_type,
-        Notification.status,
-        func.count(Notification.id).label('count')
-    ).filter(
-        Notification.service_id == service_id,
-        Notification.key_type != KEY_TYPE_TEST
-    ).group_by(
-        Notification.notification_type,
-        Notification.status,
-    )
+def _stats_rows(counts, include_from_test_key=True):
+    totals = Counter()
+    for count in counts:
+        if include_from_test_key or count.key_type != KEY_TYPE_TEST:
+            totals[(count.notification_type, count.status)] += count.count
+    return [
+        StatsRow(notification_type, status, total)
+        for (notification_type, status), total in sorted(totals.items())
+    ]
+
+
+def _stats_rows_for_all_services(counts, include_from_test_key, only_active):
+    counts_by_service = defaultdict(list)
+    for count in counts:
+        counts_by_service[count.service_id].append(count)
+
+    services = db.session.query(
+        Service.id,
+        Service.name,
+        Service.restricted,
+        Service.research_mode,
+        Service.active,
+        Service.created_at
+    ).order_by(Service.id)
+    if only_active:
+        services = services.filter(Service.active)
+
+    rows = []
+    for service in services.all():
+        stats = _stats_rows(counts_by_service[str(service.id)], include_from_test_key=include_from_test_key)
+        # services without any notifications still get a row, like an outer join would give them
+        for stats_row in stats or [StatsRow(None, None, None)]:
+            rows.append(ServiceStatsRow(*(tuple(service) + tuple(stats_row))))
+    return rows
 
 
 @statsd(namespace="dao")
@@ -375,119 +460,22 @@ def dao_fetch_monthly_historical_stats_for_service(service_id, year):
 
 @statsd(namespace='dao')
 def dao_fetch_todays_stats_for_all_services(include_from_test_key=True, only_active=True):
-
-    subquery = db.session.query(
-        Notification.notification_type,
-        Notification.status,
-        Notification.service_id,
-        func.count(Notification.id).label('count')
-    ).filter(
-        func.date(Notification.created_at) == date.today(),
-    ).group_by(
-        Notification.notification_type,
-        Notification.status,
-        Notification.service_id
-    )
-
-    if not include_from_test_key:
-        subquery = subquery.filter(Notification.key_type != KEY_TYPE_TEST)
-
-    subquery = subquery.subquery()
-
-    query = db.session.query(
-        Service.id.label('service_id'),
-        Service.name,
-        Service.restricted,
-        Service.research_mode,
-        Service.active,
-        Service.created_at,
-        subquery.c.notification_type,
-        subquery.c.status,
-        subquery.c.count
-    ).outerjoin(
-        subquery,
-        subquery.c.service_id == Service.id
-    ).order_by(Service.id)
-
-    if only_active:
-        query = query.filter(Service.active)
-
-    return query.all()
+    return _stats_rows_for_all_services(fetch_todays_notification_status(), include_from_test_key, only_active)
 
 
 @statsd(namespace='dao')
 def fetch_stats_by_date_range_for_all_services(start_date, end_date, include_from_test_key=True, only_active=True):
-    start_date = get_london_midnight_in_utc(start_date)
-    end_date = get_london_midnight_in_utc(end_date + timedelta(days=1))
-    table = NotificationHistory
-
-    if start_date >= datetime.utcnow() - timedelta(days=7):
-        table = Notification
-    subquery = db.session.query(
-        table.notification_type,
-        table.status,
-        table.service_id,
-        func.count(table.id).label('count')
-    ).filter(
-        table.created_at >= start_date,
-        table.created_at < end_date
-    ).group_by(
-        table.notification_type,
-        table.status,
-        table.service_id
+    return _stats_rows_for_all_services(
+        fetch_notification_status_counts(start_date, end_date), include_from_test_key, only_active
     )
-    if not include_from_test_key:
-        subquery = subquery.filter(table.key_type != KEY_TYPE_TEST)
-    subquery = subquery.subquery()
-
-    query = db.session.query(
-        Service.id.label('service_id'),
-        Service.name,
-        Service.restricted,
-        Service.research_mode,
-        Service.active,
-        Service.created_at,
-        subquery.c.notification_type,
-        subquery.c.status,
-        subquery.c.count
-    ).outerjoin(
-        subquery,
-        subquery.c.service_id == Service.id
-    ).order_by(Service.id)
-    if only_active:
-        query = query.filter(Service.active)
-
-    return query.all()
 
 
 @statsd(namespace='dao')
 def fetch_aggregate_stats_by_date_range_for_all_services(start_date, end_date, include_from_test_key=True):
-    start_date = get_london_midnight_in_utc(start_date)
-    end_date = get_london_midnight_in_utc(end_date + timedelta(days=1))
-    table = NotificationHistory
-
-    if start_date >= datetime.utcnow() - timedelta(days=7):
-        table = Notification
-
-    query = db.session.query(
-        table.notification_type,
-        table.status,
-        func.count(table.id).label('count')
-    ).filter(
-        table.created_at >= start_date,
-        table.created_at < end_date
-    ).group_by(
-        table.notification_type,
-        table.status
-    ).order_by(
-        table.notification_type
+    return _stats_rows(
+        fetch_notification_status_counts(start_date, end_date), include_from_test_key=include_from_test_key
     )
 
-    if not include_from_test_key:
-        query = query.filter(table.key_type != KEY_TYPE_TEST)
-
-    return query.all()
-
 
 @transactional
 @version_class(Service)
@@ -498,6 +486,7 @@ def dao_suspend_service(service_id):
     service = Service.query.options(
         joinedload('api_keys'),
     ).filter(Service.id == service_id).one()
+    invalidate_cached_service_api_keys(service_id)
 
     service.active = False
 
@@ -510,6 +499,7 @@ def dao_suspend_service(service_id):
 @version_class(Service)
 def dao_resume_service(service_id):
     service = Service.query.get(service_id)
+    invalidate_cached_service_api_keys(service_id)
     service.active = True
 
 
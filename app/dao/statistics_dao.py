@@ -1,11 +1,12 @@
+import uuid
 from datetime import datetime, timedelta
-from itertools import groupby
 
 from flask import current_app
-from sqlalchemy import func
+from sqlalchemy import and_, func, or_
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 
-from app import db
+from app import db, redis_store
 from app.dao.dao_utils import transactional
 from app.models import (
     JobStatistics,
@@ -15,65 +16,148 @@ from app.models import (
     LETTER_TYPE,
     NOTIFICATION_STATUS_TYPES_FAILED,
     NOTIFICATION_STATUS_SUCCESS,
+    NOTIFICATION_STATUS_TYPES,
     NOTIFICATION_DELIVERED,
     NOTIFICATION_SENT)
 from app.statsd_decorators import statsd
 
 
+JOB_STATISTICS_TIMEOUT_WATERMARK_CACHE_KEY = 'job-statistics-timeout-watermark'
+WATERMARK_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+
+
 @transactional
-def timeout_job_counts(notifications_type, timeout_start):
-    total_updated = 0
+def timeout_job_counts(timeout_start, changed_since=None, previous_timeout_start=None):
+    """
+    Recounts, from their notifications, the statistics of sms and email jobs created before timeout_start that still
+    have notifications without an outcome, so everything that hasn't been delivered counts as failed. All the jobs
+    are updated with a single statement.
 
-    sent = columns(notifications_type, 'sent')
-    delivered = columns(notifications_type, 'delivered')
-    failed = columns(notifications_type, 'failed')
+    If the last run is given, only jobs whose statistics changed since it (changed_since) or that were too new to
+    time out then (previous_timeout_start) are recounted - the last run settled the rest.
+    """
+    sent = JobStatistics.sms_sent + JobStatistics.emails_sent
+    outcomes = JobStatistics.sms_delivered + JobStatistics.sms_failed + \
+        JobStatistics.emails_delivered + JobStatistics.emails_failed
 
-    results = db.session.query(
-        JobStatistics.job_id.label('job_id'),
-        func.count(Notification.status).label('count'),
-        Notification.status
-    ).filter(
-        Notification.notification_type == notifications_type,
-        JobStatistics.job_id == Notification.job_id,
+    filters = [
         JobStatistics.created_at < timeout_start,
-        sent != failed + delivered
-    ).group_by(Notification.status, JobStatistics.job_id).order_by(JobStatistics.job_id).all()
-
-    sort = sorted(results, key=lambda result: result.job_id)
-    groups = []
-    for k, g in groupby(sort, key=lambda result: result.job_id):
-        groups.append(list(g))
-
-    for job in groups:
-        sent_count = 0
-        delivered_count = 0
-        failed_count = 0
-        for notification_status in job:
-            if notification_status.status in NOTIFICATION_STATUS_SUCCESS:
-                delivered_count += notification_status.count
-            else:
-                failed_count += notification_status.count
-            sent_count += notification_status.count
-
-        total_updated += JobStatistics.query.filter_by(
-            job_id=notification_status.job_id
-        ).update({
-            sent: sent_count,
-            failed: failed_count,
-            delivered: delivered_count,
-            'sent': sent_count,
-            'delivered': delivered_count,
-            'failed': failed_count
-        }, synchronize_session=False)
-    return total_updated
+        sent != outcomes
+    ]
+    if changed_since and previous_timeout_start:
+        filters.append(or_(
+            JobStatistics.updated_at >= changed_since,
+            JobStatistics.created_at >= previous_timeout_start
+        ))
+    unfinished_jobs = db.session.query(JobStatistics.job_id).filter(*filters)
+
+    failed_statuses = list(set(NOTIFICATION_STATUS_TYPES) - set(NOTIFICATION_STATUS_SUCCESS))
+
+    def count(notification_type=None, statuses=None):
+        criteria = []
+        if notification_type:
+            criteria.append(Notification.notification_type == notification_type)
+        if statuses:
+            criteria.append(Notification.status.in_(statuses))
+        if not criteria:
+            return func.count(Notification.id)
+        return func.count(Notification.id).filter(and_(*criteria))
+
+    counts = db.session.query(
+        Notification.job_id.label('job_id'),
+        count(SMS_TYPE).label('sms_sent'),
+        count(SMS_TYPE, NOTIFICATION_STATUS_SUCCESS).label('sms_delivered'),
+        count(SMS_TYPE, failed_statuses).label('sms_failed'),
+        count(EMAIL_TYPE).label('emails_sent'),
+        count(EMAIL_TYPE, NOTIFICATION_STATUS_SUCCESS).label('emails_delivered'),
+        count(EMAIL_TYPE, failed_statuses).label('emails_failed'),
+        count().label('sent'),
+        count(statuses=NOTIFICATION_STATUS_SUCCESS).label('delivered'),
+        count(statuses=failed_statuses).label('failed'),
+    ).filter(
+        Notification.job_id.in_(unfinished_jobs.subquery()),
+        Notification.notification_type.in_([SMS_TYPE, EMAIL_TYPE])
+    ).group_by(Notification.job_id).subquery()
+
+    table = JobStatistics.__table__
+    result = db.session.execute(
+        table.update().where(
+            table.c.job_id == counts.c.job_id
+        ).values({
+            table.c[name]: counts.c[name] for name in [
+                'sms_sent', 'sms_delivered', 'sms_failed',
+                'emails_sent', 'emails_delivered', 'emails_failed',
+                'sent', 'delivered', 'failed',
+            ]
+        })
+    )
+    return result.rowcount
 
 
 @statsd(namespace="dao")
 def dao_timeout_job_statistics(timeout_period):
-    timeout_start = datetime.utcnow() - timedelta(seconds=timeout_period)
-    sms_count = timeout_job_counts(SMS_TYPE, timeout_start)
-    email_count = timeout_job_counts(EMAIL_TYPE, timeout_start)
-    return sms_count + email_count
+    """
+    Runs timeout_job_counts for the jobs that could have changed since the last run, whose start time is kept in
+    redis. If redis doesn't know when that was, every unfinished job is checked.
+    """
+    started_at = datetime.utcnow()
+    timeout_start = started_at - timedelta(seconds=timeout_period)
+
+    changed_since = previous_timeout_start = None
+    watermark = redis_store.get(JOB_STATISTICS_TIMEOUT_WATERMARK_CACHE_KEY)
+    if watermark:
+        changed_since = datetime.strptime(watermark.decode('utf-8'), WATERMARK_FORMAT)
+        previous_timeout_start = changed_since - timedelta(seconds=timeout_period)
+
+    updated = timeout_job_counts(timeout_start, changed_since, previous_timeout_start)
+
+    redis_store.set(JOB_STATISTICS_TIMEOUT_WATERMARK_CACHE_KEY, started_at.strftime(WATERMARK_FORMAT))
+    return updated
+
+
+JOB_STATISTICS_COUNT_COLUMNS = [
+    'emails_sent', 'emails_delivered', 'emails_failed',
+    'sms_sent', 'sms_delivered', 'sms_failed',
+    'letters_sent', 'letters_failed',
+    'sent', 'delivered', 'failed',
+]
+
+
+@statsd(namespace="dao")
+@transactional
+def dao_add_job_statistics_counts(counts):
+    """
+    Adds to the statistics of many jobs with a single upsert, creating statistics for any jobs that don't have them
+    yet. counts maps (job_id, notification_type, 'sent', 'delivered' or 'failed') to the number to add.
+    """
+    now = datetime.utcnow()
+    rows = {}
+    for (job_id, notification_type, outcome), count in counts.items():
+        column = columns(notification_type, outcome)
+        if column is None:
+            continue
+        if job_id not in rows:
+            rows[job_id] = dict(
+                {name: 0 for name in JOB_STATISTICS_COUNT_COLUMNS},
+                id=uuid.uuid4(),
+                job_id=job_id,
+                created_at=now,
+                updated_at=now
+            )
+        rows[job_id][column.key] += count
+        rows[job_id][outcome] += count
+
+    if not rows:
+        return
+
+    table = JobStatistics.__table__
+    statement = insert(table).values(list(rows.values()))
+    set_ = {
+        name: func.coalesce(table.c[name], 0) + statement.excluded[name]
+        for name in JOB_STATISTICS_COUNT_COLUMNS
+    }
+    set_['updated_at'] = now
+    db.session.execute(statement.on_conflict_do_update(index_elements=[table.c.job_id], set_=set_))
 
 
 @statsd(namespace="dao")
@@ -133,6 +217,30 @@ def columns(notification_type, status):
     return keys.get(notification_type).get(status)
 
 
+@transactional
+def update_job_stats_outcome_counts(job_id, notification_type, delivered_count, failed_count):
+    """
+    Adds the outcomes of many of a job's notifications to its statistics in one UPDATE. Returns the number of rows
+    updated, which is 0 if the job's statistics haven't been created yet.
+    """
+    values = {}
+    if failed_count:
+        column = columns(notification_type, 'failed')
+        values[column] = column + failed_count
+        values['failed'] = column + failed_count
+    if delivered_count and notification_type != LETTER_TYPE:
+        column = columns(notification_type, 'delivered')
+        values[column] = column + delivered_count
+        values['delivered'] = column + delivered_count
+
+    if not values:
+        return 0
+
+    return db.session.query(JobStatistics).filter_by(
+        job_id=job_id,
+    ).update(values)
+
+
 @transactional
 def update_job_stats_outcome_count(notification):
     if notification.status in NOTIFICATION_STATUS_TYPES_FAILED:
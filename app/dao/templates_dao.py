@@ -1,15 +1,20 @@
 from datetime import datetime
+import json
 import uuid
 
+from flask import current_app
 from sqlalchemy import desc
 from sqlalchemy.sql.expression import bindparam
 
-from app import db
+from app import db, redis_store
 from app.models import (Template, TemplateHistory, TemplateRedacted)
 from app.dao.dao_utils import (
     transactional,
     version_class
 )
+from app.utils import ExpiringLRUCache, cache_key_for_template_version
+
+template_version_cache = ExpiringLRUCache(max_size=1000)
 
 
 @transactional
@@ -58,6 +63,44 @@ def dao_get_template_by_id(template_id, version=None):
     return Template.query.filter_by(id=template_id).one()
 
 
+def dao_get_template_version_dict(template_id, version):
+    """
+    Template versions never change once written, so they're cached in this process and, when redis is enabled, in
+    redis as well. Returns a new dict each time, ready to pass to the notifications_utils template classes.
+    """
+    cache_key = cache_key_for_template_version(template_id, version)
+    template_dict = template_version_cache.get(cache_key)
+
+    if template_dict is None:
+        cached_template = redis_store.get(cache_key)
+        if cached_template:
+            template_dict = json.loads(cached_template.decode('utf-8'))
+        else:
+            template_dict = _template_version_as_dict(dao_get_template_by_id(template_id, version))
+            redis_store.set(
+                cache_key, json.dumps(template_dict), ex=current_app.config['TEMPLATE_VERSION_CACHE_TTL_SECONDS']
+            )
+        template_version_cache.set(
+            cache_key, template_dict, ttl=current_app.config['TEMPLATE_VERSION_CACHE_TTL_SECONDS']
+        )
+
+    return dict(template_dict)
+
+
+def _template_version_as_dict(template_history):
+    return {
+        'id': str(template_history.id),
+        'service_id': str(template_history.service_id),
+        'name': template_history.name,
+        'template_type': template_history.template_type,
+        'content': template_history.content,
+        'subject': template_history.subject,
+        'process_type': template_history.process_type,
+        'archived': template_history.archived,
+        'version': template_history.version,
+    }
+
+
 def dao_get_all_templates_for_service(service_id, template_type=None):
     if template_type is not None:
         return Template.query.filter_by(
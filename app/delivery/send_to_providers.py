@@ -1,3 +1,4 @@
+import random
 from urllib import parse
 from datetime import datetime
 
@@ -11,14 +12,16 @@ from notifications_utils.template import HTMLEmailTemplate, PlainTextEmailTempla
 from app import clients, statsd_client, create_uuid
 from app.dao.notifications_dao import (
     dao_update_notification,
+    dao_update_notifications_sent_to_provider,
     dao_get_notification_email_reply_for_notification,
     dao_get_notification_sms_sender_mapping)
 from app.dao.provider_details_dao import (
-    get_provider_details_by_notification_type,
+    get_active_provider_weights_by_notification_type,
     dao_toggle_sms_provider
 )
 from app.celery.research_mode_tasks import send_sms_response, send_email_response
-from app.dao.templates_dao import dao_get_template_by_id
+from app.dao.templates_dao import dao_get_template_version_dict
+from app.delivery.throttle import wait_for_send_tokens
 from app.models import (
     SMS_TYPE,
     KEY_TYPE_TEST,
@@ -32,6 +35,10 @@ from app.models import (
     NOTIFICATION_SENDING
 )
 from app.celery.statistics_tasks import create_initial_notification_statistic_tasks
+from app.utils import ExpiringLRUCache
+
+html_email_options_cache = ExpiringLRUCache(max_size=1000)
+rendered_email_cache = ExpiringLRUCache(max_size=1000)
 
 
 def send_sms_to_provider(notification):
@@ -46,16 +53,7 @@ def send_sms_to_provider(notification):
         current_app.logger.info(
             "Starting sending SMS {} to provider at {}".format(notification.id, datetime.utcnow())
         )
-        template_model = dao_get_template_by_id(notification.template_id, notification.template_version)
-
-        sender_has_been_customised = (not service.get_prefix_sms_with_service_name())
-
-        template = SMSMessageTemplate(
-            template_model.__dict__,
-            values=notification.personalisation,
-            prefix=service.name,
-            sender=sender_has_been_customised,
-        )
+        template = get_sms_template(notification)
 
         if service.research_mode or notification.key_type == KEY_TYPE_TEST:
             notification.billable_units = 0
@@ -71,17 +69,10 @@ def send_sms_to_provider(notification):
                 dao_update_notification(notification)
                 raise
         else:
+            # a throttled send raises before we try the provider, so it isn't counted against it
+            wait_for_send_tokens(provider.get_name())
             try:
-                sms_sender = dao_get_notification_sms_sender_mapping(notification.id)
-                if not sms_sender:
-                    sms_sender = service.get_default_sms_sender()
-
-                provider.send_sms(
-                    to=validate_and_format_phone_number(notification.to, international=notification.international),
-                    content=str(template),
-                    reference=str(notification.id),
-                    sender=sms_sender
-                )
+                provider.send_sms(**get_sms_message(notification, template))
             except Exception as e:
                 dao_toggle_sms_provider(provider.name)
                 raise e
@@ -98,6 +89,100 @@ def send_sms_to_provider(notification):
         statsd_client.timing("sms.total-time", delta_milliseconds)
 
 
+def send_sms_batch_to_provider(notifications):
+    """
+    Sends SMS notifications through one provider with a single call to its send_sms_batch. Returns the ids of the
+    notifications that need sending on their own instead: research mode, test key and international messages, and any
+    that the provider failed to send.
+    """
+    send_individually = []
+    batch = []
+    for notification in notifications:
+        if not notification.service.active:
+            technical_failure(notification=notification)
+        elif notification.status != NOTIFICATION_CREATED:
+            continue
+        elif (
+            notification.service.research_mode or
+            notification.key_type == KEY_TYPE_TEST or
+            notification.international
+        ):
+            send_individually.append(notification.id)
+        else:
+            batch.append(notification)
+
+    if not batch:
+        return send_individually
+
+    provider = provider_to_use(SMS_TYPE, batch[0].id)
+    current_app.logger.info(
+        "Starting sending {} SMS to provider {} at {}".format(len(batch), provider.get_name(), datetime.utcnow())
+    )
+
+    wait_for_send_tokens(provider.get_name(), len(batch), bulk=True)
+
+    templates = {notification.id: get_sms_template(notification) for notification in batch}
+    failures = provider.send_sms_batch([
+        get_sms_message(notification, templates[notification.id]) for notification in batch
+    ])
+
+    sent = [notification for notification in batch if str(notification.id) not in failures]
+    send_individually.extend(notification.id for notification in batch if str(notification.id) in failures)
+
+    # the provider has the sent messages now, so nothing from here on may cause them to be sent again
+    try:
+        dao_update_notifications_sent_to_provider(
+            [(notification.id, templates[notification.id].fragment_count, None) for notification in sent],
+            provider.get_name()
+        )
+        if failures:
+            dao_toggle_sms_provider(provider.name)
+        record_sent_notifications(sent, 'sms.total-time')
+    except Exception:
+        current_app.logger.exception(
+            "Failed to record batch of {} SMS sent to provider {}".format(len(sent), provider.get_name())
+        )
+
+    current_app.logger.info(
+        "Batch of {} SMS sent to provider {}, {} failed".format(len(batch), provider.get_name(), len(failures))
+    )
+    return send_individually
+
+
+def record_sent_notifications(notifications, timing_name):
+    for notification in notifications:
+        create_initial_notification_statistic_tasks(notification)
+
+        delta_milliseconds = (datetime.utcnow() - notification.created_at).total_seconds() * 1000
+        statsd_client.timing(timing_name, delta_milliseconds)
+
+
+def get_sms_template(notification):
+    template_dict = dao_get_template_version_dict(notification.template_id, notification.template_version)
+
+    sender_has_been_customised = (not notification.service.get_prefix_sms_with_service_name())
+
+    return SMSMessageTemplate(
+        template_dict,
+        values=notification.personalisation,
+        prefix=notification.service.name,
+        sender=sender_has_been_customised,
+    )
+
+
+def get_sms_message(notification, template):
+    sms_sender = dao_get_notification_sms_sender_mapping(notification.id)
+    if not sms_sender:
+        sms_sender = notification.service.get_default_sms_sender()
+
+    return dict(
+        to=validate_and_format_phone_number(notification.to, international=notification.international),
+        content=str(template),
+        reference=str(notification.id),
+        sender=sms_sender
+    )
+
+
 def send_email_to_provider(notification):
     service = notification.service
     if not service.active:
@@ -108,17 +193,12 @@ def send_email_to_provider(notification):
         current_app.logger.info(
             "Starting sending EMAIL {} to provider at {}".format(notification.id, datetime.utcnow())
         )
-        template_dict = dao_get_template_by_id(notification.template_id, notification.template_version).__dict__
+        template_dict = dao_get_template_version_dict(notification.template_id, notification.template_version)
 
-        html_email = HTMLEmailTemplate(
+        subject, plain_text_body, html_body = render_email(
             template_dict,
-            values=notification.personalisation,
-            **get_html_email_options(service)
-        )
-
-        plain_text_email = PlainTextEmailTemplate(
-            template_dict,
-            values=notification.personalisation
+            notification.personalisation,
+            get_cached_html_email_options(service)
         )
 
         if service.research_mode or notification.key_type == KEY_TYPE_TEST:
@@ -128,20 +208,16 @@ def send_email_to_provider(notification):
             update_notification(notification, provider)
             send_email_response(provider.get_name(), reference, notification.to)
         else:
-            from_address = '"{}" <{}@{}>'.format(service.name, service.email_from,
-                                                 current_app.config['NOTIFY_EMAIL_DOMAIN'])
-
-            email_reply_to = dao_get_notification_email_reply_for_notification(notification.id)
-
-            if not email_reply_to:
-                email_reply_to = service.get_default_reply_to_email_address()
+            from_address = get_from_address(service)
+            email_reply_to = get_email_reply_to(notification)
 
+            wait_for_send_tokens(provider.get_name())
             reference = provider.send_email(
                 from_address,
                 validate_and_format_email_address(notification.to),
-                plain_text_email.subject,
-                body=str(plain_text_email),
-                html_body=str(html_email),
+                subject,
+                body=plain_text_body,
+                html_body=html_body,
                 reply_to_address=validate_and_format_email_address(email_reply_to) if email_reply_to else None,
             )
             notification.reference = reference
@@ -167,9 +243,7 @@ def update_notification(notification, provider, international=False):
 
 
 def provider_to_use(notification_type, notification_id, international=False):
-    active_providers_in_order = [
-        p for p in get_provider_details_by_notification_type(notification_type, international) if p.active
-    ]
+    active_providers_in_order = get_active_provider_weights_by_notification_type(notification_type, international)
 
     if not active_providers_in_order:
         current_app.logger.error(
@@ -177,7 +251,22 @@ def provider_to_use(notification_type, notification_id, international=False):
         )
         raise Exception("No active {} providers".format(notification_type))
 
-    return clients.get_client_by_name_and_type(active_providers_in_order[0].identifier, notification_type)
+    weighted_providers = [(identifier, weight) for identifier, weight in active_providers_in_order if weight > 0]
+    if weighted_providers:
+        identifier = choose_weighted_provider(weighted_providers)
+    else:
+        identifier = active_providers_in_order[0][0]
+
+    return clients.get_client_by_name_and_type(identifier, notification_type)
+
+
+def choose_weighted_provider(weighted_providers):
+    point = random.uniform(0, sum(weight for _, weight in weighted_providers))
+    for identifier, weight in weighted_providers:
+        if point < weight:
+            return identifier
+        point -= weight
+    return weighted_providers[-1][0]
 
 
 def get_logo_url(base_url, logo_file):
@@ -201,6 +290,139 @@ def get_logo_url(base_url, logo_file):
     return parse.urlunparse(logo_url)
 
 
+def send_email_batch_to_provider(notifications):
+    """
+    Sends email notifications through the provider's send_email_batch, which can have many requests in flight at once.
+    Returns the ids of the notifications that need sending on their own instead: research mode and test key messages,
+    and any that couldn't be sent as part of the batch.
+    """
+    send_individually = []
+    batch = []
+    for notification in notifications:
+        if not notification.service.active:
+            technical_failure(notification=notification)
+        elif notification.status != NOTIFICATION_CREATED:
+            continue
+        elif notification.service.research_mode or notification.key_type == KEY_TYPE_TEST:
+            send_individually.append(notification.id)
+        else:
+            batch.append(notification)
+
+    if not batch:
+        return send_individually
+
+    provider = provider_to_use(EMAIL_TYPE, batch[0].id)
+    current_app.logger.info(
+        "Starting sending {} emails to provider at {}".format(len(batch), datetime.utcnow())
+    )
+
+    to_send = []
+    messages = []
+    for notification in batch:
+        try:
+            messages.append(get_email_message(notification))
+        except Exception:
+            # e.g. an invalid email address, which deliver_email knows how to handle
+            send_individually.append(notification.id)
+        else:
+            to_send.append(notification)
+
+    wait_for_send_tokens(provider.get_name(), len(messages), bulk=True)
+
+    def record_sent(accepted):
+        # SES has these emails now, so nothing here may cause them to be sent again. Their references are saved
+        # straight away, as SES can send receipts for them while the rest of the batch is still going out
+        try:
+            dao_update_notifications_sent_to_provider(
+                [(to_send[index].id, to_send[index].billable_units, reference) for index, reference in accepted],
+                provider.get_name()
+            )
+        except Exception:
+            current_app.logger.exception(
+                "Failed to record {} emails sent to provider {}".format(len(accepted), provider.get_name())
+            )
+
+    sent = []
+    for notification, result in zip(to_send, provider.send_email_batch(messages, on_sent=record_sent)):
+        if isinstance(result, Exception):
+            send_individually.append(notification.id)
+        else:
+            sent.append(notification)
+
+    try:
+        record_sent_notifications(sent, 'email.total-time')
+    except Exception:
+        current_app.logger.exception(
+            "Failed to record batch of {} emails sent to provider {}".format(len(sent), provider.get_name())
+        )
+
+    return send_individually
+
+
+def get_email_message(notification):
+    service = notification.service
+    template_dict = dao_get_template_version_dict(notification.template_id, notification.template_version)
+    subject, plain_text_body, html_body = render_email(
+        template_dict,
+        notification.personalisation,
+        get_cached_html_email_options(service)
+    )
+    email_reply_to = get_email_reply_to(notification)
+
+    return dict(
+        source=get_from_address(service),
+        to_addresses=validate_and_format_email_address(notification.to),
+        subject=subject,
+        body=plain_text_body,
+        html_body=html_body,
+        reply_to_address=validate_and_format_email_address(email_reply_to) if email_reply_to else None,
+    )
+
+
+def get_from_address(service):
+    return '"{}" <{}@{}>'.format(service.name, service.email_from, current_app.config['NOTIFY_EMAIL_DOMAIN'])
+
+
+def get_email_reply_to(notification):
+    email_reply_to = dao_get_notification_email_reply_for_notification(notification.id)
+
+    if not email_reply_to:
+        email_reply_to = notification.service.get_default_reply_to_email_address()
+    return email_reply_to
+
+
+def render_email(template_dict, personalisation, html_email_options):
+    """
+    Returns the subject, plain text body and html body of an email. An email from a template without placeholders comes
+    out the same for every recipient, so it's only rendered once for each template version and branding.
+    """
+    cache_key = (template_dict['id'], template_dict['version'], tuple(sorted(html_email_options.items())))
+    rendered_email = rendered_email_cache.get(cache_key)
+    if rendered_email is not None:
+        return rendered_email
+
+    html_email = HTMLEmailTemplate(template_dict, values=personalisation, **html_email_options)
+    plain_text_email = PlainTextEmailTemplate(template_dict, values=personalisation)
+    rendered_email = (plain_text_email.subject, str(plain_text_email), str(html_email))
+
+    if not plain_text_email.placeholders:
+        rendered_email_cache.set(
+            cache_key, rendered_email, ttl=current_app.config['TEMPLATE_VERSION_CACHE_TTL_SECONDS']
+        )
+    return rendered_email
+
+
+def get_cached_html_email_options(service):
+    cache_key = (service.branding, service.organisation_id)
+    html_email_options = html_email_options_cache.get(cache_key)
+    if html_email_options is None:
+        html_email_options = get_html_email_options(service)
+        html_email_options_cache.set(
+            cache_key, html_email_options, ttl=current_app.config['EMAIL_BRANDING_CACHE_TTL_SECONDS']
+        )
+    return html_email_options
+
+
 def get_html_email_options(service):
     govuk_banner = service.branding not in (BRANDING_ORG, BRANDING_ORG_BANNER)
     brand_banner = service.branding == BRANDING_ORG_BANNER
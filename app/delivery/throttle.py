@@ -0,0 +1,103 @@
+import time
+
+from flask import current_app
+
+from app import redis_store, statsd_client
+
+
+class ProviderThrottledException(Exception):
+    pass
+
+
+# Token buckets, each refilled at its `rate` tokens a second up to a second's worth. Callers take their tokens
+# straight away and a bucket is allowed to go negative - the debt is how long they have to wait before sending, which
+# keeps callers in the order they asked. If any bucket is already more than `max_wait` seconds in debt nothing is taken
+# from any of them and -1 is returned, so the caller can come back later instead.
+# The clock is redis's own, so workers on different hosts agree on how much each bucket has refilled.
+# KEYS: the buckets
+# ARGV: tokens wanted, max_wait, then the rate of each bucket in KEYS order
+TAKE_TOKENS_SCRIPT = """
+redis.replicate_commands()
+
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local requested = tonumber(ARGV[1])
+local max_wait = tonumber(ARGV[2])
+
+local buckets = {}
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[i + 2])
+    local bucket = redis.call('HMGET', key, 'tokens', 'updated_at')
+    local tokens = tonumber(bucket[1]) or rate
+    local updated_at = tonumber(bucket[2]) or now
+    if now > updated_at then
+        tokens = math.min(rate, tokens + (now - updated_at) * rate)
+        updated_at = now
+    end
+
+    if tokens < 0 and -tokens / rate > max_wait then
+        return '-1'
+    end
+    buckets[i] = {rate, tokens, updated_at}
+end
+
+local wait = 0
+for i, key in ipairs(KEYS) do
+    local rate, tokens, updated_at = unpack(buckets[i])
+    tokens = tokens - requested
+    redis.call('HMSET', key, 'tokens', tostring(tokens), 'updated_at', tostring(updated_at))
+    -- once the bucket would have refilled there's no need to remember it
+    redis.call('EXPIRE', key, math.ceil((rate - tokens) / rate) + 1)
+    if tokens < 0 then
+        wait = math.max(wait, -tokens / rate)
+    end
+end
+return tostring(wait)
+"""
+
+
+def cache_key_for_provider_bucket(provider_name, bulk=False):
+    return 'provider-{}-{}send-tokens'.format(provider_name, 'bulk-' if bulk else '')
+
+
+def wait_for_send_tokens(provider_name, count=1, bulk=False):
+    """
+    Holds the caller until the provider can take another `count` messages without going over its
+    PROVIDER_SEND_RATE_PER_SECOND, which is shared between every worker through redis.
+
+    Bulk sends also have to fit in their own bucket, refilled at PROVIDER_BULK_SEND_RATE_SHARE of the provider's rate,
+    so job traffic can never use up all of a provider's capacity and priority and API sends don't queue behind it.
+    Both buckets are taken from in the same script, so neither is debited unless both can be.
+
+    Raises ProviderThrottledException rather than waiting more than PROVIDER_THROTTLE_MAX_WAIT_SECONDS. Providers
+    without a configured rate, or redis being unavailable, aren't throttled at all.
+    """
+    rate = current_app.config['PROVIDER_SEND_RATE_PER_SECOND'].get(provider_name)
+    if not rate or not redis_store.active:
+        return
+
+    keys = [cache_key_for_provider_bucket(provider_name)]
+    rates = [rate]
+    if bulk:
+        keys.insert(0, cache_key_for_provider_bucket(provider_name, bulk=True))
+        rates.insert(0, rate * current_app.config['PROVIDER_BULK_SEND_RATE_SHARE'])
+
+    max_wait = current_app.config['PROVIDER_THROTTLE_MAX_WAIT_SECONDS']
+    try:
+        wait = float(redis_store.redis_store.register_script(TAKE_TOKENS_SCRIPT)(
+            keys=keys,
+            args=[count, max_wait] + rates
+        ))
+    except Exception:
+        current_app.logger.exception('Redis error throttling sends to {}'.format(provider_name))
+        return
+
+    if wait < 0:
+        statsd_client.incr('throttle.{}.deferred'.format(provider_name))
+        raise ProviderThrottledException(
+            'Sending to {} is more than {} seconds behind'.format(provider_name, max_wait)
+        )
+
+    if wait > 0:
+        statsd_client.timing('throttle.{}.wait'.format(provider_name), wait * 1000)
+        time.sleep(wait)
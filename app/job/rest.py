@@ -21,7 +21,7 @@ from app.dao.services_dao import (
 )
 
 from app.dao.templates_dao import (dao_get_template_by_id)
-from app.dao.notifications_dao import get_notifications_for_job
+from app.dao.notifications_dao import get_notifications_for_job, get_notifications_for_job_to_export
 
 from app.schemas import (
     job_schema,
@@ -34,6 +34,7 @@ from app.celery.tasks import process_job
 
 from app.models import JOB_STATUS_SCHEDULED, JOB_STATUS_PENDING, JOB_STATUS_CANCELLED, LETTER_TYPE
 
+from app.service.utils import notifications_export_response
 from app.utils import pagination_links
 
 from app.config import QueueNames
@@ -109,6 +110,14 @@ def get_all_notifications_for_service_job(service_id, job_id):
     ), 200
 
 
+@job_blueprint.route('/<job_id>/notifications/export', methods=['GET'])
+def export_notifications_for_service_job(service_id, job_id):
+    data = notifications_filter_schema.load(request.args).data
+
+    notifications = get_notifications_for_job_to_export(service_id, job_id, filter_dict=data)
+    return notifications_export_response(notifications, request.args.get('format', 'csv'))
+
+
 @job_blueprint.route('', methods=['GET'])
 def get_jobs_by_service(service_id):
     if request.args.get('limit_days'):
@@ -717,6 +717,9 @@ class ProviderDetails(db.Model):
     created_by_id = db.Column(UUID(as_uuid=True), db.ForeignKey('users.id'), index=True, nullable=True)
     created_by = db.relationship('User')
     supports_international = db.Column(db.Boolean, nullable=False, default=False)
+    # when any active provider of a type has a weight, traffic is split between those providers in proportion to
+    # their weights rather than all going to the highest priority one
+    weight = db.Column(db.Integer, nullable=False, default=0)
 
 
 class ProviderDetailsHistory(db.Model, HistoryModel):
@@ -733,6 +736,7 @@ class ProviderDetailsHistory(db.Model, HistoryModel):
     created_by_id = db.Column(UUID(as_uuid=True), db.ForeignKey('users.id'), index=True, nullable=True)
     created_by = db.relationship('User')
     supports_international = db.Column(db.Boolean, nullable=False, default=False)
+    weight = db.Column(db.Integer, nullable=False, default=0)
 
 
 JOB_STATUS_PENDING = 'pending'
@@ -978,6 +982,7 @@ class Notification(db.Model):
             ['template_id', 'template_version'],
             ['templates_history.id', 'templates_history.version'],
         ),
+        db.Index('ix_notifications_service_id_created_at_id', 'service_id', 'created_at', 'id'),
         {}
     )
 
@@ -1218,6 +1223,7 @@ class NotificationHistory(db.Model, HistoryModel):
             ['template_id', 'template_version'],
             ['templates_history.id', 'templates_history.version'],
         ),
+        db.Index('ix_notification_history_service_id_created_at', 'service_id', 'created_at'),
         {}
     )
 
@@ -1620,3 +1626,25 @@ class StatsTemplateUsageByMonth(db.Model):
             'year': self.year,
             'count': self.count
         }
+
+
+class FactNotificationStatus(db.Model):
+    __tablename__ = "ft_notification_status"
+
+    bst_date = db.Column(db.Date, index=True, primary_key=True, nullable=False)
+    service_id = db.Column(
+        UUID(as_uuid=True),
+        db.ForeignKey('services.id'),
+        index=True,
+        primary_key=True,
+        nullable=False
+    )
+    notification_type = db.Column(db.Text, primary_key=True, nullable=False)
+    key_type = db.Column(db.Text, primary_key=True, nullable=False)
+    notification_status = db.Column(db.Text, primary_key=True, nullable=False)
+    notification_count = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_ft_notification_status_service_id_bst_date', 'service_id', 'bst_date'),
+    )
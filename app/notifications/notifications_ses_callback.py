@@ -14,7 +14,7 @@ from app.dao import (
     notifications_dao
 )
 from app.celery.statistics_tasks import create_outcome_notification_statistic_tasks
-from app.notifications.process_client_response import validate_callback_data
+from app.notifications.process_client_response import buffer_status_update, validate_callback_data
 
 ses_callback_blueprint = Blueprint('notifications_ses_callback', __name__)
 
@@ -70,6 +70,9 @@ def process_ses_response(ses_request):
 
         try:
             reference = ses_message['mail']['messageId']
+            if buffer_status_update(client_name, notification_status, reference=reference):
+                return
+
             notification = notifications_dao.update_notification_status_by_reference(
                 reference,
                 notification_status
@@ -1,13 +1,18 @@
+import json
 import uuid
 
 from datetime import datetime
 from flask import current_app
 
-from app import statsd_client
+from app import notify_celery, redis_store, statsd_client
+from app.config import QueueNames, TaskNames
 from app.dao import notifications_dao
 from app.clients.sms.firetext import get_firetext_responses
 from app.clients.sms.mmg import get_mmg_responses
-from app.celery.statistics_tasks import create_outcome_notification_statistic_tasks
+from app.celery.statistics_tasks import (
+    create_outcome_job_statistic_tasks,
+    create_outcome_notification_statistic_tasks
+)
 
 
 sms_response_mapper = {
@@ -15,6 +20,17 @@ sms_response_mapper = {
     'Firetext': get_firetext_responses
 }
 
+STATUS_UPDATES_CACHE_KEY = 'notification-status-updates'
+STATUS_UPDATES_DEAD_LETTER_CACHE_KEY = 'notification-status-updates-dead-letter'
+
+# KEYS: the status updates list
+# ARGV: the most updates to take
+TAKE_STATUS_UPDATES_SCRIPT = """
+local updates = redis.call('LRANGE', KEYS[1], 0, tonumber(ARGV[1]) - 1)
+redis.call('LTRIM', KEYS[1], #updates, -1)
+return updates
+"""
+
 
 def validate_callback_data(data, fields, client_name):
     errors = []
@@ -58,6 +74,10 @@ def process_sms_client_response(status, reference, client_name):
     notification_status_message = response_dict['message']
     notification_success = response_dict['success']
 
+    if buffer_status_update(client_name, notification_status, notification_id=reference):
+        success = "{} callback succeeded. reference {} queued".format(client_name, reference)
+        return success, errors
+
     # record stats
     notification = notifications_dao.update_notification_status_by_id(reference, notification_status)
     if not notification:
@@ -85,3 +105,119 @@ def process_sms_client_response(status, reference, client_name):
 
     success = "{} callback succeeded. reference {} updated".format(client_name, reference)
     return success, errors
+
+
+def buffer_status_update(client_name, status, notification_id=None, reference=None):
+    """
+    Adds a delivery receipt to a buffer in redis rather than updating the notification straight away. The first
+    receipt into an empty buffer schedules a process-status-updates task for STATUS_UPDATE_BUFFER_SECONDS later, which
+    applies everything received in the meantime together.
+
+    Returns False if redis isn't available, in which case the caller should update the notification itself.
+    """
+    if not redis_store.active:
+        return False
+
+    try:
+        buffered_count = redis_store.redis_store.rpush(STATUS_UPDATES_CACHE_KEY, json.dumps({
+            'client_name': client_name,
+            'status': status,
+            'notification_id': notification_id,
+            'reference': reference,
+        }))
+    except Exception:
+        current_app.logger.exception('Redis error buffering {} status update'.format(client_name))
+        return False
+
+    if buffered_count == 1:
+        notify_celery.send_task(
+            name=TaskNames.PROCESS_STATUS_UPDATES,
+            queue=QueueNames.DATABASE,
+            countdown=current_app.config['STATUS_UPDATE_BUFFER_SECONDS']
+        )
+    return True
+
+
+def take_buffered_status_updates(limit):
+    if not redis_store.active:
+        return []
+
+    return [
+        json.loads(update.decode('utf-8') if isinstance(update, bytes) else update)
+        for update in redis_store.redis_store.register_script(TAKE_STATUS_UPDATES_SCRIPT)(
+            keys=[STATUS_UPDATES_CACHE_KEY],
+            args=[limit]
+        )
+    ]
+
+
+def return_status_updates_to_buffer(updates):
+    """
+    Puts updates that couldn't be applied back at the front of the buffer in their original order, so they're tried
+    again next and older receipts stay ahead of newer ones. Each update counts its attempts, and those that have failed
+    STATUS_UPDATE_MAX_ATTEMPTS times are moved to the dead letter list instead, so they can't hold up the buffer
+    forever.
+    """
+    retry = []
+    dead = []
+    for update in updates:
+        update = dict(update, attempts=update.get('attempts', 0) + 1)
+        if update['attempts'] >= current_app.config['STATUS_UPDATE_MAX_ATTEMPTS']:
+            dead.append(update)
+        else:
+            retry.append(update)
+
+    if retry:
+        # LPUSH adds each value to the front in turn, so push the last one first
+        redis_store.redis_store.lpush(STATUS_UPDATES_CACHE_KEY, *[json.dumps(update) for update in reversed(retry)])
+    if dead:
+        current_app.logger.error(
+            "Moving {} status updates to {} after {} attempts: {}".format(
+                len(dead), STATUS_UPDATES_DEAD_LETTER_CACHE_KEY, current_app.config['STATUS_UPDATE_MAX_ATTEMPTS'], dead
+            )
+        )
+        redis_store.redis_store.rpush(STATUS_UPDATES_DEAD_LETTER_CACHE_KEY, *[json.dumps(update) for update in dead])
+
+
+def apply_status_updates(updates):
+    """
+    Applies a batch of buffered delivery receipts with one update for those identified by notification id (SMS) and
+    one for those identified by provider reference (email), then records their statistics per job.
+    """
+    client_names = {}
+    by_id = []
+    by_reference = []
+    for update in updates:
+        if update['notification_id']:
+            notification_id = str(uuid.UUID(update['notification_id']))
+            by_id.append((notification_id, update['status']))
+            client_names[notification_id] = update['client_name']
+        else:
+            by_reference.append((update['reference'], update['status']))
+            client_names[update['reference']] = update['client_name']
+
+    updated = []
+    if by_id:
+        updated += [
+            (notification, client_names[str(notification.id)])
+            for notification in notifications_dao.dao_update_notification_statuses_by_id(by_id)
+        ]
+    if by_reference:
+        updated += [
+            (notification, client_names[notification.reference])
+            for notification in notifications_dao.dao_update_notification_statuses_by_reference(by_reference)
+        ]
+
+    now = datetime.utcnow()
+    for notification, client_name in updated:
+        statsd_client.incr('callback.{}.{}'.format(client_name.lower(), notification.status))
+        if notification.sent_at:
+            statsd_client.timing_with_dates(
+                'callback.{}.elapsed-time'.format(client_name.lower()), now, notification.sent_at
+            )
+
+    create_outcome_job_statistic_tasks([notification for notification, _ in updated])
+
+    current_app.logger.info(
+        "Applied {} buffered status updates, {} notifications updated".format(len(updates), len(updated))
+    )
@@ -1,4 +1,6 @@
+import itertools
 import uuid
+from collections import Counter, defaultdict
 from datetime import datetime
 
 from flask import current_app
@@ -15,6 +17,7 @@ from app.celery import provider_tasks
 from app.config import QueueNames
 from app.models import SMS_TYPE, Notification, KEY_TYPE_TEST, EMAIL_TYPE, NOTIFICATION_CREATED, ScheduledNotification
 from app.dao.notifications_dao import (dao_create_notification,
+                                       dao_create_notifications_bulk,
                                        dao_delete_notifications_and_history_by_id,
                                        dao_created_scheduled_notification,
                                        dao_create_notification_email_reply_to_mapping,
@@ -23,6 +26,20 @@ from app.v2.errors import BadRequestError
 from app.utils import get_template_instance, cache_key_for_service_template_counter, convert_bst_to_utc
 
 
+# KEYS: the daily limit key and the template counter hash
+# ARGV: the number of notifications, followed by pairs of template id and the number of notifications using it
+INCREMENT_CACHED_COUNTS_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    redis.call('INCRBY', KEYS[1], ARGV[1])
+end
+if redis.call('EXISTS', KEYS[2]) == 1 then
+    for i = 2, #ARGV, 2 do
+        redis.call('HINCRBY', KEYS[2], ARGV[i], ARGV[i + 1])
+    end
+end
+"""
+
+
 def create_content_for_notification(template, personalisation):
     template_object = get_template_instance(template.__dict__, personalisation)
     check_placeholders(template_object)
@@ -55,6 +72,79 @@ def persist_notification(
     simulated=False,
     created_by_id=None,
     status=NOTIFICATION_CREATED
+):
+    notification = build_notification(
+        template_id=template_id,
+        template_version=template_version,
+        recipient=recipient,
+        service=service,
+        personalisation=personalisation,
+        notification_type=notification_type,
+        api_key_id=api_key_id,
+        key_type=key_type,
+        created_at=created_at,
+        job_id=job_id,
+        job_row_number=job_row_number,
+        reference=reference,
+        client_reference=client_reference,
+        notification_id=notification_id,
+        created_by_id=created_by_id,
+        status=status
+    )
+
+    # if simulated create a Notification model to return but do not persist the Notification to the dB
+    if not simulated:
+        dao_create_notification(notification)
+        if key_type != KEY_TYPE_TEST:
+            increment_cached_counts(service.id, [template_id])
+        current_app.logger.info(
+            "{} {} created at {}".format(notification_type, notification.id, notification.created_at)
+        )
+    return notification
+
+
+def persist_notifications(notifications):
+    """
+    Saves a batch of notifications made by build_notification in one transaction. Notifications that already exist
+    (for example because the task saving them has been replayed) are skipped.
+
+    Returns the notifications that were created.
+    """
+    created_notifications = dao_create_notifications_bulk(notifications)
+
+    template_ids_by_service = defaultdict(list)
+    for notification in created_notifications:
+        if notification.key_type != KEY_TYPE_TEST:
+            template_ids_by_service[notification.service_id].append(notification.template_id)
+    for service_id, template_ids in template_ids_by_service.items():
+        increment_cached_counts(service_id, template_ids)
+
+    current_app.logger.info(
+        "{} of {} notifications created at {}".format(
+            len(created_notifications), len(notifications), datetime.utcnow()
+        )
+    )
+    return created_notifications
+
+
+def build_notification(
+    *,
+    template_id,
+    template_version,
+    recipient,
+    service,
+    personalisation,
+    notification_type,
+    api_key_id,
+    key_type,
+    created_at=None,
+    job_id=None,
+    job_row_number=None,
+    reference=None,
+    client_reference=None,
+    notification_id=None,
+    created_by_id=None,
+    status=NOTIFICATION_CREATED
 ):
     notification_created_at = created_at or datetime.utcnow()
     if not notification_id:
@@ -89,20 +179,29 @@ def persist_notification(
     elif notification_type == EMAIL_TYPE:
         notification.normalised_to = format_email_address(notification.to)
 
-    # if simulated create a Notification model to return but do not persist the Notification to the dB
-    if not simulated:
-        dao_create_notification(notification)
-        if key_type != KEY_TYPE_TEST:
-            if redis_store.get(redis.daily_limit_cache_key(service.id)):
-                redis_store.incr(redis.daily_limit_cache_key(service.id))
-            if redis_store.get_all_from_hash(cache_key_for_service_template_counter(service.id)):
-                redis_store.increment_hash_value(cache_key_for_service_template_counter(service.id), template_id)
-        current_app.logger.info(
-            "{} {} created at {}".format(notification_type, notification_id, notification_created_at)
-        )
     return notification
 
 
+def increment_cached_counts(service_id, template_ids):
+    """
+    Adds notifications to the service's cached daily count and template usage counts, in one round-trip to redis.
+
+    Each count is only incremented if it is already cached - if it isn't it will be worked out from the database the
+    next time it is needed. template_ids has one entry per notification, so a template may appear more than once.
+    """
+    if not redis_store.active or not template_ids:
+        return
+
+    template_counts = Counter(str(template_id) for template_id in template_ids)
+    try:
+        redis_store.redis_store.register_script(INCREMENT_CACHED_COUNTS_SCRIPT)(
+            keys=[redis.daily_limit_cache_key(service_id), cache_key_for_service_template_counter(service_id)],
+            args=[len(template_ids)] + list(itertools.chain.from_iterable(template_counts.items()))
+        )
+    except Exception:
+        current_app.logger.exception('Redis error incrementing cached counts for service {}'.format(service_id))
+
+
 def send_notification_to_queue(notification, research_mode, queue=None):
     if research_mode or notification.key_type == KEY_TYPE_TEST:
         queue = QueueNames.RESEARCH_MODE
@@ -36,6 +36,25 @@ def switch_providers(current_provider, new_provider):
     return current_provider, new_provider
 
 
+def shift_weight(current_provider, new_provider, step):
+    # Automatic update so set as notify user
+    notify_user = get_user_by_id(current_app.config['NOTIFY_USER_ID'])
+    current_provider.created_by_id = new_provider.created_by_id = notify_user.id
+
+    step = min(step, current_provider.weight)
+    current_provider.weight -= step
+    new_provider.weight += step
+
+    current_app.logger.warning('Shifting weight {} from provider {} to {}, weights are now {} and {}'.format(
+        step,
+        current_provider.identifier,
+        new_provider.identifier,
+        current_provider.weight,
+        new_provider.weight
+    ))
+    return current_provider, new_provider
+
+
 def _print_provider_switch_logs(current_provider, new_provider):
     current_app.logger.warning('Switching provider from {} to {}'.format(
         current_provider.identifier,
@@ -91,7 +91,7 @@ from app.service.service_senders_schema import (
     add_service_letter_contact_block_request,
     add_service_sms_sender_request
 )
-from app.service.utils import get_whitelist_objects
+from app.service.utils import get_whitelist_objects, notifications_export_response
 from app.service.sender import send_notification_to_service_users
 from app.service.send_notification import send_one_off_notification
 from app.schemas import (
@@ -373,6 +373,20 @@ def get_all_notifications_for_service(service_id):
     ), 200
 
 
+@service_blueprint.route('/<uuid:service_id>/notifications/export', methods=['GET'])
+def export_notifications_for_service(service_id):
+    data = notifications_filter_schema.load(request.args).data
+
+    notifications = notifications_dao.get_notifications_for_service_to_export(
+        service_id,
+        filter_dict=data,
+        limit_days=data.get('limit_days'),
+        include_jobs=data.get('include_jobs', True),
+        include_from_test_key=data.get('include_from_test_key', False)
+    )
+    return notifications_export_response(notifications, request.args.get('format', 'csv'))
+
+
 @service_blueprint.route('/<uuid:service_id>/notifications/<uuid:notification_id>', methods=['GET'])
 def get_notification_for_service(service_id, notification_id):
 
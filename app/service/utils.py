@@ -1,6 +1,12 @@
+import csv
+import io
 import itertools
+import json
+
+from flask import Response, stream_with_context
 
 from app.dao.date_util import get_financial_year
+from app.errors import InvalidRequest
 from app.models import (
     ServiceWhitelist,
     MOBILE_TYPE, EMAIL_TYPE,
@@ -54,3 +60,42 @@ def service_allowed_to_send_to(recipient, service, key_type):
                 whitelist_members
             )
         )
+
+
+NOTIFICATIONS_EXPORT_COLUMNS = [
+    'row_number', 'recipient', 'template_name', 'template_type', 'job_name', 'status', 'created_at'
+]
+
+
+def notifications_export_response(notifications, export_format):
+    """
+    Streams the notifications as CSV or, one JSON object per line, NDJSON, writing each one as it's read so the
+    export never has to be held in memory. None of the columns need personalisation, so it's never decrypted.
+    """
+    if export_format == 'csv':
+        return Response(stream_with_context(_notifications_as_csv(notifications)), mimetype='text/csv')
+    if export_format == 'ndjson':
+        return Response(stream_with_context(_notifications_as_ndjson(notifications)), mimetype='application/x-ndjson')
+    raise InvalidRequest({'format': ['{} is not one of [csv, ndjson]'.format(export_format)]}, status_code=400)
+
+
+def _notifications_as_csv(notifications):
+    line = io.StringIO()
+    writer = csv.DictWriter(line, fieldnames=NOTIFICATIONS_EXPORT_COLUMNS)
+
+    def take_line():
+        value = line.getvalue()
+        line.seek(0)
+        line.truncate()
+        return value
+
+    writer.writeheader()
+    yield take_line()
+    for notification in notifications:
+        writer.writerow(notification.serialize_for_csv())
+        yield take_line()
+
+
+def _notifications_as_ndjson(notifications):
+    for notification in notifications:
+        yield json.dumps(notification.serialize_for_csv()) + '\n'
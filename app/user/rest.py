@@ -227,8 +227,9 @@ def create_2fa_code(template_id, user_to_send_to, secret_code, recipient, person
     )
     # Assume that we never want to observe the Notify service's research mode
     # setting for this notification - we still need to be able to log into the
-    # admin even if we're doing user research using this service:
-    send_notification_to_queue(saved_notification, False, queue=QueueNames.NOTIFY)
+    # admin even if we're doing user research using this service. Users are waiting on the code to sign in, so it
+    # goes on the priority queue rather than behind other internal notifications:
+    send_notification_to_queue(saved_notification, False, queue=QueueNames.PRIORITY)
 
 
 @user_blueprint.route('/<uuid:user_id>/change-email-verification', methods=['POST'])
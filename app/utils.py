@@ -1,4 +1,7 @@
+import threading
+from collections import OrderedDict
 from datetime import datetime, timedelta
+from time import monotonic
 
 import pytz
 from flask import url_for
@@ -46,6 +49,16 @@ def get_london_midnight_in_utc(date):
         tzinfo=None)
 
 
+def get_london_day_bounds_in_utc(date):
+    """
+     The start and end of a day in London as UTC datetimes, for filtering a column with start <= column < end.
+     Unlike comparing func.date(column) to the day, that can use an index on the column.
+     :param date: the day in London
+     :return: a (start, end) tuple, for example 2016-06-17 = (2016-06-16 23:00:00, 2016-06-17 23:00:00)
+    """
+    return get_london_midnight_in_utc(date), get_london_midnight_in_utc(date + timedelta(days=1))
+
+
 def get_midnight_for_day_before(date):
     day_before = date - timedelta(1)
     return get_london_midnight_in_utc(day_before)
@@ -79,6 +92,10 @@ def cache_key_for_service_template_counter(service_id, limit_days=7):
     return "{}-template-counter-limit-{}-days".format(service_id, limit_days)
 
 
+def cache_key_for_template_version(template_id, version):
+    return "template-{}-version-{}".format(template_id, version)
+
+
 def get_public_notify_type_text(notify_type, plural=False):
     from app.models import SMS_TYPE
     notify_type_text = notify_type
@@ -86,3 +103,44 @@ def get_public_notify_type_text(notify_type, plural=False):
         notify_type_text = 'text message'
 
     return '{}{}'.format(notify_type_text, 's' if plural else '')
+
+
+class ExpiringLRUCache(object):
+    """
+    A small thread-safe cache local to this process. Entries expire `ttl` seconds after they're set, and once there
+    are more than `max_size` of them the least recently used one is dropped.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -1,4 +1,7 @@
+import base64
+import binascii
 import uuid
+from datetime import datetime
 
 from flask import jsonify, request, url_for, current_app
 from werkzeug.exceptions import abort
@@ -7,8 +10,11 @@ from app import api_user, authenticated_service
 from app.dao import notifications_dao
 from app.schema_validation import validate
 from app.v2.notifications import v2_notification_blueprint
+from app.v2.errors import BadRequestError
 from app.v2.notifications.notification_schemas import get_notifications_request
 
+CURSOR_DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+
 
 @v2_notification_blueprint.route("/<id>", methods=['GET'])
 def get_notification_by_id(id):
@@ -38,14 +44,18 @@ def get_notifications():
     if 'include_jobs' in _data:
         _data['include_jobs'] = _data['include_jobs'][0]
 
+    if 'cursor' in _data:
+        _data['cursor'] = _data['cursor'][0]
+
     data = validate(_data, get_notifications_request)
 
-    paginated_notifications = notifications_dao.get_notifications_for_service(
+    notifications = notifications_dao.get_notifications_for_service_after_cursor(
         str(authenticated_service.id),
         filter_dict=data,
         key_type=api_user.key_type,
         personalisation=True,
-        older_than=data.get('older_than'),
+        older_than=decode_cursor(data['cursor']) if 'cursor' in data else None,
+        older_than_id=data.get('older_than') if 'cursor' not in data else None,
         client_reference=data.get('reference'),
         page_size=current_app.config.get('API_PAGE_SIZE'),
         include_jobs=data.get('include_jobs')
@@ -57,12 +67,32 @@ def get_notifications():
         }
 
         if len(notifications):
-            next_query_params = dict(data, older_than=notifications[-1].id)
+            # older_than stays for clients that page by it, the cursor is used when both are given
+            next_query_params = dict(data)
+            next_query_params['older_than'] = notifications[-1].id
+            next_query_params['cursor'] = encode_cursor(notifications[-1])
             _links['next'] = url_for(".get_notifications", _external=True, **next_query_params)
 
         return _links
 
     return jsonify(
-        notifications=[notification.serialize() for notification in paginated_notifications.items],
-        links=_build_links(paginated_notifications.items)
+        notifications=[notification.serialize() for notification in notifications],
+        links=_build_links(notifications)
     ), 200
+
+
+def encode_cursor(notification):
+    """
+    The position of a notification in the list, so the next page can start straight after it. Clients should treat
+    it as opaque.
+    """
+    position = '{}|{}'.format(notification.created_at.strftime(CURSOR_DATETIME_FORMAT), notification.id)
+    return base64.urlsafe_b64encode(position.encode('utf-8')).decode('utf-8')
+
+
+def decode_cursor(cursor):
+    try:
+        created_at, notification_id = base64.urlsafe_b64decode(cursor.encode('utf-8')).decode('utf-8').split('|')
+        return datetime.strptime(created_at, CURSOR_DATETIME_FORMAT), uuid.UUID(notification_id)
+    except (ValueError, TypeError, binascii.Error):
+        raise BadRequestError(message="cursor is not valid")
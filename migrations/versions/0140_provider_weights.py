@@ -0,0 +1,23 @@
+"""
+
+Revision ID: 0140_provider_weights
+Revises: 0139_migrate_sms_allowance_data
+Create Date: 2017-11-20 10:12:31.410543
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0140_provider_weights'
+down_revision = '0139_migrate_sms_allowance_data'
+
+
+def upgrade():
+    op.add_column('provider_details', sa.Column('weight', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('provider_details_history', sa.Column('weight', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    op.drop_column('provider_details_history', 'weight')
+    op.drop_column('provider_details', 'weight')
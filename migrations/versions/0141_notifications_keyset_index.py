@@ -0,0 +1,24 @@
+"""
+
+Revision ID: 0141_notifications_keyset_index
+Revises: 0140_provider_weights
+Create Date: 2017-11-27 11:02:14.173526
+
+"""
+from alembic import op
+
+
+revision = '0141_notifications_keyset_index'
+down_revision = '0140_provider_weights'
+
+
+def upgrade():
+    op.create_index(
+        'ix_notifications_service_id_created_at_id',
+        'notifications',
+        ['service_id', 'created_at', 'id']
+    )
+
+
+def downgrade():
+    op.drop_index('ix_notifications_service_id_created_at_id', table_name='notifications')
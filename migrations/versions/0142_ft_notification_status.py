@@ -0,0 +1,35 @@
+"""
+
+Revision ID: 0142_ft_notification_status
+Revises: 0141_notifications_keyset_index
+Create Date: 2017-11-28 15:21:43.619282
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = '0142_ft_notification_status'
+down_revision = '0141_notifications_keyset_index'
+
+
+def upgrade():
+    op.create_table('ft_notification_status',
+    sa.Column('bst_date', sa.Date(), nullable=False),
+    sa.Column('service_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('notification_type', sa.Text(), nullable=False),
+    sa.Column('key_type', sa.Text(), nullable=False),
+    sa.Column('notification_status', sa.Text(), nullable=False),
+    sa.Column('notification_count', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['service_id'], ['services.id'], ),
+    sa.PrimaryKeyConstraint('bst_date', 'service_id', 'notification_type', 'key_type', 'notification_status')
+    )
+    op.create_index(op.f('ix_ft_notification_status_bst_date'), 'ft_notification_status', ['bst_date'], unique=False)
+    op.create_index(op.f('ix_ft_notification_status_service_id'), 'ft_notification_status', ['service_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_ft_notification_status_service_id'), table_name='ft_notification_status')
+    op.drop_index(op.f('ix_ft_notification_status_bst_date'), table_name='ft_notification_status')
+    op.drop_table('ft_notification_status')
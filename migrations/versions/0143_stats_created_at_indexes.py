@@ -0,0 +1,30 @@
+"""
+
+Revision ID: 0143_stats_created_at_indexes
+Revises: 0142_ft_notification_status
+Create Date: 2017-11-29 10:12:37.406152
+
+"""
+from alembic import op
+
+
+revision = '0143_stats_created_at_indexes'
+down_revision = '0142_ft_notification_status'
+
+
+def upgrade():
+    op.create_index(
+        'ix_notification_history_service_id_created_at',
+        'notification_history',
+        ['service_id', 'created_at']
+    )
+    op.create_index(
+        'ix_ft_notification_status_service_id_bst_date',
+        'ft_notification_status',
+        ['service_id', 'bst_date']
+    )
+
+
+def downgrade():
+    op.drop_index('ix_ft_notification_status_service_id_bst_date', table_name='ft_notification_status')
+    op.drop_index('ix_notification_history_service_id_created_at', table_name='notification_history')
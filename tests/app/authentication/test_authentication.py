@@ -9,10 +9,11 @@ from flask import json, current_app
 from freezegun import freeze_time
 from notifications_python_client.authentication import create_jwt_token
 
-from app import api_user
+from app import api_user, db
 from app.dao.api_key_dao import get_unsigned_secrets, save_model_api_key, get_unsigned_secret, expire_api_key
 from app.models import ApiKey, KEY_TYPE_NORMAL
-from app.authentication.auth import restrict_ip_sms, AuthError, check_route_secret
+from app.authentication.auth import restrict_ip_sms, AuthError, check_route_secret, get_decode_errors
+from app.dao.services_dao import dao_update_service
 
 
 # Test the require_admin_auth and require_auth methods
@@ -254,6 +255,7 @@ def test_authentication_returns_error_when_service_doesnt_exit(
 
 def test_authentication_returns_error_when_service_inactive(client, sample_api_key):
     sample_api_key.service.active = False
+    dao_update_service(sample_api_key.service)
     token = create_jwt_token(secret=str(sample_api_key.id), client_id=str(sample_api_key.service_id))
 
     response = client.get('/notifications', headers={'Authorization': 'Bearer {}'.format(token)})
@@ -304,6 +306,84 @@ def test_should_return_403_when_token_is_expired(client,
     ]}
 
 
+def test_authentication_only_loads_service_and_api_keys_once(client, sample_api_key, mocker):
+    create_session = mocker.spy(db, 'create_session')
+    token = __create_token(sample_api_key.service_id)
+
+    for _ in range(2):
+        response = client.get('/notifications', headers={'Authorization': 'Bearer {}'.format(token)})
+        assert response.status_code == 200
+
+    assert create_session.call_count == 1
+
+
+def test_authentication_sees_api_key_revoked_after_service_is_cached(client, sample_api_key):
+    token = __create_token(sample_api_key.service_id)
+    response = client.get('/notifications', headers={'Authorization': 'Bearer {}'.format(token)})
+    assert response.status_code == 200
+
+    expire_api_key(service_id=sample_api_key.service_id, api_key_id=sample_api_key.id)
+
+    response = client.get('/notifications', headers={'Authorization': 'Bearer {}'.format(token)})
+    assert response.status_code == 403
+    assert json.loads(response.get_data())['message'] == {"token": ['Invalid token: API key revoked']}
+
+
+def test_authentication_sees_service_archived_after_service_is_cached(client, sample_api_key):
+    token = __create_token(sample_api_key.service_id)
+    response = client.get('/notifications', headers={'Authorization': 'Bearer {}'.format(token)})
+    assert response.status_code == 200
+
+    sample_api_key.service.active = False
+    dao_update_service(sample_api_key.service)
+
+    response = client.get('/notifications', headers={'Authorization': 'Bearer {}'.format(token)})
+    assert response.status_code == 403
+    assert json.loads(response.get_data())['message'] == {"token": ['Invalid token: service is archived']}
+
+
+def test_authentication_checks_key_named_in_token_header_first(client, sample_api_key, mocker):
+    for name in ['first key', 'second key']:
+        save_model_api_key(ApiKey(
+            service=sample_api_key.service,
+            name=name,
+            created_by=sample_api_key.created_by,
+            key_type=KEY_TYPE_NORMAL
+        ))
+    api_key = ApiKey.query.filter_by(name='second key').one()
+    token = jwt.encode(
+        payload={'iss': str(sample_api_key.service_id), 'iat': int(time.time())},
+        key=get_unsigned_secret(api_key.id),
+        headers={'kid': str(api_key.id)}
+    ).decode()
+    mock_get_decode_errors = mocker.patch('app.authentication.auth.get_decode_errors', wraps=get_decode_errors)
+
+    response = client.get('/notifications', headers={'Authorization': 'Bearer {}'.format(token)})
+
+    assert response.status_code == 200
+    assert mock_get_decode_errors.call_count == 1
+
+
+def test_authentication_checks_last_used_key_first(client, sample_api_key, mocker):
+    save_model_api_key(ApiKey(
+        service=sample_api_key.service,
+        name='another key',
+        created_by=sample_api_key.created_by,
+        key_type=KEY_TYPE_NORMAL
+    ))
+    api_key = ApiKey.query.filter_by(name='another key').one()
+    token = create_jwt_token(
+        secret=get_unsigned_secret(api_key.id),
+        client_id=str(sample_api_key.service_id))
+    client.get('/notifications', headers={'Authorization': 'Bearer {}'.format(token)})
+    mock_get_decode_errors = mocker.patch('app.authentication.auth.get_decode_errors', wraps=get_decode_errors)
+
+    response = client.get('/notifications', headers={'Authorization': 'Bearer {}'.format(token)})
+
+    assert response.status_code == 200
+    assert mock_get_decode_errors.call_count == 1
+
+
 def __create_token(service_id):
     return create_jwt_token(secret=get_unsigned_secrets(service_id)[0],
                             client_id=str(service_id))
@@ -1,3 +1,4 @@
+import io
 from unittest.mock import call
 from datetime import datetime, timedelta
 
@@ -9,9 +10,11 @@ from app.aws.s3 import (
     get_s3_bucket_objects,
     get_s3_file,
     filter_s3_bucket_objects_within_date_range,
-    remove_transformed_dvla_file
+    remove_transformed_dvla_file,
+    stream_job_from_s3
 )
 from tests.app.conftest import datetime_in_past
+from tests.conftest import set_config
 
 
 def single_s3_object_stub(key='foo', last_modified=datetime.utcnow()):
@@ -32,6 +35,40 @@ def test_get_s3_file_makes_correct_call(notify_api, mocker):
     )
 
 
+def test_stream_job_from_s3_yields_lines_across_chunk_boundaries(notify_api, mocker):
+    file_data = 'phone number,name\r\n07700900001,Zoë\r\n07700900002,Chloë\r\n'.encode('utf-8')
+    body = io.BytesIO(file_data)
+    get_s3_mock = mocker.patch('app.aws.s3.get_s3_object')
+    get_s3_mock.return_value.get.return_value = {'Body': body}
+    read_spy = mocker.spy(body, 'read')
+
+    with set_config(notify_api, 'S3_JOB_READ_CHUNK_SIZE', 5):
+        lines = list(stream_job_from_s3('service-id', 'job-id'))
+
+    get_s3_mock.assert_called_once_with(
+        current_app.config['CSV_UPLOAD_BUCKET_NAME'],
+        'service-service-id-notify/job-id.csv'
+    )
+    assert read_spy.call_count > 1
+    assert lines == ['phone number,name\r\n', '07700900001,Zoë\r\n', '07700900002,Chloë\r\n']
+
+
+def test_stream_job_from_s3_yields_last_line_without_line_ending(notify_api, mocker):
+    get_s3_mock = mocker.patch('app.aws.s3.get_s3_object')
+    get_s3_mock.return_value.get.return_value = {'Body': io.BytesIO(b'phone number\n07700900001')}
+
+    assert list(stream_job_from_s3('service-id', 'job-id')) == ['phone number\n', '07700900001']
+
+
+def test_stream_job_from_s3_only_fetches_the_file_from_start_byte(notify_api, mocker):
+    get_s3_mock = mocker.patch('app.aws.s3.get_s3_object')
+    get_s3_mock.return_value.get.return_value = {'Body': io.BytesIO(b'07700900002\n')}
+
+    assert list(stream_job_from_s3('service-id', 'job-id', start_byte=25)) == ['07700900002\n']
+
+    get_s3_mock.return_value.get.assert_called_once_with(Range='bytes=25-')
+
+
 def test_remove_transformed_dvla_file_makes_correct_call(notify_api, mocker):
     s3_mock = mocker.patch('app.aws.s3.get_s3_object')
     fake_uuid = '5fbf9799-6b9b-4dbb-9a4e-74a939f3bb49'
@@ -139,3 +176,15 @@ def test_get_s3_bucket_objects_does_not_return_outside_of_date_range(notify_api,
     filtered_items = filter_s3_bucket_objects_within_date_range(s3_objects_stub)
 
     assert len(filtered_items) == 0
+
+
+def test_stream_job_from_s3_closes_the_body_when_the_generator_is_closed(notify_api, mocker):
+    body = io.BytesIO(b'phone number\n07700900001\n')
+    get_s3_mock = mocker.patch('app.aws.s3.get_s3_object')
+    get_s3_mock.return_value.get.return_value = {'Body': body}
+
+    lines = stream_job_from_s3('service-id', 'job-id')
+    assert next(lines) == 'phone number\n'
+    lines.close()
+
+    assert body.closed
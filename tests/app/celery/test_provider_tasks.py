@@ -1,13 +1,20 @@
+import uuid
+from unittest.mock import Mock
+
+import pytest
 from celery.exceptions import MaxRetriesExceededError
 from notifications_utils.recipients import InvalidEmailError
 
 import app
 from app.celery import provider_tasks
-from app.celery.provider_tasks import deliver_sms, deliver_email
+from app.delivery.throttle import ProviderThrottledException
+from app.celery.provider_tasks import deliver_sms, deliver_sms_batch, deliver_email, deliver_email_batch
 
 
 def test_should_have_decorated_tasks_functions():
     assert deliver_sms.__wrapped__.__name__ == 'deliver_sms'
+    assert deliver_sms_batch.__wrapped__.__name__ == 'deliver_sms_batch'
+    assert deliver_email_batch.__wrapped__.__name__ == 'deliver_email_batch'
     assert deliver_email.__wrapped__.__name__ == 'deliver_email'
 
 
@@ -36,6 +43,75 @@ def test_should_add_to_retry_queue_if_notification_not_found_in_deliver_sms_task
     app.celery.provider_tasks.deliver_sms.retry.assert_called_with(queue="retry-tasks")
 
 
+def test_deliver_sms_batch_sends_notifications_to_provider_as_a_batch(sample_notification, mocker):
+    send_batch = mocker.patch('app.delivery.send_to_providers.send_sms_batch_to_provider', return_value=[])
+    mocked_deliver_sms = mocker.patch('app.celery.provider_tasks.deliver_sms.apply_async')
+
+    deliver_sms_batch([str(sample_notification.id)])
+
+    send_batch.assert_called_once_with([sample_notification])
+    assert not mocked_deliver_sms.called
+
+
+def test_deliver_sms_batch_sends_notifications_the_batch_could_not_send_individually(sample_notification, mocker):
+    mocker.patch(
+        'app.delivery.send_to_providers.send_sms_batch_to_provider', return_value=[sample_notification.id]
+    )
+    mocked_deliver_sms = mocker.patch('app.celery.provider_tasks.deliver_sms.apply_async')
+
+    deliver_sms_batch([str(sample_notification.id)])
+
+    mocked_deliver_sms.assert_called_once_with([str(sample_notification.id)], queue="send-bulk-tasks")
+
+
+def test_deliver_sms_batch_sends_every_notification_individually_if_the_batch_errors(notify_db_session, mocker):
+    mocker.patch('app.delivery.send_to_providers.send_sms_batch_to_provider', side_effect=Exception('Error'))
+    mocked_deliver_sms = mocker.patch('app.celery.provider_tasks.deliver_sms.apply_async')
+    notification_ids = [str(app.create_uuid()), str(app.create_uuid())]
+
+    deliver_sms_batch(notification_ids)
+
+    assert [args[0] for args, kwargs in mocked_deliver_sms.call_args_list] == [[id] for id in notification_ids]
+
+
+def test_deliver_sms_batch_defers_the_batch_if_throttled(sample_notification, mocker):
+    mocker.patch(
+        'app.delivery.send_to_providers.send_sms_batch_to_provider', side_effect=ProviderThrottledException('throttled')
+    )
+    retry = mocker.patch('app.celery.provider_tasks.deliver_sms_batch.retry')
+    mocked_deliver_sms = mocker.patch('app.celery.provider_tasks.deliver_sms.apply_async')
+
+    deliver_sms_batch([str(sample_notification.id)])
+
+    retry.assert_called_once_with(queue="retry-tasks", countdown=10)
+    assert not mocked_deliver_sms.called
+
+
+def test_deliver_email_batch_sends_notifications_the_batch_could_not_send_individually(
+        sample_email_notification,
+        mocker
+):
+    send_batch = mocker.patch(
+        'app.delivery.send_to_providers.send_email_batch_to_provider', return_value=[sample_email_notification.id]
+    )
+    mocked_deliver_email = mocker.patch('app.celery.provider_tasks.deliver_email.apply_async')
+
+    deliver_email_batch([str(sample_email_notification.id)])
+
+    send_batch.assert_called_once_with([sample_email_notification])
+    mocked_deliver_email.assert_called_once_with([str(sample_email_notification.id)], queue="send-bulk-tasks")
+
+
+def test_deliver_email_batch_sends_every_notification_individually_if_the_batch_errors(notify_db_session, mocker):
+    mocker.patch('app.delivery.send_to_providers.send_email_batch_to_provider', side_effect=Exception('Error'))
+    mocked_deliver_email = mocker.patch('app.celery.provider_tasks.deliver_email.apply_async')
+    notification_ids = [str(app.create_uuid()), str(app.create_uuid())]
+
+    deliver_email_batch(notification_ids)
+
+    assert [args[0] for args, kwargs in mocked_deliver_email.call_args_list] == [[id] for id in notification_ids]
+
+
 def test_should_call_send_email_to_provider_from_deliver_email_task(
         notify_db,
         notify_db_session,
@@ -81,6 +157,42 @@ def test_should_go_into_technical_error_if_exceeds_retries_on_deliver_email_task
     assert sample_notification.status == 'technical-failure'
 
 
+def test_deliver_sms_retries_shortly_if_throttled(sample_notification, mocker):
+    mocker.patch(
+        'app.delivery.send_to_providers.send_sms_to_provider', side_effect=ProviderThrottledException('throttled')
+    )
+    mocker.patch('app.celery.provider_tasks.deliver_sms.retry')
+
+    deliver_sms(sample_notification.id)
+
+    provider_tasks.deliver_sms.retry.assert_called_once_with(queue="retry-tasks", countdown=10)
+    assert sample_notification.status == 'created'
+
+
+@pytest.mark.parametrize('routing_key, expected_queue', [
+    ('priority-tasks', 'priority-tasks'),
+    ('send-sms-tasks', 'retry-tasks'),
+])
+def test_retry_throttled_keeps_priority_sends_on_the_priority_queue(notify_api, routing_key, expected_queue):
+    task = Mock()
+    task.request.delivery_info = {'routing_key': routing_key}
+
+    provider_tasks.retry_throttled(task, uuid.uuid4())
+
+    task.retry.assert_called_once_with(queue=expected_queue, countdown=10)
+
+
+def test_deliver_email_retries_shortly_if_throttled(sample_email_notification, mocker):
+    mocker.patch(
+        'app.delivery.send_to_providers.send_email_to_provider', side_effect=ProviderThrottledException('throttled')
+    )
+    mocker.patch('app.celery.provider_tasks.deliver_email.retry')
+
+    deliver_email(sample_email_notification.id)
+
+    provider_tasks.deliver_email.retry.assert_called_once_with(queue="retry-tasks", countdown=10)
+
+
 def test_should_technical_error_and_not_retry_if_invalid_email(sample_notification, mocker):
     mocker.patch('app.delivery.send_to_providers.send_email_to_provider', side_effect=InvalidEmailError('bad email'))
     mocker.patch('app.celery.provider_tasks.deliver_email.retry')
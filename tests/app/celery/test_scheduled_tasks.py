@@ -1,4 +1,4 @@
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from functools import partial
 from unittest.mock import call, patch, PropertyMock
 
@@ -33,11 +33,12 @@ from app.celery.scheduled_tasks import (
     switch_current_sms_provider_on_slow_delivery,
     timeout_job_statistics,
     timeout_notifications,
-    daily_stats_template_usage_by_month
+    daily_stats_template_usage_by_month,
+    update_fact_notification_status_for_recent_days
 )
 from app.clients.performance_platform.performance_platform_client import PerformancePlatformClient
 from app.config import QueueNames, TaskNames
-from app.dao.jobs_dao import dao_get_job_by_id
+from app.dao.jobs_dao import dao_get_job_by_id, dao_update_job
 from app.dao.notifications_dao import dao_get_scheduled_notifications
 from app.dao.provider_details_dao import (
     dao_update_provider_details,
@@ -843,6 +844,20 @@ def test_check_job_status_task_raises_job_incomplete_error_for_multiple_jobs(moc
     )
 
 
+def test_check_job_status_task_does_not_raise_for_a_job_still_making_progress(mocker, sample_template):
+    mock_celery = mocker.patch('app.celery.tasks.notify_celery.send_task')
+    job = create_job(template=sample_template, notification_count=100000,
+                     created_at=datetime.utcnow() - timedelta(hours=2),
+                     processing_started=datetime.utcnow() - timedelta(minutes=31),
+                     job_status=JOB_STATUS_IN_PROGRESS)
+    job.updated_at = datetime.utcnow() - timedelta(minutes=5)
+    dao_update_job(job)
+
+    check_job_status()
+
+    assert not mock_celery.called
+
+
 def test_daily_stats_template_usage_by_month(notify_db, notify_db_session):
     notification_history = functools.partial(
         create_notification_history,
@@ -986,3 +1001,19 @@ def test_dao_fetch_monthly_historical_stats_by_template_null_template_id_not_cou
     ).all()
 
     assert len(result) == 1
+
+
+@freeze_time('2018-07-10T23:30:00')
+def test_update_fact_notification_status_for_recent_days_refreshes_the_days_before_today_in_london(
+    notify_api, mocker
+):
+    mock_update = mocker.patch('app.celery.scheduled_tasks.update_fact_notification_status')
+
+    update_fact_notification_status_for_recent_days()
+
+    assert mock_update.call_args_list == [
+        call(date(2018, 7, 10)),
+        call(date(2018, 7, 9)),
+        call(date(2018, 7, 8)),
+        call(date(2018, 7, 7)),
+    ]
@@ -1,9 +1,16 @@
+from collections import Counter
+from unittest.mock import call
+
 import pytest
 from app.celery.statistics_tasks import (
     record_initial_job_statistics,
     record_outcome_job_statistics,
+    record_outcome_job_statistics_counts,
     create_initial_notification_statistic_tasks,
-    create_outcome_notification_statistic_tasks)
+    create_outcome_job_statistic_tasks,
+    create_outcome_notification_statistic_tasks,
+    flush_job_statistics,
+    increment_cached_job_statistics)
 from sqlalchemy.exc import SQLAlchemyError
 from app import create_uuid
 from tests.app.conftest import sample_notification
@@ -162,3 +169,93 @@ def test_should_retry_if_persisting_the_job_stats_outcome_cant_find_notification
     record_outcome_job_statistics(str(create_uuid()))
     dao_mock.assert_not_called()
     retry_mock.assert_called_with(queue="retry-tasks")
+
+
+def test_create_outcome_job_statistic_tasks_creates_one_task_per_job(
+    notify_db, notify_db_session, sample_job, mocker
+):
+    mock = mocker.patch("app.celery.statistics_tasks.record_outcome_job_statistics_counts.apply_async")
+    notifications = [
+        sample_notification(notify_db, notify_db_session, job=sample_job, status=status)
+        for status in [NOTIFICATION_DELIVERED, NOTIFICATION_DELIVERED, 'permanent-failure', NOTIFICATION_PENDING]
+    ] + [sample_notification(notify_db, notify_db_session, status=NOTIFICATION_DELIVERED)]
+
+    create_outcome_job_statistic_tasks(notifications)
+
+    mock.assert_called_once_with((str(sample_job.id), 'sms', 2, 1), queue="statistics-tasks")
+
+
+def test_record_outcome_job_statistics_counts_retries_if_job_stats_not_created_yet(sample_job, mocker):
+    mocker.patch("app.celery.statistics_tasks.update_job_stats_outcome_counts", return_value=0)
+    mock_retry = mocker.patch('app.celery.statistics_tasks.record_outcome_job_statistics_counts.retry')
+
+    record_outcome_job_statistics_counts(str(sample_job.id), 'sms', 2, 1)
+
+    mock_retry.assert_called_with(queue="retry-tasks")
+
+
+def test_create_initial_notification_statistic_tasks_counts_in_redis_if_enabled(
+    notify_db, notify_db_session, sample_job, mocker
+):
+    mocker.patch('app.celery.statistics_tasks.redis_store.active', True)
+    mock_redis = mocker.patch('app.celery.statistics_tasks.redis_store.redis_store')
+    mock_task = mocker.patch("app.celery.statistics_tasks.record_initial_job_statistics.apply_async")
+    notification = sample_notification(notify_db, notify_db_session, job=sample_job)
+
+    create_initial_notification_statistic_tasks(notification)
+
+    mock_redis.pipeline.return_value.hincrby.assert_called_once_with(
+        'job-statistics-counts', '{}:sms:sent'.format(sample_job.id), 1
+    )
+    mock_task.assert_not_called()
+
+
+def test_create_outcome_job_statistic_tasks_falls_back_to_tasks_if_redis_errors(
+    notify_db, notify_db_session, sample_job, mocker
+):
+    mocker.patch('app.celery.statistics_tasks.redis_store.active', True)
+    mock_redis = mocker.patch('app.celery.statistics_tasks.redis_store.redis_store')
+    mock_redis.pipeline.return_value.execute.side_effect = Exception('redis is down')
+    mock_task = mocker.patch("app.celery.statistics_tasks.record_outcome_job_statistics_counts.apply_async")
+    notification = sample_notification(notify_db, notify_db_session, job=sample_job, status=NOTIFICATION_DELIVERED)
+
+    create_outcome_job_statistic_tasks([notification])
+
+    mock_task.assert_called_once_with((str(sample_job.id), 'sms', 1, 0), queue="statistics-tasks")
+
+
+def test_increment_cached_job_statistics_returns_false_if_redis_disabled(mocker):
+    assert increment_cached_job_statistics(Counter({('job-id', 'sms', 'sent'): 1})) is False
+
+
+def test_flush_job_statistics_writes_cached_counts(mocker):
+    mocker.patch('app.celery.statistics_tasks.redis_store.active', True)
+    mock_redis = mocker.patch('app.celery.statistics_tasks.redis_store.redis_store')
+    mock_redis.register_script.return_value.return_value = [b'job-id:sms:sent', b'3', b'job-id:sms:failed', b'1']
+    mock_dao = mocker.patch('app.celery.statistics_tasks.dao_add_job_statistics_counts')
+
+    flush_job_statistics()
+
+    mock_dao.assert_called_once_with(Counter({('job-id', 'sms', 'sent'): 3, ('job-id', 'sms', 'failed'): 1}))
+
+
+def test_flush_job_statistics_puts_counts_back_if_database_errors(mocker):
+    mocker.patch('app.celery.statistics_tasks.redis_store.active', True)
+    mock_redis = mocker.patch('app.celery.statistics_tasks.redis_store.redis_store')
+    mock_redis.register_script.return_value.return_value = [b'job-id:sms:sent', b'3']
+    mocker.patch('app.celery.statistics_tasks.dao_add_job_statistics_counts', side_effect=SQLAlchemyError())
+
+    with pytest.raises(SQLAlchemyError):
+        flush_job_statistics()
+
+    assert mock_redis.pipeline.return_value.hincrby.call_args_list == [
+        call('job-statistics-counts', 'job-id:sms:sent', 3)
+    ]
+
+
+def test_flush_job_statistics_does_nothing_if_nothing_cached(mocker):
+    mock_dao = mocker.patch('app.celery.statistics_tasks.dao_add_job_statistics_counts')
+
+    flush_job_statistics()
+
+    mock_dao.assert_not_called()
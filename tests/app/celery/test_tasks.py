@@ -1,8 +1,9 @@
 import codecs
+import io
 import json
 import uuid
 from datetime import datetime, timedelta
-from unittest.mock import Mock
+from unittest.mock import ANY, Mock, call
 import pytest
 import requests_mock
 from flask import current_app
@@ -20,10 +21,16 @@ from app.celery.tasks import (
     build_dvla_file,
     create_dvla_file_contents_for_job,
     process_job,
+    process_job_slice,
     process_row,
+    process_status_updates,
+    process_row_batch,
+    get_recipients_and_personalisation_for_job,
     save_sms,
     save_email,
     save_letter,
+    save_sms_batch,
+    save_email_batch,
     process_incomplete_job,
     process_incomplete_jobs,
     get_template_class,
@@ -35,6 +42,7 @@ from app.dao import jobs_dao, services_dao
 from app.models import (
     Job,
     Notification,
+    NotificationHistory,
     EMAIL_TYPE,
     KEY_TYPE_NORMAL,
     KEY_TYPE_TEAM,
@@ -47,6 +55,7 @@ from app.models import (
 )
 
 from tests.app import load_example_csv
+from tests.conftest import set_config, set_config_values
 from tests.app.conftest import (
     sample_service as create_sample_service,
     sample_template as create_sample_template,
@@ -86,11 +95,23 @@ def _notification_json(template, to, personalisation=None, job_id=None, row_numb
     }
 
 
+def _batched_row_numbers(process_row_batch_mock):
+    return [
+        row_number
+        for batch_call in process_row_batch_mock.call_args_list
+        for row_number, _, _ in batch_call[0][0]
+    ]
+
+
 def test_should_have_decorated_tasks_functions():
     assert process_job.__wrapped__.__name__ == 'process_job'
+    assert process_job_slice.__wrapped__.__name__ == 'process_job_slice'
+    assert process_status_updates.__wrapped__.__name__ == 'process_status_updates'
     assert save_sms.__wrapped__.__name__ == 'save_sms'
     assert save_email.__wrapped__.__name__ == 'save_email'
     assert save_letter.__wrapped__.__name__ == 'save_letter'
+    assert save_sms_batch.__wrapped__.__name__ == 'save_sms_batch'
+    assert save_email_batch.__wrapped__.__name__ == 'save_email_batch'
 
 
 @pytest.fixture
@@ -102,26 +123,29 @@ def email_job_with_placeholders(notify_db, notify_db_session, sample_email_templ
 
 
 def test_should_process_sms_job(sample_job, mocker):
-    mocker.patch('app.celery.tasks.s3.get_job_from_s3', return_value=load_example_csv('sms'))
-    mocker.patch('app.celery.tasks.save_sms.apply_async')
+    mocker.patch('app.celery.tasks.s3.stream_job_from_s3', return_value=io.StringIO(load_example_csv('sms')))
+    mocker.patch('app.celery.tasks.save_sms_batch.apply_async')
     mocker.patch('app.encryption.encrypt', return_value="something_encrypted")
     mocker.patch('app.celery.tasks.build_dvla_file')
     mocker.patch('app.celery.tasks.create_uuid', return_value="uuid")
     mocker.patch('app.celery.tasks.build_dvla_file')
 
     process_job(sample_job.id)
-    s3.get_job_from_s3.assert_called_once_with(
+    s3.stream_job_from_s3.assert_called_once_with(
         str(sample_job.service.id),
         str(sample_job.id)
     )
-    assert encryption.encrypt.call_args[0][0]['to'] == '+441234123123'
-    assert encryption.encrypt.call_args[0][0]['template'] == str(sample_job.template.id)
-    assert encryption.encrypt.call_args[0][0]['template_version'] == sample_job.template.version
-    assert encryption.encrypt.call_args[0][0]['personalisation'] == {'phonenumber': '+441234123123'}
-    assert encryption.encrypt.call_args[0][0]['row_number'] == 0
-    tasks.save_sms.apply_async.assert_called_once_with(
+    assert encryption.encrypt.call_args[0][0] == [{
+        'id': 'uuid',
+        'template': str(sample_job.template.id),
+        'template_version': sample_job.template.version,
+        'job': str(sample_job.id),
+        'to': '+441234123123',
+        'row_number': 0,
+        'personalisation': {'phonenumber': '+441234123123'}
+    }]
+    tasks.save_sms_batch.apply_async.assert_called_once_with(
         (str(sample_job.service_id),
-         "uuid",
          "something_encrypted"),
         queue="database-tasks"
     )
@@ -137,16 +161,16 @@ def test_should_not_process_sms_job_if_would_exceed_send_limits(notify_db,
     service = create_sample_service(notify_db, notify_db_session, limit=9)
     job = create_sample_job(notify_db, notify_db_session, service=service, notification_count=10)
 
-    mocker.patch('app.celery.tasks.s3.get_job_from_s3', return_value=load_example_csv('multiple_sms'))
-    mocker.patch('app.celery.tasks.process_row')
+    mocker.patch('app.celery.tasks.s3.stream_job_from_s3', return_value=io.StringIO(load_example_csv('multiple_sms')))
+    mocker.patch('app.celery.tasks.process_rows')
     mocker.patch('app.celery.tasks.build_dvla_file')
 
     process_job(job.id)
 
     job = jobs_dao.dao_get_job_by_id(job.id)
     assert job.job_status == 'sending limits exceeded'
-    assert s3.get_job_from_s3.called is False
-    assert tasks.process_row.called is False
+    assert s3.stream_job_from_s3.called is False
+    assert tasks.process_rows.called is False
     tasks.build_dvla_file.assert_not_called()
 
 
@@ -158,16 +182,16 @@ def test_should_not_process_sms_job_if_would_exceed_send_limits_inc_today(notify
 
     create_sample_notification(notify_db, notify_db_session, service=service, job=job)
 
-    mocker.patch('app.celery.tasks.s3.get_job_from_s3', return_value=load_example_csv('sms'))
-    mocker.patch('app.celery.tasks.process_row')
+    mocker.patch('app.celery.tasks.s3.stream_job_from_s3', return_value=io.StringIO(load_example_csv('sms')))
+    mocker.patch('app.celery.tasks.process_rows')
     mocker.patch('app.celery.tasks.build_dvla_file')
 
     process_job(job.id)
 
     job = jobs_dao.dao_get_job_by_id(job.id)
     assert job.job_status == 'sending limits exceeded'
-    assert s3.get_job_from_s3.called is False
-    assert tasks.process_row.called is False
+    assert s3.stream_job_from_s3.called is False
+    assert tasks.process_rows.called is False
     tasks.build_dvla_file.assert_not_called()
 
 
@@ -178,16 +202,16 @@ def test_should_not_process_email_job_if_would_exceed_send_limits_inc_today(noti
 
     create_sample_notification(notify_db, notify_db_session, service=service, job=job)
 
-    mocker.patch('app.celery.tasks.s3.get_job_from_s3')
-    mocker.patch('app.celery.tasks.process_row')
+    mocker.patch('app.celery.tasks.s3.stream_job_from_s3')
+    mocker.patch('app.celery.tasks.process_rows')
     mocker.patch('app.celery.tasks.build_dvla_file')
 
     process_job(job.id)
 
     job = jobs_dao.dao_get_job_by_id(job.id)
     assert job.job_status == 'sending limits exceeded'
-    assert s3.get_job_from_s3.called is False
-    assert tasks.process_row.called is False
+    assert s3.stream_job_from_s3.called is False
+    assert tasks.process_rows.called is False
     tasks.build_dvla_file.assert_not_called()
 
 
@@ -197,30 +221,30 @@ def test_should_not_process_email_job_if_would_exceed_send_limits(notify_db, not
     template = create_sample_email_template(notify_db, notify_db_session, service=service)
     job = create_sample_job(notify_db, notify_db_session, service=service, template=template)
 
-    mocker.patch('app.celery.tasks.s3.get_job_from_s3')
-    mocker.patch('app.celery.tasks.process_row')
+    mocker.patch('app.celery.tasks.s3.stream_job_from_s3')
+    mocker.patch('app.celery.tasks.process_rows')
     mocker.patch('app.celery.tasks.build_dvla_file')
 
     process_job(job.id)
 
     job = jobs_dao.dao_get_job_by_id(job.id)
     assert job.job_status == 'sending limits exceeded'
-    assert s3.get_job_from_s3.called is False
-    assert tasks.process_row.called is False
+    assert s3.stream_job_from_s3.called is False
+    assert tasks.process_rows.called is False
     tasks.build_dvla_file.assert_not_called()
 
 
 def test_should_not_process_job_if_already_pending(notify_db, notify_db_session, mocker):
     job = create_sample_job(notify_db, notify_db_session, job_status='scheduled')
 
-    mocker.patch('app.celery.tasks.s3.get_job_from_s3')
-    mocker.patch('app.celery.tasks.process_row')
+    mocker.patch('app.celery.tasks.s3.stream_job_from_s3')
+    mocker.patch('app.celery.tasks.process_rows')
     mocker.patch('app.celery.tasks.build_dvla_file')
 
     process_job(job.id)
 
-    assert s3.get_job_from_s3.called is False
-    assert tasks.process_row.called is False
+    assert s3.stream_job_from_s3.called is False
+    assert tasks.process_rows.called is False
     tasks.build_dvla_file.assert_not_called()
 
 
@@ -231,23 +255,23 @@ def test_should_process_email_job_if_exactly_on_send_limits(notify_db,
     template = create_sample_email_template(notify_db, notify_db_session, service=service)
     job = create_sample_job(notify_db, notify_db_session, service=service, template=template, notification_count=10)
 
-    mocker.patch('app.celery.tasks.s3.get_job_from_s3', return_value=load_example_csv('multiple_email'))
-    mocker.patch('app.celery.tasks.save_email.apply_async')
+    mocker.patch('app.celery.tasks.s3.stream_job_from_s3', return_value=io.StringIO(load_example_csv('multiple_email')))
+    mocker.patch('app.celery.tasks.save_email_batch.apply_async')
     mocker.patch('app.encryption.encrypt', return_value="something_encrypted")
     mocker.patch('app.celery.tasks.create_uuid', return_value="uuid")
 
     process_job(job.id)
 
-    s3.get_job_from_s3.assert_called_once_with(
+    s3.stream_job_from_s3.assert_called_once_with(
         str(job.service.id),
         str(job.id)
     )
     job = jobs_dao.dao_get_job_by_id(job.id)
     assert job.job_status == 'finished'
-    tasks.save_email.apply_async.assert_called_with(
+    assert len(encryption.encrypt.call_args[0][0]) == 10
+    tasks.save_email_batch.apply_async.assert_called_once_with(
         (
             str(job.service_id),
-            "uuid",
             "something_encrypted",
         ),
         queue="database-tasks"
@@ -255,43 +279,44 @@ def test_should_process_email_job_if_exactly_on_send_limits(notify_db,
 
 
 def test_should_not_create_save_task_for_empty_file(sample_job, mocker):
-    mocker.patch('app.celery.tasks.s3.get_job_from_s3', return_value=load_example_csv('empty'))
-    mocker.patch('app.celery.tasks.save_sms.apply_async')
+    mocker.patch('app.celery.tasks.s3.stream_job_from_s3', return_value=io.StringIO(load_example_csv('empty')))
+    mocker.patch('app.celery.tasks.save_sms_batch.apply_async')
 
     process_job(sample_job.id)
 
-    s3.get_job_from_s3.assert_called_once_with(
+    s3.stream_job_from_s3.assert_called_once_with(
         str(sample_job.service.id),
         str(sample_job.id)
     )
     job = jobs_dao.dao_get_job_by_id(sample_job.id)
     assert job.job_status == 'finished'
-    assert tasks.save_sms.apply_async.called is False
+    assert tasks.save_sms_batch.apply_async.called is False
 
 
 def test_should_process_email_job(email_job_with_placeholders, mocker):
     email_csv = """email_address,name
     test@test.com,foo
     """
-    mocker.patch('app.celery.tasks.s3.get_job_from_s3', return_value=email_csv)
-    mocker.patch('app.celery.tasks.save_email.apply_async')
+    mocker.patch('app.celery.tasks.s3.stream_job_from_s3', return_value=io.StringIO(email_csv))
+    mocker.patch('app.celery.tasks.save_email_batch.apply_async')
     mocker.patch('app.encryption.encrypt', return_value="something_encrypted")
     mocker.patch('app.celery.tasks.create_uuid', return_value="uuid")
 
     process_job(email_job_with_placeholders.id)
 
-    s3.get_job_from_s3.assert_called_once_with(
+    s3.stream_job_from_s3.assert_called_once_with(
         str(email_job_with_placeholders.service.id),
         str(email_job_with_placeholders.id)
     )
-    assert encryption.encrypt.call_args[0][0]['to'] == 'test@test.com'
-    assert encryption.encrypt.call_args[0][0]['template'] == str(email_job_with_placeholders.template.id)
-    assert encryption.encrypt.call_args[0][0]['template_version'] == email_job_with_placeholders.template.version
-    assert encryption.encrypt.call_args[0][0]['personalisation'] == {'emailaddress': 'test@test.com', 'name': 'foo'}
-    tasks.save_email.apply_async.assert_called_once_with(
+    encrypted_rows = encryption.encrypt.call_args[0][0]
+    assert len(encrypted_rows) == 1
+    assert encrypted_rows[0]['to'] == 'test@test.com'
+    assert encrypted_rows[0]['template'] == str(email_job_with_placeholders.template.id)
+    assert encrypted_rows[0]['template_version'] == email_job_with_placeholders.template.version
+    assert encrypted_rows[0]['personalisation'] == {'emailaddress': 'test@test.com', 'name': 'foo'}
+    tasks.save_email_batch.apply_async.assert_called_once_with(
         (
             str(email_job_with_placeholders.service_id),
-            "uuid",
             "something_encrypted",
         ),
         queue="database-tasks"
@@ -305,7 +330,7 @@ def test_should_process_letter_job(sample_letter_job, mocker):
     csv = """address_line_1,address_line_2,address_line_3,address_line_4,postcode,name
     A1,A2,A3,A4,A_POST,Alice
     """
-    s3_mock = mocker.patch('app.celery.tasks.s3.get_job_from_s3', return_value=csv)
+    s3_mock = mocker.patch('app.celery.tasks.s3.stream_job_from_s3', return_value=io.StringIO(csv))
     process_row_mock = mocker.patch('app.celery.tasks.process_row')
     mocker.patch('app.celery.tasks.create_uuid', return_value="uuid")
     mocker.patch('app.celery.tasks.build_dvla_file')
@@ -339,27 +364,178 @@ def test_should_process_letter_job(sample_letter_job, mocker):
 
 def test_should_process_all_sms_job(sample_job_with_placeholdered_template,
                                     mocker):
-    mocker.patch('app.celery.tasks.s3.get_job_from_s3', return_value=load_example_csv('multiple_sms'))
-    mocker.patch('app.celery.tasks.save_sms.apply_async')
+    mocker.patch('app.celery.tasks.s3.stream_job_from_s3', return_value=io.StringIO(load_example_csv('multiple_sms')))
+    mocker.patch('app.celery.tasks.save_sms_batch.apply_async')
     mocker.patch('app.encryption.encrypt', return_value="something_encrypted")
     mocker.patch('app.celery.tasks.create_uuid', return_value="uuid")
 
     process_job(sample_job_with_placeholdered_template.id)
 
-    s3.get_job_from_s3.assert_called_once_with(
+    s3.stream_job_from_s3.assert_called_once_with(
         str(sample_job_with_placeholdered_template.service.id),
         str(sample_job_with_placeholdered_template.id)
     )
-    assert encryption.encrypt.call_args[0][0]['to'] == '+441234123120'
-    assert encryption.encrypt.call_args[0][0]['template'] == str(sample_job_with_placeholdered_template.template.id)
-    assert encryption.encrypt.call_args[0][0][
-               'template_version'] == sample_job_with_placeholdered_template.template.version  # noqa
-    assert encryption.encrypt.call_args[0][0]['personalisation'] == {'phonenumber': '+441234123120', 'name': 'chris'}
-    assert tasks.save_sms.apply_async.call_count == 10
+    encrypted_rows = encryption.encrypt.call_args[0][0]
+    assert len(encrypted_rows) == 10
+    assert encrypted_rows[-1]['to'] == '+441234123120'
+    assert encrypted_rows[-1]['template'] == str(sample_job_with_placeholdered_template.template.id)
+    assert encrypted_rows[-1]['template_version'] == sample_job_with_placeholdered_template.template.version
+    assert encrypted_rows[-1]['personalisation'] == {'phonenumber': '+441234123120', 'name': 'chris'}
+    assert tasks.save_sms_batch.apply_async.call_count == 1
     job = jobs_dao.dao_get_job_by_id(sample_job_with_placeholdered_template.id)
     assert job.job_status == 'finished'
 
 
+def test_get_recipients_and_personalisation_for_job_reads_a_chunk_of_rows_at_a_time(
+    notify_api, sample_job_with_placeholdered_template, mocker
+):
+    mocker.patch('app.celery.tasks.s3.stream_job_from_s3', return_value=io.StringIO(load_example_csv('multiple_sms')))
+    template = SMSMessageTemplate(sample_job_with_placeholdered_template.template.__dict__)
+
+    with set_config(notify_api, 'JOB_CSV_ROWS_PER_CHUNK', 3):
+        rows = list(get_recipients_and_personalisation_for_job(sample_job_with_placeholdered_template, template))
+
+    assert [row_number for row_number, _, _ in rows] == list(range(10))
+    assert [recipient for _, recipient, _ in rows] == [
+        '+44123412312{}'.format(i) for i in [1, 2, 3, 4, 5, 6, 7, 8, 9, 0]
+    ]
+    assert dict(rows[9][2]) == {'phonenumber': '+441234123120', 'name': 'chris'}
+
+
+def test_get_recipients_and_personalisation_for_job_keeps_quoted_fields_after_a_comma_and_space(
+    notify_api, sample_job_with_placeholdered_template, mocker
+):
+    mocker.patch(
+        'app.celery.tasks.s3.stream_job_from_s3',
+        return_value=io.StringIO('phonenumber, name\r\n07700900001, "Smith, Jo"\r\n')
+    )
+    template = SMSMessageTemplate(sample_job_with_placeholdered_template.template.__dict__)
+
+    rows = list(get_recipients_and_personalisation_for_job(sample_job_with_placeholdered_template, template))
+
+    assert len(rows) == 1
+    assert rows[0][1] == '07700900001'
+    assert dict(rows[0][2]) == {'phonenumber': '07700900001', 'name': 'Smith, Jo'}
+
+
+def test_should_process_job_rows_in_batches(notify_api, sample_job_with_placeholdered_template, mocker):
+    mocker.patch('app.celery.tasks.s3.stream_job_from_s3', return_value=io.StringIO(load_example_csv('multiple_sms')))
+    process_row_batch_mock = mocker.patch('app.celery.tasks.process_row_batch')
+
+    with set_config(notify_api, 'JOB_SAVE_BATCH_SIZE', 4):
+        process_job(sample_job_with_placeholdered_template.id)
+
+    assert [
+        [row_number for row_number, _, _ in batch_call[0][0]] for batch_call in process_row_batch_mock.call_args_list
+    ] == [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9]]
+
+
+def test_process_job_puts_the_rest_of_a_big_job_on_the_back_of_the_queue(
+    notify_api, sample_job_with_placeholdered_template, mocker
+):
+    mocker.patch('app.celery.tasks.s3.stream_job_from_s3', return_value=io.StringIO(load_example_csv('multiple_sms')))
+    process_row_batch_mock = mocker.patch('app.celery.tasks.process_row_batch')
+    mock_slice = mocker.patch('app.celery.tasks.process_job_slice.apply_async')
+
+    with set_config_values(notify_api, {
+        'JOB_CSV_ROWS_PER_CHUNK': 3,
+        'JOB_ROWS_PER_SLICE': 3,
+        'JOB_MAX_ROWS_PER_SECOND': 1000,
+    }):
+        process_job(sample_job_with_placeholdered_template.id)
+
+    assert _batched_row_numbers(process_row_batch_mock) == [0, 1, 2]
+    header_and_three_rows = ''.join(load_example_csv('multiple_sms').splitlines(keepends=True)[:4])
+    mock_slice.assert_called_once_with(
+        [
+            str(sample_job_with_placeholdered_template.id),
+            3,
+            len(header_and_three_rows.encode('utf-8')),
+            ['PhoneNumber', 'Name']
+        ],
+        queue='job-tasks',
+        countdown=ANY
+    )
+    assert mock_slice.call_args[1]['countdown'] <= 0.003
+    assert sample_job_with_placeholdered_template.job_status == 'in progress'
+
+
+def test_process_job_slice_carries_on_from_where_the_last_slice_stopped(
+    notify_api, sample_job_with_placeholdered_template, mocker
+):
+    file_data = load_example_csv('multiple_sms').encode('utf-8')
+    mock_stream = mocker.patch(
+        'app.celery.tasks.s3.stream_job_from_s3',
+        side_effect=lambda service_id, job_id, start_byte=0: io.StringIO(file_data[start_byte:].decode('utf-8'))
+    )
+    process_row_batch_mock = mocker.patch('app.celery.tasks.process_row_batch')
+    mock_slice = mocker.patch('app.celery.tasks.process_job_slice.apply_async')
+    job = sample_job_with_placeholdered_template
+    job.job_status = 'in progress'
+    start_byte = len(b''.join(file_data.splitlines(keepends=True)[:4]))
+
+    with set_config_values(notify_api, {'JOB_CSV_ROWS_PER_CHUNK': 3, 'JOB_ROWS_PER_SLICE': 3}):
+        process_job_slice(str(job.id), 3, start_byte, ['PhoneNumber', 'Name'])
+
+    mock_stream.assert_called_once_with(str(job.service_id), str(job.id), start_byte)
+    assert _batched_row_numbers(process_row_batch_mock) == [3, 4, 5]
+    assert [row[1] for row in process_row_batch_mock.call_args[0][0]] == [
+        '+441234123124', '+441234123125', '+441234123126'
+    ]
+    assert dict(process_row_batch_mock.call_args[0][0][0][2]) == {'phonenumber': '+441234123124', 'name': 'chris'}
+    assert mock_slice.call_args[0][0][1] == 6
+
+
+def test_process_job_slice_reads_the_header_if_the_slice_was_queued_without_it(
+    notify_api, sample_job_with_placeholdered_template, mocker
+):
+    file_data = load_example_csv('multiple_sms').encode('utf-8')
+    streams = []
+
+    def stream(service_id, job_id, start_byte=0):
+        streams.append(io.StringIO(file_data[start_byte:].decode('utf-8')))
+        mocker.spy(streams[-1], 'close')
+        return streams[-1]
+
+    mocker.patch('app.celery.tasks.s3.stream_job_from_s3', side_effect=stream)
+    process_row_batch_mock = mocker.patch('app.celery.tasks.process_row_batch')
+    mocker.patch('app.celery.tasks.process_job_slice.apply_async')
+    job = sample_job_with_placeholdered_template
+    job.job_status = 'in progress'
+    start_byte = len(b''.join(file_data.splitlines(keepends=True)[:4]))
+
+    with set_config_values(notify_api, {'JOB_CSV_ROWS_PER_CHUNK': 3, 'JOB_ROWS_PER_SLICE': 3}):
+        process_job_slice(str(job.id), 3, start_byte)
+
+    assert dict(process_row_batch_mock.call_args[0][0][0][2]) == {'phonenumber': '+441234123124', 'name': 'chris'}
+    assert len(streams) == 2
+    assert all(stream.close.called for stream in streams)
+
+
+def test_process_job_slice_finishes_the_job_after_the_last_row(
+    notify_api, sample_job_with_placeholdered_template, mocker
+):
+    mocker.patch('app.celery.tasks.s3.stream_job_from_s3', return_value=io.StringIO(load_example_csv('multiple_sms')))
+    mocker.patch('app.celery.tasks.process_row_batch')
+    mock_slice = mocker.patch('app.celery.tasks.process_job_slice.apply_async')
+    job = sample_job_with_placeholdered_template
+    job.job_status = 'in progress'
+
+    process_job_slice(str(job.id), 0, 0)
+
+    assert not mock_slice.called
+    assert job.job_status == 'finished'
+
+
+def test_process_job_slice_does_nothing_if_the_job_is_no_longer_in_progress(sample_job, mocker):
+    mock_stream = mocker.patch('app.celery.tasks.s3.stream_job_from_s3')
+    sample_job.job_status = 'cancelled'
+
+    process_job_slice(str(sample_job.id), 3, 100)
+
+    assert not mock_stream.called
+
+
 # -------------- process_row tests -------------- #
 
 
@@ -398,6 +574,54 @@ def test_process_row_sends_letter_task(template_type, research_mode, expected_fu
         ),
         queue=expected_queue
     )
+
+
+@pytest.mark.parametrize('template_type, research_mode, expected_function, expected_queue', [
+    (SMS_TYPE, False, 'save_sms_batch', 'database-tasks'),
+    (SMS_TYPE, True, 'save_sms_batch', 'research-mode-tasks'),
+    (EMAIL_TYPE, False, 'save_email_batch', 'database-tasks'),
+    (EMAIL_TYPE, True, 'save_email_batch', 'research-mode-tasks'),
+])
+def test_process_row_batch_sends_one_task_for_all_rows(
+    template_type, research_mode, expected_function, expected_queue, mocker
+):
+    mocker.patch('app.celery.tasks.create_uuid', side_effect=['noti_uuid_1', 'noti_uuid_2'])
+    task_mock = mocker.patch('app.celery.tasks.{}.apply_async'.format(expected_function))
+    encrypt_mock = mocker.patch('app.celery.tasks.encryption.encrypt')
+    template = Mock(id='template_id', template_type=template_type)
+    job = Mock(id='job_id', template_version='temp_vers')
+    service = Mock(id='service_id', research_mode=research_mode)
+
+    process_row_batch([(0, 'recip_1', {'foo': 'bar'}), (1, 'recip_2', {'foo': 'baz'})], template, job, service)
+
+    encrypt_mock.assert_called_once_with([
+        {
+            'id': 'noti_uuid_1',
+            'template': 'template_id',
+            'template_version': 'temp_vers',
+            'job': 'job_id',
+            'to': 'recip_1',
+            'row_number': 0,
+            'personalisation': {'foo': 'bar'}
+        },
+        {
+            'id': 'noti_uuid_2',
+            'template': 'template_id',
+            'template_version': 'temp_vers',
+            'job': 'job_id',
+            'to': 'recip_2',
+            'row_number': 1,
+            'personalisation': {'foo': 'baz'}
+        },
+    ])
+    task_mock.assert_called_once_with(
+        (
+            'service_id',
+            # encrypted data
+            encrypt_mock.return_value,
+        ),
+        queue=expected_queue
+    )
 # -------- save_sms and save_email tests -------- #
 
 
@@ -427,7 +651,7 @@ def test_should_send_template_to_correct_sms_task_and_persist(sample_template_wi
     assert persisted_notification.notification_type == 'sms'
     mocked_deliver_sms.assert_called_once_with(
         [str(persisted_notification.id)],
-        queue="send-sms-tasks"
+        queue="send-bulk-tasks"
     )
 
 
@@ -486,7 +710,7 @@ def test_should_save_sms_if_restricted_service_and_valid_number(notify_db, notif
     assert persisted_notification.notification_type == 'sms'
     provider_tasks.deliver_sms.apply_async.assert_called_once_with(
         [str(persisted_notification.id)],
-        queue="send-sms-tasks"
+        queue="send-bulk-tasks"
     )
 
 
@@ -511,7 +735,7 @@ def test_should_save_sms_if_restricted_service_and_non_team_number_with_test_key
     persisted_notification = Notification.query.one()
     mocked_deliver_sms.assert_called_once_with(
         [str(persisted_notification.id)],
-        queue="send-sms-tasks"
+        queue="send-bulk-tasks"
     )
 
 
@@ -538,7 +762,7 @@ def test_should_save_email_if_restricted_service_and_non_team_email_address_with
     persisted_notification = Notification.query.one()
     mocked_deliver_email.assert_called_once_with(
         [str(persisted_notification.id)],
-        queue="send-email-tasks"
+        queue="send-bulk-tasks"
     )
 
 
@@ -615,7 +839,7 @@ def test_should_not_build_dvla_file_in_research_mode_for_letter_job(
     csv = """address_line_1,address_line_2,address_line_3,address_line_4,postcode,name
     A1,A2,A3,A4,A_POST,Alice
     """
-    mocker.patch('app.celery.tasks.s3.get_job_from_s3', return_value=csv)
+    mocker.patch('app.celery.tasks.s3.stream_job_from_s3', return_value=io.StringIO(csv))
     mocker.patch('app.celery.tasks.update_job_to_sent_to_dvla.apply_async')
     mocker.patch('app.celery.tasks.save_letter.apply_async')
     mocker.patch('app.celery.tasks.create_uuid', return_value=fake_uuid)
@@ -636,7 +860,7 @@ def test_should_update_job_to_sent_to_dvla_in_research_mode_for_letter_job(
     csv = """address_line_1,address_line_2,address_line_3,address_line_4,postcode,name
     A1,A2,A3,A4,A_POST,Alice
     """
-    mocker.patch('app.celery.tasks.s3.get_job_from_s3', return_value=csv)
+    mocker.patch('app.celery.tasks.s3.stream_job_from_s3', return_value=io.StringIO(csv))
     mock_update_job_task = mocker.patch('app.celery.tasks.update_job_to_sent_to_dvla.apply_async')
     mocker.patch('app.celery.tasks.save_letter.apply_async')
     mocker.patch('app.celery.tasks.create_uuid', return_value=fake_uuid)
@@ -692,7 +916,7 @@ def test_should_save_sms_template_to_and_persist_with_job_id(sample_job, sample_
 
     provider_tasks.deliver_sms.apply_async.assert_called_once_with(
         [str(persisted_notification.id)],
-        queue="send-sms-tasks"
+        queue="send-bulk-tasks"
     )
 
 
@@ -783,7 +1007,7 @@ def test_should_use_email_template_and_persist(sample_email_template_with_placeh
     assert persisted_notification.notification_type == 'email'
 
     provider_tasks.deliver_email.apply_async.assert_called_once_with(
-        [str(persisted_notification.id)], queue='send-email-tasks')
+        [str(persisted_notification.id)], queue='send-bulk-tasks')
 
 
 def test_save_email_should_use_template_version_from_job_not_latest(sample_email_template, mocker):
@@ -813,7 +1037,7 @@ def test_save_email_should_use_template_version_from_job_not_latest(sample_email
     assert not persisted_notification.sent_by
     assert persisted_notification.notification_type == 'email'
     provider_tasks.deliver_email.apply_async.assert_called_once_with([str(persisted_notification.id)],
-                                                                     queue='send-email-tasks')
+                                                                     queue='send-bulk-tasks')
 
 
 def test_should_use_email_template_subject_placeholders(sample_email_template_with_placeholders, mocker):
@@ -838,7 +1062,7 @@ def test_should_use_email_template_subject_placeholders(sample_email_template_wi
     assert not persisted_notification.reference
     assert persisted_notification.notification_type == 'email'
     provider_tasks.deliver_email.apply_async.assert_called_once_with(
-        [str(persisted_notification.id)], queue='send-email-tasks'
+        [str(persisted_notification.id)], queue='send-bulk-tasks'
     )
 
 
@@ -865,7 +1089,7 @@ def test_should_use_email_template_and_persist_without_personalisation(sample_em
     assert not persisted_notification.reference
     assert persisted_notification.notification_type == 'email'
     provider_tasks.deliver_email.apply_async.assert_called_once_with([str(persisted_notification.id)],
-                                                                     queue='send-email-tasks')
+                                                                     queue='send-bulk-tasks')
 
 
 def test_save_sms_should_go_to_retry_queue_if_database_errors(sample_template, mocker):
@@ -948,6 +1172,105 @@ def test_save_sms_does_not_send_duplicate_and_does_not_put_in_retry_queue(sample
     assert not retry.called
 
 
+def _batch_notification_json(template, job, recipients):
+    return [
+        dict(_notification_json(template, to, job_id=job.id, row_number=row_number), id=str(uuid.uuid4()))
+        for row_number, to in enumerate(recipients)
+    ]
+
+
+def test_save_sms_batch_persists_all_notifications_and_sends_them_to_provider_as_a_batch(sample_job, mocker):
+    notifications = _batch_notification_json(sample_job.template, sample_job, ['+447234123123', '+447234123124'])
+    mocked_deliver_sms_batch = mocker.patch('app.celery.provider_tasks.deliver_sms_batch.apply_async')
+
+    save_sms_batch(sample_job.service_id, encryption.encrypt(notifications))
+
+    persisted_notifications = Notification.query.order_by(Notification.job_row_number).all()
+    assert [str(n.id) for n in persisted_notifications] == [n['id'] for n in notifications]
+    assert [n.to for n in persisted_notifications] == ['+447234123123', '+447234123124']
+    assert all(n.job_id == sample_job.id for n in persisted_notifications)
+    assert all(n.status == 'created' for n in persisted_notifications)
+    assert NotificationHistory.query.count() == 2
+    mocked_deliver_sms_batch.assert_called_once_with([[n['id'] for n in notifications]], queue="send-bulk-tasks")
+
+
+def test_save_sms_batch_sends_research_mode_notifications_individually(notify_db_session, mocker):
+    service = create_service(research_mode=True)
+    job = create_job(template=create_template(service=service))
+    notifications = _batch_notification_json(job.template, job, ['+447234123123', '+447234123124'])
+    mocked_deliver_sms = mocker.patch('app.celery.provider_tasks.deliver_sms.apply_async')
+    mocked_deliver_sms_batch = mocker.patch('app.celery.provider_tasks.deliver_sms_batch.apply_async')
+
+    save_sms_batch(service.id, encryption.encrypt(notifications))
+
+    assert mocked_deliver_sms.call_args_list == [
+        call([n['id']], queue="research-mode-tasks") for n in notifications
+    ]
+    assert not mocked_deliver_sms_batch.called
+
+
+def test_save_email_batch_persists_all_notifications_and_sends_them_to_provider_as_a_batch(sample_email_job, mocker):
+    notifications = _batch_notification_json(
+        sample_email_job.template, sample_email_job, ['one@example.gov.uk', 'two@example.gov.uk']
+    )
+    mocked_deliver_email_batch = mocker.patch('app.celery.provider_tasks.deliver_email_batch.apply_async')
+
+    save_email_batch(sample_email_job.service_id, encryption.encrypt(notifications))
+
+    assert Notification.query.count() == 2
+    mocked_deliver_email_batch.assert_called_once_with(
+        [[n['id'] for n in notifications]], queue="send-bulk-tasks"
+    )
+
+
+def test_save_sms_batch_does_not_save_or_send_duplicates_when_replayed(sample_job, mocker):
+    notifications = _batch_notification_json(sample_job.template, sample_job, ['+447234123123', '+447234123124'])
+    mocked_deliver_sms_batch = mocker.patch('app.celery.provider_tasks.deliver_sms_batch.apply_async')
+    retry = mocker.patch('app.celery.tasks.save_sms_batch.retry')
+
+    save_sms_batch(sample_job.service_id, encryption.encrypt(notifications[:1]))
+    save_sms_batch(sample_job.service_id, encryption.encrypt(notifications))
+
+    assert Notification.query.count() == 2
+    assert NotificationHistory.query.count() == 2
+    assert mocked_deliver_sms_batch.call_args_list == [
+        call([[n['id']]], queue="send-bulk-tasks") for n in notifications
+    ]
+    assert not retry.called
+
+
+def test_save_sms_batch_does_not_save_notifications_for_restricted_service(notify_db_session, mocker):
+    user = create_user(mobile_number="07700 900890")
+    service = create_service(user=user, restricted=True)
+    template = create_template(service=service)
+    job = create_job(template=template)
+    notifications = _batch_notification_json(template, job, ['07700 900890', '07700 900849'])
+    mocked_deliver_sms_batch = mocker.patch('app.celery.provider_tasks.deliver_sms_batch.apply_async')
+
+    save_sms_batch(service.id, encryption.encrypt(notifications))
+
+    persisted_notification = Notification.query.one()
+    assert persisted_notification.to == '07700 900890'
+    mocked_deliver_sms_batch.assert_called_once_with([[str(persisted_notification.id)]], queue="send-bulk-tasks")
+
+
+def test_save_sms_batch_should_go_to_retry_queue_if_database_errors(sample_job, mocker):
+    notifications = _batch_notification_json(sample_job.template, sample_job, ['+447234123123'])
+    expected_exception = SQLAlchemyError()
+    mocker.patch('app.celery.provider_tasks.deliver_sms_batch.apply_async')
+    mocker.patch('app.celery.tasks.save_sms_batch.retry', side_effect=Retry)
+    mocker.patch(
+        'app.notifications.process_notifications.dao_create_notifications_bulk', side_effect=expected_exception
+    )
+
+    with pytest.raises(Retry):
+        save_sms_batch(sample_job.service_id, encryption.encrypt(notifications))
+
+    assert provider_tasks.deliver_sms_batch.apply_async.called is False
+    tasks.save_sms_batch.retry.assert_called_with(exc=expected_exception, queue="retry-tasks")
+    assert Notification.query.count() == 0
+
+
 def test_save_letter_saves_letter_to_database(sample_letter_job, mocker):
 
     mocker.patch('app.celery.tasks.create_random_identifier', return_value="this-is-random-in-real-life")
@@ -997,16 +1320,16 @@ def test_should_cancel_job_if_service_is_inactive(sample_service,
                                                   mocker):
     sample_service.active = False
 
-    mocker.patch('app.celery.tasks.s3.get_job_from_s3')
-    mocker.patch('app.celery.tasks.process_row')
+    mocker.patch('app.celery.tasks.s3.stream_job_from_s3')
+    mocker.patch('app.celery.tasks.process_rows')
     mock_dvla_file_task = mocker.patch('app.celery.tasks.build_dvla_file')
 
     process_job(sample_job.id)
 
     job = jobs_dao.dao_get_job_by_id(sample_job.id)
     assert job.job_status == 'cancelled'
-    s3.get_job_from_s3.assert_not_called()
-    tasks.process_row.assert_not_called()
+    s3.stream_job_from_s3.assert_not_called()
+    tasks.process_rows.assert_not_called()
     mock_dvla_file_task.assert_not_called()
 
 
@@ -1168,7 +1491,7 @@ def test_send_inbound_sms_to_service_retries_if_request_throws_unknown(notify_ap
                                      provider_date=datetime(2017, 6, 20), content="Here is some content")
 
     mocked = mocker.patch('app.celery.tasks.send_inbound_sms_to_service.retry')
-    mocker.patch("app.celery.tasks.request", side_effect=RequestException())
+    mocker.patch("app.celery.tasks.get_http_session").return_value.post.side_effect = RequestException()
 
     send_inbound_sms_to_service(inbound_sms.id, inbound_sms.service_id)
 
@@ -1213,8 +1536,8 @@ def test_check_job_status_task_does_not_raise_error(sample_template):
 
 def test_process_incomplete_job_sms(mocker, sample_template):
 
-    mocker.patch('app.celery.tasks.s3.get_job_from_s3', return_value=load_example_csv('multiple_sms'))
-    save_sms = mocker.patch('app.celery.tasks.save_sms.apply_async')
+    mocker.patch('app.celery.tasks.s3.stream_job_from_s3', return_value=io.StringIO(load_example_csv('multiple_sms')))
+    process_row_batch = mocker.patch('app.celery.tasks.process_row_batch')
 
     job = create_job(template=sample_template, notification_count=10,
                      created_at=datetime.utcnow() - timedelta(hours=2),
@@ -1233,13 +1556,14 @@ def test_process_incomplete_job_sms(mocker, sample_template):
 
     assert completed_job.job_status == JOB_STATUS_FINISHED
 
-    assert save_sms.call_count == 8  # There are 10 in the file and we've added two already
+    # There are 10 in the file and we've added two already
+    assert _batched_row_numbers(process_row_batch) == [2, 3, 4, 5, 6, 7, 8, 9]
 
 
 def test_process_incomplete_job_with_notifications_all_sent(mocker, sample_template):
 
-    mocker.patch('app.celery.tasks.s3.get_job_from_s3', return_value=load_example_csv('multiple_sms'))
-    mock_save_sms = mocker.patch('app.celery.tasks.save_sms.apply_async')
+    mocker.patch('app.celery.tasks.s3.stream_job_from_s3', return_value=io.StringIO(load_example_csv('multiple_sms')))
+    mock_save_sms = mocker.patch('app.celery.tasks.save_sms_batch.apply_async')
 
     job = create_job(template=sample_template, notification_count=10,
                      created_at=datetime.utcnow() - timedelta(hours=2),
@@ -1271,8 +1595,11 @@ def test_process_incomplete_job_with_notifications_all_sent(mocker, sample_templ
 
 def test_process_incomplete_jobs_sms(mocker, sample_template):
 
-    mocker.patch('app.celery.tasks.s3.get_job_from_s3', return_value=load_example_csv('multiple_sms'))
-    mock_save_sms = mocker.patch('app.celery.tasks.save_sms.apply_async')
+    mocker.patch(
+        'app.celery.tasks.s3.stream_job_from_s3',
+        side_effect=lambda service_id, job_id: io.StringIO(load_example_csv('multiple_sms'))
+    )
+    mock_process_row_batch = mocker.patch('app.celery.tasks.process_row_batch')
 
     job = create_job(template=sample_template, notification_count=10,
                      created_at=datetime.utcnow() - timedelta(hours=2),
@@ -1309,12 +1636,13 @@ def test_process_incomplete_jobs_sms(mocker, sample_template):
 
     assert completed_job2.job_status == JOB_STATUS_FINISHED
 
-    assert mock_save_sms.call_count == 12  # There are 20 in total over 2 jobs we've added 8 already
+    # There are 20 in total over 2 jobs we've added 8 already
+    assert _batched_row_numbers(mock_process_row_batch) == [3, 4, 5, 6, 7, 8, 9, 5, 6, 7, 8, 9]
 
 
 def test_process_incomplete_jobs_no_notifications_added(mocker, sample_template):
-    mocker.patch('app.celery.tasks.s3.get_job_from_s3', return_value=load_example_csv('multiple_sms'))
-    mock_save_sms = mocker.patch('app.celery.tasks.save_sms.apply_async')
+    mocker.patch('app.celery.tasks.s3.stream_job_from_s3', return_value=io.StringIO(load_example_csv('multiple_sms')))
+    mock_process_row_batch = mocker.patch('app.celery.tasks.process_row_batch')
 
     job = create_job(template=sample_template, notification_count=10,
                      created_at=datetime.utcnow() - timedelta(hours=2),
@@ -1330,13 +1658,13 @@ def test_process_incomplete_jobs_no_notifications_added(mocker, sample_template)
 
     assert completed_job.job_status == JOB_STATUS_FINISHED
 
-    assert mock_save_sms.call_count == 10  # There are 10 in the csv file
+    assert _batched_row_numbers(mock_process_row_batch) == list(range(10))  # There are 10 in the csv file
 
 
 def test_process_incomplete_jobs(mocker):
 
-    mocker.patch('app.celery.tasks.s3.get_job_from_s3', return_value=load_example_csv('multiple_sms'))
-    mock_save_sms = mocker.patch('app.celery.tasks.save_sms.apply_async')
+    mocker.patch('app.celery.tasks.s3.stream_job_from_s3', return_value=io.StringIO(load_example_csv('multiple_sms')))
+    mock_save_sms = mocker.patch('app.celery.tasks.save_sms_batch.apply_async')
 
     jobs = []
     process_incomplete_jobs(jobs)
@@ -1346,8 +1674,8 @@ def test_process_incomplete_jobs(mocker):
 
 def test_process_incomplete_job_no_job_in_database(mocker, fake_uuid):
 
-    mocker.patch('app.celery.tasks.s3.get_job_from_s3', return_value=load_example_csv('multiple_sms'))
-    mock_save_sms = mocker.patch('app.celery.tasks.save_sms.apply_async')
+    mocker.patch('app.celery.tasks.s3.stream_job_from_s3', return_value=io.StringIO(load_example_csv('multiple_sms')))
+    mock_save_sms = mocker.patch('app.celery.tasks.save_sms_batch.apply_async')
 
     with pytest.raises(expected_exception=Exception) as e:
         process_incomplete_job(fake_uuid)
@@ -1357,8 +1685,8 @@ def test_process_incomplete_job_no_job_in_database(mocker, fake_uuid):
 
 def test_process_incomplete_job_email(mocker, sample_email_template):
 
-    mocker.patch('app.celery.tasks.s3.get_job_from_s3', return_value=load_example_csv('multiple_email'))
-    mock_email_saver = mocker.patch('app.celery.tasks.save_email.apply_async')
+    mocker.patch('app.celery.tasks.s3.stream_job_from_s3', return_value=io.StringIO(load_example_csv('multiple_email')))
+    mock_process_row_batch = mocker.patch('app.celery.tasks.process_row_batch')
 
     job = create_job(template=sample_email_template, notification_count=10,
                      created_at=datetime.utcnow() - timedelta(hours=2),
@@ -1377,12 +1705,16 @@ def test_process_incomplete_job_email(mocker, sample_email_template):
 
     assert completed_job.job_status == JOB_STATUS_FINISHED
 
-    assert mock_email_saver.call_count == 8  # There are 10 in the file and we've added two already
+    # There are 10 in the file and we've added two already
+    assert _batched_row_numbers(mock_process_row_batch) == [2, 3, 4, 5, 6, 7, 8, 9]
 
 
 def test_process_incomplete_job_letter(mocker, sample_letter_template):
 
-    mocker.patch('app.celery.tasks.s3.get_job_from_s3', return_value=load_example_csv('multiple_letter'))
+    mocker.patch(
+        'app.celery.tasks.s3.stream_job_from_s3',
+        return_value=io.StringIO(load_example_csv('multiple_letter'))
+    )
     mock_letter_saver = mocker.patch('app.celery.tasks.save_letter.apply_async')
 
     job = create_job(template=sample_letter_template, notification_count=10,
@@ -1405,6 +1737,62 @@ def test_process_incomplete_job_letter(mocker, sample_letter_template):
     assert mock_letter_saver.call_count == 8
 
 
+def test_process_status_updates_applies_buffered_updates(notify_api, mocker):
+    updates = [{'client_name': 'MMG', 'status': 'delivered', 'notification_id': str(uuid.uuid4()), 'reference': None}]
+    mocker.patch('app.celery.tasks.take_buffered_status_updates', return_value=updates)
+    apply_mock = mocker.patch('app.celery.tasks.apply_status_updates')
+    next_task = mocker.patch('app.celery.tasks.process_status_updates.apply_async')
+
+    process_status_updates()
+
+    apply_mock.assert_called_once_with(updates)
+    assert not next_task.called
+
+
+def test_process_status_updates_carries_on_if_there_are_more_waiting(notify_api, mocker):
+    updates = [{'client_name': 'SES', 'status': 'delivered', 'notification_id': None, 'reference': 'ref'}] * 2
+    take_mock = mocker.patch('app.celery.tasks.take_buffered_status_updates', return_value=updates)
+    mocker.patch('app.celery.tasks.apply_status_updates')
+    next_task = mocker.patch('app.celery.tasks.process_status_updates.apply_async')
+
+    with set_config(notify_api, 'STATUS_UPDATE_BATCH_SIZE', 2):
+        process_status_updates()
+
+    take_mock.assert_called_once_with(2)
+    next_task.assert_called_once_with(queue='database-tasks')
+
+
+def test_process_status_updates_returns_updates_to_the_buffer_on_error(notify_api, mocker):
+    updates = [{'client_name': 'SES', 'status': 'delivered', 'notification_id': None, 'reference': 'ref'}]
+    mocker.patch('app.celery.tasks.take_buffered_status_updates', return_value=updates)
+    mocker.patch('app.celery.tasks.apply_status_updates', side_effect=SQLAlchemyError())
+    return_mock = mocker.patch('app.celery.tasks.return_status_updates_to_buffer')
+
+    with pytest.raises(SQLAlchemyError):
+        process_status_updates()
+
+    return_mock.assert_called_once_with(updates)
+
+
+def test_process_status_updates_only_returns_the_updates_that_fail_on_their_own(notify_api, mocker):
+    good = {'client_name': 'SES', 'status': 'delivered', 'notification_id': None, 'reference': 'good'}
+    bad = {'client_name': 'SES', 'status': 'delivered', 'notification_id': None, 'reference': 'bad'}
+    mocker.patch('app.celery.tasks.take_buffered_status_updates', return_value=[good, bad])
+
+    def apply_status_updates(updates):
+        if bad in updates:
+            raise SQLAlchemyError()
+
+    apply_mock = mocker.patch('app.celery.tasks.apply_status_updates', side_effect=apply_status_updates)
+    return_mock = mocker.patch('app.celery.tasks.return_status_updates_to_buffer')
+
+    with pytest.raises(SQLAlchemyError):
+        process_status_updates()
+
+    assert apply_mock.call_args_list == [call([good, bad]), call([good]), call([bad])]
+    return_mock.assert_called_once_with([bad])
+
+
 def test_process_ses_results(notify_db, notify_db_session, sample_email_template):
 
     create_sample_notification(
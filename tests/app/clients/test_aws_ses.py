@@ -1,10 +1,11 @@
 import botocore
 import pytest
-from unittest.mock import Mock, ANY
+from unittest.mock import Mock, ANY, call
 from notifications_utils.recipients import InvalidEmailError
 
 from app import aws_ses_client
 from app.clients.email.aws_ses import get_aws_responses, AwsSesClientException
+from tests.conftest import set_config_values
 
 
 def test_should_return_correct_details_for_delivery():
@@ -118,3 +119,52 @@ def test_send_email_raises_other_errs_as_AwsSesClientException(mocker):
         )
 
     assert 'some error message from amazon' in str(excinfo.value)
+
+
+def test_send_email_batch_returns_references_and_exceptions_in_order(notify_api, mocker):
+    error = AwsSesClientException('Error')
+    references = {'one@example.com': 'ref-1', 'two@example.com': error, 'three@example.com': 'ref-3'}
+
+    def send_email(to_addresses, **kwargs):
+        if isinstance(references[to_addresses], Exception):
+            raise references[to_addresses]
+        return references[to_addresses]
+
+    mocker.patch.object(aws_ses_client, 'send_email', side_effect=send_email)
+
+    with notify_api.app_context():
+        results = aws_ses_client.send_email_batch([{'to_addresses': to} for to in references])
+
+    assert results == [references[to] for to in references]
+
+
+def test_send_email_batch_passes_accepted_messages_to_on_sent(notify_api, mocker):
+    def send_email(to_addresses, **kwargs):
+        if to_addresses == 'two@example.com':
+            raise AwsSesClientException('Error')
+        return 'ref-1'
+
+    mocker.patch.object(aws_ses_client, 'send_email', side_effect=send_email)
+    sent = []
+
+    with notify_api.app_context():
+        aws_ses_client.send_email_batch(
+            [{'to_addresses': 'one@example.com'}, {'to_addresses': 'two@example.com'}],
+            on_sent=sent.extend
+        )
+
+    assert sent == [(0, 'ref-1')]
+
+
+def test_send_email_batch_does_not_start_requests_faster_than_max_send_rate(notify_api, mocker):
+    mocker.patch.object(aws_ses_client, 'send_email', return_value='ref')
+    mocker.patch('app.clients.email.aws_ses.monotonic', return_value=0)
+    sleep = mocker.patch('app.clients.email.aws_ses.sleep')
+
+    with notify_api.app_context(), set_config_values(notify_api, {
+        'AWS_SES_MAX_SEND_RATE': 2,
+        'AWS_SES_MAX_CONCURRENT_REQUESTS': 3
+    }):
+        assert aws_ses_client.send_email_batch([{'to_addresses': 'a'}] * 3) == ['ref'] * 3
+
+    assert sleep.call_args_list == [call(0.5), call(1.0)]
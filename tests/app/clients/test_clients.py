@@ -0,0 +1,23 @@
+from app.clients import get_http_session
+
+
+def test_get_http_session_returns_the_same_session_for_a_name():
+    session = get_http_session('test-session', pool_size=3)
+
+    assert get_http_session('test-session', pool_size=3) is session
+    assert get_http_session('another-test-session', pool_size=3) is not session
+
+
+def test_get_http_session_pools_connections():
+    session = get_http_session('pooled-test-session', pool_size=7, pool_connections=2)
+
+    adapter = session.get_adapter('https://example.com')
+    assert adapter._pool_maxsize == 7
+    assert adapter._pool_connections == 2
+
+
+def test_get_http_session_creates_a_new_session_in_a_forked_process(mocker):
+    session = get_http_session('forked-test-session', pool_size=3)
+    mocker.patch('app.clients.os.getpid', return_value=-1)
+
+    assert get_http_session('forked-test-session', pool_size=3) is not session
@@ -71,6 +71,28 @@ def test_send_sms_calls_mmg_correctly(notify_api, mocker):
     assert request_args['multi'] is True
 
 
+def test_send_sms_reuses_session_and_uses_separate_connect_and_read_timeouts(notify_api):
+    with requests_mock.Mocker() as request_mock:
+        request_mock.post('https://api.mmg.co.uk/json/api.php', json={'Reference': 12345678}, status_code=200)
+        session = mmg_client.session
+        mmg_client.send_sms('+447234567890', 'my message', 'ref 1')
+        mmg_client.send_sms('+447234567890', 'my message', 'ref 2')
+
+    assert mmg_client.session is session
+    assert [request.timeout for request in request_mock.request_history] == [(5, 30), (5, 30)]
+
+
+def test_send_sms_batch_sends_each_message_and_returns_failures(notify_api, mocker):
+    error = SmsClientResponseException('Error')
+    send_sms = mocker.patch.object(mmg_client, 'send_sms', side_effect=[None, error, None])
+    messages = [
+        dict(to='+447234567890', content='my message', reference='ref {}'.format(i), sender=None) for i in range(3)
+    ]
+
+    assert mmg_client.send_sms_batch(messages) == {'ref 1': error}
+    assert send_sms.call_count == 3
+
+
 def test_send_sms_raises_if_mmg_rejects(notify_api, mocker):
     to = content = reference = 'foo'
     response_dict = {
@@ -847,7 +847,10 @@ def mock_firetext_client(mocker, statsd_client=None):
     statsd_client = statsd_client or mocker.Mock()
     current_app = mocker.Mock(config={
         'FIRETEXT_API_KEY': 'foo',
-        'FROM_NUMBER': 'bar'
+        'FROM_NUMBER': 'bar',
+        'SMS_PROVIDER_HTTP_POOL_SIZE': 10,
+        'SMS_PROVIDER_CONNECT_TIMEOUT_SECONDS': 5,
+        'SMS_PROVIDER_READ_TIMEOUT_SECONDS': 30
     })
     client.init_app(current_app, statsd_client)
     return client
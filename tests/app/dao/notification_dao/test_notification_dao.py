@@ -6,6 +6,7 @@ import pytest
 from freezegun import freeze_time
 from sqlalchemy.exc import SQLAlchemyError, IntegrityError
 
+from app import db
 from app.dao.service_email_reply_to_dao import dao_get_reply_to_by_service_id
 from app.models import (
     Job,
@@ -28,6 +29,7 @@ from app.models import (
 
 from app.dao.notifications_dao import (
     dao_create_notification,
+    dao_create_notifications_bulk,
     dao_create_notification_email_reply_to_mapping,
     dao_create_notification_sms_sender_mapping,
     dao_created_scheduled_notification,
@@ -41,8 +43,11 @@ from app.dao.notifications_dao import (
     dao_get_template_usage,
     dao_timeout_notifications,
     dao_update_notification,
+    dao_update_notification_statuses_by_id,
+    dao_update_notification_statuses_by_reference,
     dao_update_notifications_for_job_to_sent_to_dvla,
     dao_update_notifications_by_reference,
+    dao_update_notifications_sent_to_provider,
     delete_notifications_created_more_than_a_week_ago_by_type,
     get_notification_by_id,
     get_notification_for_job,
@@ -71,12 +76,14 @@ from tests.app.conftest import (
     sample_job,
     sample_notification_history as create_notification_history,
     sample_letter_template)
+from tests.conftest import set_config
 
 
 def test_should_have_decorated_notifications_dao_functions():
     assert dao_get_last_template_usage.__wrapped__.__name__ == 'dao_get_last_template_usage'  # noqa
     assert dao_get_template_usage.__wrapped__.__name__ == 'dao_get_template_usage'  # noqa
     assert dao_create_notification.__wrapped__.__name__ == 'dao_create_notification'  # noqa
+    assert dao_create_notifications_bulk.__wrapped__.__name__ == 'dao_create_notifications_bulk'  # noqa
     assert update_notification_status_by_id.__wrapped__.__name__ == 'update_notification_status_by_id'  # noqa
     assert dao_update_notification.__wrapped__.__name__ == 'dao_update_notification'  # noqa
     assert update_notification_status_by_reference.__wrapped__.__name__ == 'update_notification_status_by_reference'  # noqa
@@ -569,6 +576,78 @@ def test_should_not_update_status_one_notification_status_is_delivered(notify_db
     assert Notification.query.get(notification.id).status == 'delivered'
 
 
+def test_update_notification_statuses_by_id_updates_notifications_and_history(sample_template, sample_job):
+    sending = create_notification(sample_template, job=sample_job, status='sending')
+    pending = create_notification(sample_template, status='pending')
+    delivered = create_notification(sample_template, status='delivered')
+
+    with freeze_time('2000-01-02 12:00:00'):
+        updated = dao_update_notification_statuses_by_id([
+            (sending.id, 'delivered'),
+            (pending.id, 'permanent-failure'),
+            (delivered.id, 'temporary-failure'),
+            (uuid.uuid4(), 'delivered'),
+        ])
+
+    assert {(row.id, row.status, row.job_id) for row in updated} == {
+        (sending.id, 'delivered', sample_job.id),
+        (pending.id, 'temporary-failure', None),
+    }
+    assert sending.status == 'delivered'
+    assert sending.updated_at == datetime(2000, 1, 2, 12, 0, 0)
+    assert pending.status == 'temporary-failure'
+    assert delivered.status == 'delivered'
+    assert NotificationHistory.query.get(sending.id).status == 'delivered'
+    assert NotificationHistory.query.get(pending.id).status == 'temporary-failure'
+
+
+def test_update_notification_statuses_by_id_applies_updates_for_the_same_notification_in_order(sample_template):
+    first = create_notification(sample_template, status='sending')
+    second = create_notification(sample_template, status='sending')
+
+    dao_update_notification_statuses_by_id([
+        (first.id, 'pending'),
+        (second.id, 'delivered'),
+        (first.id, 'permanent-failure'),
+        (second.id, 'pending'),
+    ])
+
+    assert first.status == 'temporary-failure'
+    assert second.status == 'delivered'
+
+
+def test_update_notification_statuses_by_id_ignores_countries_with_no_delivery_receipts(sample_template):
+    no_receipts = create_notification(sample_template, status='sent', international=True, phone_prefix='1')
+    receipts = create_notification(sample_template, status='sent', international=True, phone_prefix='7')
+
+    updated = dao_update_notification_statuses_by_id([(no_receipts.id, 'delivered'), (receipts.id, 'delivered')])
+
+    assert [row.id for row in updated] == [receipts.id]
+    assert no_receipts.status == 'sent'
+    assert receipts.status == 'delivered'
+
+
+def test_update_notification_statuses_by_reference_only_updates_sending_and_pending(sample_email_template):
+    sending = create_notification(sample_email_template, status='sending', reference='ref-1')
+    sent = create_notification(sample_email_template, status='sent', reference='ref-2')
+    created = create_notification(sample_email_template, status='created', reference='ref-3')
+
+    updated = dao_update_notification_statuses_by_reference([
+        ('ref-1', 'delivered'),
+        ('ref-2', 'delivered'),
+        ('ref-3', 'delivered'),
+    ])
+
+    assert [(row.reference, row.status) for row in updated] == [('ref-1', 'delivered')]
+    assert sending.status == 'delivered'
+    assert sent.status == 'sent'
+    assert created.status == 'created'
+
+
+def test_update_notification_statuses_does_nothing_for_no_updates(notify_db_session):
+    assert dao_update_notification_statuses_by_id([]) == []
+
+
 def test_should_return_zero_count_if_no_notification_with_id():
     assert not update_notification_status_by_id(str(uuid.uuid4()), 'delivered')
 
@@ -696,6 +775,62 @@ def test_save_notification_with_research_mode_service_does_not_create_history(
     assert NotificationHistory.query.count() == 0
 
 
+def test_create_notifications_bulk_creates_notifications_and_history(sample_template, sample_job):
+    notifications = [
+        Notification(**_notification_json(sample_template, job_id=sample_job.id)) for _ in range(3)
+    ]
+
+    created = dao_create_notifications_bulk(notifications)
+
+    assert created == notifications
+    assert all(notification.status == 'created' for notification in created)
+    assert Notification.query.count() == 3
+    assert NotificationHistory.query.count() == 3
+
+
+def test_create_notifications_bulk_skips_notifications_that_already_exist(sample_template, sample_job):
+    existing = Notification(**_notification_json(sample_template, job_id=sample_job.id))
+    dao_create_notification(existing)
+    new = Notification(**_notification_json(sample_template, job_id=sample_job.id))
+
+    created = dao_create_notifications_bulk([
+        Notification(**_notification_json(sample_template, job_id=sample_job.id, id=existing.id)),
+        new
+    ])
+
+    assert created == [new]
+    assert Notification.query.count() == 2
+    assert NotificationHistory.query.count() == 2
+
+
+def test_create_notifications_bulk_inserts_without_adding_to_session(sample_template, sample_job):
+    notifications = [
+        Notification(**_notification_json(sample_template, job_id=sample_job.id)) for _ in range(2)
+    ]
+
+    dao_create_notifications_bulk(notifications)
+
+    assert not any(notification in db.session for notification in notifications)
+    assert {n.id for n in Notification.query.all()} == {uuid.UUID(str(n.id)) for n in notifications}
+    assert all(n.billable_units == 1 for n in NotificationHistory.query.all())
+
+
+def test_create_notifications_bulk_with_no_notifications_does_nothing(notify_db_session):
+    assert dao_create_notifications_bulk([]) == []
+    assert Notification.query.count() == 0
+
+
+def test_create_notifications_bulk_does_not_create_history_for_test_key(sample_email_template, sample_api_key):
+    data = _notification_json(sample_email_template)
+    data['key_type'] = KEY_TYPE_TEST
+    data['api_key_id'] = sample_api_key.id
+
+    dao_create_notifications_bulk([Notification(**data)])
+
+    assert Notification.query.count() == 1
+    assert NotificationHistory.query.count() == 0
+
+
 def test_update_notification_with_test_api_key_does_not_update_or_create_history(sample_email_template, sample_api_key):
     assert Notification.query.count() == 0
     data = _notification_json(sample_email_template)
@@ -1052,6 +1187,33 @@ def test_should_delete_notification_to_sms_sender_after_seven_days(
         assert notification.created_at.date() >= date(2016, 1, 3)
 
 
+@freeze_time("2016-01-10 12:00:00.000000")
+def test_should_delete_notifications_and_sms_senders_in_batches(notify_api, sample_template):
+    sms_sender = create_service_sms_sender(service=sample_template.service, sms_sender='123456', is_default=False)
+    for day in ['2015-12-30', '2015-12-31', '2016-01-01', '2016-01-01', '2016-01-02', '2016-01-05', '2016-01-09']:
+        with freeze_time('{} 12:00:00.000000'.format(day)):
+            create_notification(template=sample_template, sms_sender_id=sms_sender.id)
+
+    with set_config(notify_api, 'DELETE_NOTIFICATIONS_BATCH_SIZE', 2):
+        deleted = delete_notifications_created_more_than_a_week_ago_by_type(SMS_TYPE)
+
+    assert deleted == 5
+    assert Notification.query.count() == 2
+    assert NotificationSmsSender.query.count() == 2
+
+
+@freeze_time("2016-01-10 12:00:00.000000")
+def test_should_delete_notifications_from_just_before_the_start_of_the_day_a_week_ago(sample_template):
+    with freeze_time('2016-01-02 23:59:59.999999'):
+        create_notification(template=sample_template)
+    with freeze_time('2016-01-03 00:00:00.000000'):
+        kept = create_notification(template=sample_template)
+
+    assert delete_notifications_created_more_than_a_week_ago_by_type(SMS_TYPE) == 1
+
+    assert Notification.query.one().id == kept.id
+
+
 @pytest.mark.parametrize('notification_type', ['sms', 'email', 'letter'])
 @freeze_time("2016-01-10 12:00:00.000000")
 def test_should_not_delete_notification_history(notify_db, notify_db_session, sample_service, notification_type):
@@ -1330,6 +1492,23 @@ def test_dao_timeout_notifications_doesnt_affect_letters(sample_letter_template)
     assert updated == 0
 
 
+def test_dao_timeout_notifications_updates_in_batches(notify_api, sample_template, mocker):
+    mock_incr = mocker.patch('app.dao.notifications_dao.statsd_client.incr')
+    with freeze_time(datetime.utcnow() - timedelta(minutes=2)):
+        notifications = [create_notification(sample_template, status='sending') for _ in range(5)]
+
+    with set_config(notify_api, 'TIMEOUT_NOTIFICATIONS_BATCH_SIZE', 2):
+        updated = dao_timeout_notifications(1)
+
+    assert updated == 5
+    for notification in notifications:
+        assert Notification.query.get(notification.id).status == 'temporary-failure'
+        assert NotificationHistory.query.get(notification.id).status == 'temporary-failure'
+    assert [
+        count for (stat, count), _ in mock_incr.call_args_list if stat == 'timeout-notifications.temporary-failure'
+    ] == [2, 2, 1]
+
+
 def test_should_return_notifications_excluding_jobs_by_default(sample_template, sample_job, sample_api_key):
     with_job = create_notification(sample_template, job=sample_job)
     without_job = create_notification(sample_template, api_key=sample_api_key)
@@ -2132,3 +2311,37 @@ def test_dao_get_notification_sms_sender_mapping(sample_notification):
 def test_dao_get_notification_sms_sender_mapping_returns_none(sample_notification):
     notification_to_sender = dao_get_notification_sms_sender_mapping(sample_notification.id)
     assert not notification_to_sender
+
+
+@freeze_time('2018-01-10T12:00:00')
+def test_dao_update_notifications_sent_to_provider_marks_created_notifications_as_sending(sample_template):
+    first = create_notification(template=sample_template, billable_units=0)
+    second = create_notification(template=sample_template, billable_units=0, reference='original-ref')
+
+    dao_update_notifications_sent_to_provider([(first.id, 2, 'ref-1'), (second.id, 1, None)], 'mmg')
+
+    for notification in [Notification.query.get(first.id), NotificationHistory.query.get(first.id)]:
+        assert notification.status == 'sending'
+        assert notification.sent_by == 'mmg'
+        assert notification.sent_at == datetime(2018, 1, 10, 12)
+        assert notification.billable_units == 2
+        assert notification.reference == 'ref-1'
+    assert Notification.query.get(second.id).reference == 'original-ref'
+
+
+@freeze_time('2018-01-10T12:00:00')
+def test_dao_update_notifications_sent_to_provider_records_the_send_for_notifications_already_updated_by_a_receipt(
+    sample_template
+):
+    already_delivered = create_notification(template=sample_template, status='delivered', billable_units=0)
+
+    dao_update_notifications_sent_to_provider([(already_delivered.id, 3, 'ref-3')], 'mmg')
+
+    for notification in [
+        Notification.query.get(already_delivered.id), NotificationHistory.query.get(already_delivered.id)
+    ]:
+        assert notification.status == 'delivered'
+        assert notification.sent_by == 'mmg'
+        assert notification.sent_at == datetime(2018, 1, 10, 12)
+        assert notification.billable_units == 3
+        assert notification.reference == 'ref-3'
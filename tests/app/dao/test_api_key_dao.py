@@ -4,13 +4,15 @@ import pytest
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm.exc import NoResultFound
 
-from app import encryption
+from app import db, encryption
 from app.dao.api_key_dao import (save_model_api_key,
                                  get_model_api_keys,
                                  get_unsigned_secrets,
                                  get_unsigned_secret,
                                  expire_api_key)
+from app.dao.services_dao import dao_fetch_cached_service_by_id_with_api_keys
 from app.models import ApiKey, KEY_TYPE_NORMAL
+from tests.conftest import set_config
 
 
 def test_save_api_key_should_create_new_api_key_and_history(sample_service):
@@ -96,3 +98,30 @@ def test_save_api_key_should_not_create_new_service_history(sample_service):
     save_model_api_key(api_key)
 
     assert Service.get_history_model().query.count() == 1
+
+
+def test_expire_api_key_bumps_the_cached_api_keys_version(sample_api_key, mocker):
+    mock_incr = mocker.patch('app.dao.services_dao.redis_store.incr')
+
+    expire_api_key(service_id=sample_api_key.service_id, api_key_id=sample_api_key.id)
+
+    mock_incr.assert_called_once_with('service-{}-api-keys-version'.format(sample_api_key.service_id))
+
+
+def test_cached_api_keys_are_reloaded_when_the_version_changes(notify_api, sample_api_key, mocker):
+    version_key = 'service-{}-api-keys-version'.format(sample_api_key.service_id)
+    versions = {}
+    mocker.patch('app.dao.services_dao.redis_store.get', side_effect=lambda key: versions.get(key))
+
+    with set_config(notify_api, 'SERVICE_API_KEYS_CACHE_TTL_SECONDS', 30):
+        dao_fetch_cached_service_by_id_with_api_keys(sample_api_key.service_id)
+        # as if another process had expired the key: this one only sees the new version in redis
+        ApiKey.query.filter_by(id=sample_api_key.id).update({'expiry_date': datetime.utcnow()})
+        db.session.commit()
+
+        cached_service = dao_fetch_cached_service_by_id_with_api_keys(sample_api_key.service_id)
+        versions[version_key] = b'1'
+        reloaded_service = dao_fetch_cached_service_by_id_with_api_keys(sample_api_key.service_id)
+
+    assert cached_service.api_keys[0].expiry_date is None
+    assert reloaded_service.api_keys[0].expiry_date is not None
@@ -0,0 +1,26 @@
+from unittest.mock import Mock
+
+from app import db
+from app.dao.dao_utils import after_commit
+
+
+def test_after_commit_calls_callback_once_the_transaction_is_committed(notify_db_session):
+    callback = Mock()
+
+    after_commit(callback)
+    assert not callback.called
+
+    db.session.commit()
+    db.session.commit()
+    callback.assert_called_once_with()
+
+
+def test_after_commit_forgets_callback_if_the_transaction_is_rolled_back(notify_db_session):
+    callback = Mock()
+    db.session.execute('SELECT 1')
+
+    after_commit(callback)
+    db.session.rollback()
+    db.session.commit()
+
+    assert not callback.called
@@ -0,0 +1,195 @@
+from datetime import date, datetime
+
+from freezegun import freeze_time
+
+from app.dao.fact_notification_status_dao import (
+    NotificationStatusCount,
+    fetch_notification_status_counts,
+    fetch_todays_notification_status,
+    update_fact_notification_status
+)
+from app.models import FactNotificationStatus, KEY_TYPE_NORMAL, KEY_TYPE_TEST
+
+from tests.app.db import create_notification, create_service, create_template
+
+
+@freeze_time('2018-01-10T12:00:00')
+def test_update_fact_notification_status_counts_a_days_notifications(notify_db_session):
+    service = create_service()
+    sms_template = create_template(service=service)
+    email_template = create_template(service=service, template_type='email')
+    create_notification(sms_template, created_at=datetime(2018, 1, 9, 10), status='delivered')
+    create_notification(sms_template, created_at=datetime(2018, 1, 9, 11), status='delivered')
+    create_notification(email_template, created_at=datetime(2018, 1, 9, 12), status='sending')
+    create_notification(sms_template, created_at=datetime(2018, 1, 9, 13), key_type=KEY_TYPE_TEST)
+    create_notification(sms_template, created_at=datetime(2018, 1, 8, 23, 59))
+    create_notification(sms_template, created_at=datetime(2018, 1, 10))
+
+    update_fact_notification_status(date(2018, 1, 9))
+
+    rows = FactNotificationStatus.query.order_by(
+        FactNotificationStatus.notification_type,
+        FactNotificationStatus.key_type,
+        FactNotificationStatus.notification_status
+    ).all()
+    assert [
+        (row.bst_date, row.notification_type, row.key_type, row.notification_status, row.notification_count)
+        for row in rows
+    ] == [
+        (date(2018, 1, 9), 'email', KEY_TYPE_NORMAL, 'sending', 1),
+        (date(2018, 1, 9), 'sms', KEY_TYPE_NORMAL, 'delivered', 2),
+        (date(2018, 1, 9), 'sms', KEY_TYPE_TEST, 'created', 1),
+    ]
+
+
+@freeze_time('2018-01-10T12:00:00')
+def test_update_fact_notification_status_replaces_the_days_counts(notify_db_session):
+    template = create_template(service=create_service())
+    create_notification(template, created_at=datetime(2018, 1, 9, 10))
+    update_fact_notification_status(date(2018, 1, 9))
+
+    create_notification(template, created_at=datetime(2018, 1, 9, 11))
+    update_fact_notification_status(date(2018, 1, 9))
+
+    rows = FactNotificationStatus.query.all()
+    assert len(rows) == 1
+    assert rows[0].notification_count == 2
+
+
+@freeze_time('2018-07-10T12:00:00')
+def test_update_fact_notification_status_uses_london_days(notify_db_session):
+    template = create_template(service=create_service())
+    create_notification(template, created_at=datetime(2018, 7, 8, 22, 59))
+    create_notification(template, created_at=datetime(2018, 7, 8, 23, 0))
+    create_notification(template, created_at=datetime(2018, 7, 9, 22, 59))
+
+    update_fact_notification_status(date(2018, 7, 9))
+
+    assert [row.notification_count for row in FactNotificationStatus.query.all()] == [2]
+
+
+@freeze_time('2018-01-20T12:00:00')
+def test_update_fact_notification_status_excludes_test_notifications_older_than_a_week(notify_db_session):
+    template = create_template(service=create_service())
+    create_notification(template, created_at=datetime(2018, 1, 9, 10))
+    create_notification(template, created_at=datetime(2018, 1, 9, 11), key_type=KEY_TYPE_TEST)
+
+    update_fact_notification_status(date(2018, 1, 9))
+
+    rows = FactNotificationStatus.query.all()
+    assert len(rows) == 1
+    assert rows[0].key_type == KEY_TYPE_NORMAL
+
+
+@freeze_time('2018-01-10T12:00:00')
+def test_fetch_notification_status_counts_adds_today_to_the_fact_table(notify_db_session):
+    service = create_service()
+    template = create_template(service=service)
+    create_notification(template, created_at=datetime(2018, 1, 8, 10))
+    create_notification(template, created_at=datetime(2018, 1, 9, 10))
+    create_notification(template, created_at=datetime(2018, 1, 10, 10))
+    update_fact_notification_status(date(2018, 1, 8))
+    update_fact_notification_status(date(2018, 1, 9))
+
+    counts = fetch_notification_status_counts(date(2018, 1, 9), date(2018, 1, 10))
+
+    assert sorted(counts) == [
+        NotificationStatusCount(str(service.id), 'sms', KEY_TYPE_NORMAL, 'created', 1),
+        NotificationStatusCount(str(service.id), 'sms', KEY_TYPE_NORMAL, 'created', 1),
+    ]
+
+
+@freeze_time('2018-01-10T12:00:00')
+def test_fetch_notification_status_counts_filters_by_service(notify_db_session):
+    service = create_service()
+    other_service = create_service(service_name='other service')
+    create_notification(create_template(service=service), created_at=datetime(2018, 1, 9, 10))
+    create_notification(create_template(service=other_service), created_at=datetime(2018, 1, 9, 10))
+    create_notification(create_template(service=other_service), created_at=datetime(2018, 1, 10, 10))
+    update_fact_notification_status(date(2018, 1, 9))
+
+    counts = fetch_notification_status_counts(date(2018, 1, 9), date(2018, 1, 10), service_id=service.id)
+
+    assert counts == [NotificationStatusCount(str(service.id), 'sms', KEY_TYPE_NORMAL, 'created', 1)]
+
+
+@freeze_time('2018-01-10T00:05:00')
+def test_fetch_notification_status_counts_counts_yesterday_from_notifications(notify_db_session):
+    service = create_service()
+    template = create_template(service=service)
+    create_notification(template, created_at=datetime(2018, 1, 9, 10), status='delivered')
+    with freeze_time('2018-01-09T23:00:00'):
+        update_fact_notification_status(date(2018, 1, 9))
+    create_notification(template, created_at=datetime(2018, 1, 9, 23, 30), status='delivered')
+
+    counts = fetch_notification_status_counts(date(2018, 1, 9), date(2018, 1, 9))
+
+    assert counts == [NotificationStatusCount(str(service.id), 'sms', KEY_TYPE_NORMAL, 'delivered', 2)]
+
+
+@freeze_time('2018-01-10T12:00:00')
+def test_fetch_notification_status_counts_counts_days_not_refreshed_since_they_ended_from_notifications(
+    notify_db_session
+):
+    service = create_service()
+    template = create_template(service=service)
+    create_notification(template, created_at=datetime(2018, 1, 6, 10))
+    create_notification(template, created_at=datetime(2018, 1, 7, 10))
+    with freeze_time('2018-01-07T20:00:00'):
+        update_fact_notification_status(date(2018, 1, 6))
+        update_fact_notification_status(date(2018, 1, 7))
+    create_notification(template, created_at=datetime(2018, 1, 7, 21))
+    update_fact_notification_status(date(2018, 1, 6))
+
+    counts = fetch_notification_status_counts(date(2018, 1, 6), date(2018, 1, 8))
+
+    assert sorted(counts) == [
+        NotificationStatusCount(str(service.id), 'sms', KEY_TYPE_NORMAL, 'created', 1),
+        NotificationStatusCount(str(service.id), 'sms', KEY_TYPE_NORMAL, 'created', 2),
+    ]
+
+
+@freeze_time('2018-01-10T12:00:00')
+def test_fetch_notification_status_counts_counts_recent_days_without_fact_rows_from_notifications(notify_db_session):
+    service = create_service()
+    template = create_template(service=service)
+    create_notification(template, created_at=datetime(2018, 1, 5, 10))
+    create_notification(template, created_at=datetime(2018, 1, 6, 10))
+    update_fact_notification_status(date(2018, 1, 6))
+
+    counts = fetch_notification_status_counts(date(2018, 1, 5), date(2018, 1, 6))
+
+    assert sorted(counts) == [
+        NotificationStatusCount(str(service.id), 'sms', KEY_TYPE_NORMAL, 'created', 1),
+        NotificationStatusCount(str(service.id), 'sms', KEY_TYPE_NORMAL, 'created', 1),
+    ]
+
+
+@freeze_time('2018-01-10T12:00:00')
+def test_fetch_todays_notification_status_returns_cached_counts(notify_db_session, mocker):
+    mock_redis_get = mocker.patch(
+        'app.dao.fact_notification_status_dao.redis_store.get',
+        return_value=b'[["abc", "sms", "normal", "delivered", 3]]'
+    )
+
+    assert fetch_todays_notification_status() == [
+        NotificationStatusCount('abc', 'sms', KEY_TYPE_NORMAL, 'delivered', 3)
+    ]
+    mock_redis_get.assert_called_once_with('notification-status-2018-01-10')
+
+
+@freeze_time('2018-01-10T12:00:00')
+def test_fetch_todays_notification_status_caches_counts(notify_db_session, mocker):
+    mock_redis_set = mocker.patch('app.dao.fact_notification_status_dao.redis_store.set')
+    service = create_service()
+    create_notification(create_template(service=service), created_at=datetime(2018, 1, 10, 10))
+    create_notification(create_template(service=service), created_at=datetime(2018, 1, 9, 10))
+
+    counts = fetch_todays_notification_status(service.id)
+
+    assert counts == [NotificationStatusCount(str(service.id), 'sms', KEY_TYPE_NORMAL, 'created', 1)]
+    mock_redis_set.assert_called_once_with(
+        'service-{}-notification-status-2018-01-10'.format(service.id),
+        '[["{}", "sms", "normal", "created", 1]]'.format(service.id),
+        ex=30
+    )
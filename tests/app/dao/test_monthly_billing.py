@@ -5,6 +5,7 @@ from functools import partial
 
 from app.dao.monthly_billing_dao import (
     create_or_update_monthly_billing,
+    create_or_update_monthly_billing_for_all_services,
     get_monthly_billing_entry,
     get_monthly_billing_by_notification_type,
     get_service_ids_that_need_billing_populated,
@@ -315,6 +316,54 @@ def test_update_monthly_billing_overwrites_old_totals(sample_template):
     assert first_updated_at != second_update.updated_at
 
 
+def test_add_monthly_billing_for_all_services_populates_every_service_with_billable_units(notify_db_session):
+    create_rate(start_date=JAN_2017_MONTH_START, value=0.0158, notification_type=SMS_TYPE)
+    create_rate(start_date=JAN_2017_MONTH_START + timedelta(days=5), value=0.123, notification_type=SMS_TYPE)
+    service_1 = create_service(service_name="Service One")
+    service_2 = create_service(service_name="Service Two")
+    service_3 = create_service(service_name="Service Three")
+    create_notification(
+        template=create_template(service=service_1), created_at=JAN_2017_MONTH_START,
+        billable_units=1, status='delivered'
+    )
+    create_notification(
+        template=create_template(service=service_1), created_at=JAN_2017_MONTH_START + timedelta(days=5),
+        billable_units=2, status='delivered'
+    )
+    create_notification(
+        template=create_template(service=service_2, template_type=EMAIL_TYPE), created_at=JAN_2017_MONTH_START,
+        status='delivered'
+    )
+    create_notification(
+        template=create_template(service=service_3), created_at=JAN_2017_MONTH_START - timedelta(days=1),
+        billable_units=1, status='delivered'
+    )
+
+    create_or_update_monthly_billing_for_all_services(billing_month=JAN_2017_MONTH_START)
+
+    monthly_billing = MonthlyBilling.query.order_by(MonthlyBilling.notification_type).all()
+    totals = {(row.service_id, row.notification_type): row.monthly_totals for row in monthly_billing}
+
+    assert len(monthly_billing) == 4
+    assert totals[(service_1.id, EMAIL_TYPE)] == []
+    assert [(x['billing_units'], x['rate']) for x in totals[(service_1.id, SMS_TYPE)]] == [(1, 0.0158), (2, 0.123)]
+    assert totals[(service_2.id, SMS_TYPE)] == []
+    assert [(x['billing_units'], x['rate']) for x in totals[(service_2.id, EMAIL_TYPE)]] == [(1, 0)]
+
+
+def test_add_monthly_billing_for_all_services_overwrites_old_totals(sample_template):
+    create_rate(JAN_2017_MONTH_START, 0.123, SMS_TYPE)
+    create_notification(template=sample_template, created_at=JAN_2017_MONTH_START, billable_units=1, status='delivered')
+    create_or_update_monthly_billing_for_all_services(billing_month=JAN_2017_MONTH_START)
+
+    create_notification(template=sample_template, created_at=JAN_2017_MONTH_START, billable_units=2, status='delivered')
+    create_or_update_monthly_billing_for_all_services(billing_month=JAN_2017_MONTH_START)
+
+    monthly_billing = get_monthly_billing_entry(sample_template.service_id, JAN_2017_MONTH_START, SMS_TYPE)
+    assert MonthlyBilling.query.count() == 2
+    assert monthly_billing.monthly_totals[0]['billing_units'] == 3
+
+
 def test_get_service_ids_that_need_billing_populated_return_correctly(notify_db_session):
     service_1 = create_service(service_name="Service One")
     template_1 = create_template(service=service_1)
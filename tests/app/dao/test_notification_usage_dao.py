@@ -5,15 +5,17 @@ from freezegun import freeze_time
 
 from app.dao.date_util import get_financial_year
 from app.dao.notification_usage_dao import (
+    billing_data_query,
     get_rates_for_daterange,
     get_billing_data_for_month,
     get_monthly_billing_data
 )
 from app.models import (
     Rate,
+    EMAIL_TYPE,
     SMS_TYPE,
 )
-from tests.app.db import create_notification, create_rate
+from tests.app.db import create_notification, create_rate, create_service, create_template
 
 
 def test_get_rates_for_daterange(notify_db, notify_db_session):
@@ -211,3 +213,37 @@ def test_get_monthly_billing_data_where_start_date_before_rate_returns_empty(
     )
 
     assert not results
+
+
+def test_billing_data_query_bills_each_notification_at_the_rate_valid_when_it_was_created(notify_db_session):
+    create_rate(datetime(2017, 1, 1), 0.015, SMS_TYPE)
+    create_rate(datetime(2017, 1, 10), 0.016, SMS_TYPE)
+    service_1 = create_service(service_name='Service One')
+    service_2 = create_service(service_name='Service Two')
+    create_notification(template=create_template(service_1), created_at=datetime(2017, 1, 9, 23, 59),
+                        status='delivered', billable_units=1)
+    create_notification(template=create_template(service_1), created_at=datetime(2017, 1, 10),
+                        status='delivered', billable_units=2)
+    create_notification(template=create_template(service_2), created_at=datetime(2017, 1, 20),
+                        status='delivered', billable_units=3)
+    create_notification(template=create_template(service_2, template_type=EMAIL_TYPE),
+                        created_at=datetime(2017, 1, 20), status='delivered')
+
+    results = billing_data_query(datetime(2017, 1, 1), datetime(2017, 1, 31), [SMS_TYPE, EMAIL_TYPE]).all()
+
+    assert sorted(
+        (x.service_id == service_1.id, x.notification_type, x.billing_units, x.rate) for x in results
+    ) == [
+        (False, EMAIL_TYPE, 1, 0),
+        (False, SMS_TYPE, 3, 0.016),
+        (True, SMS_TYPE, 1, 0.015),
+        (True, SMS_TYPE, 2, 0.016),
+    ]
+
+
+def test_billing_data_query_leaves_out_sms_sent_before_the_first_rate(notify_db_session):
+    create_rate(datetime(2017, 1, 10), 0.016, SMS_TYPE)
+    template = create_template(create_service())
+    create_notification(template=template, created_at=datetime(2017, 1, 9), status='delivered')
+
+    assert billing_data_query(datetime(2017, 1, 1), datetime(2017, 1, 31), [SMS_TYPE]).all() == []
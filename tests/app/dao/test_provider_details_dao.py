@@ -5,8 +5,10 @@ from freezegun import freeze_time
 from sqlalchemy import asc, desc
 
 from app.models import ProviderDetails, ProviderDetailsHistory
-from app import clients
+from app import clients, db
+from app.dao import provider_details_dao
 from app.dao.provider_details_dao import (
+    get_active_provider_weights_by_notification_type,
     get_alternative_sms_provider,
     get_current_provider,
     get_provider_details,
@@ -66,6 +68,60 @@ def test_can_get_email_providers(restore_provider_details):
     assert all('email' == notification_type for notification_type in types)
 
 
+def test_get_active_provider_weights_returns_active_providers_in_priority_order(restore_provider_details):
+    set_primary_sms_provider('firetext')
+    mmg = get_provider_details_by_identifier('mmg')
+    mmg.active = False
+    dao_update_provider_details(mmg)
+
+    assert get_active_provider_weights_by_notification_type('sms') == [('firetext', 0), ('loadtesting', 0)]
+    assert get_active_provider_weights_by_notification_type('sms', True) == []
+
+
+def test_get_active_provider_weights_only_queries_once(restore_provider_details, mocker):
+    get_providers = mocker.spy(provider_details_dao, 'get_provider_details_by_notification_type')
+
+    assert get_active_provider_weights_by_notification_type('email') == [('ses', 0)]
+    assert get_active_provider_weights_by_notification_type('email') == [('ses', 0)]
+
+    assert get_providers.call_count == 1
+
+
+def test_get_active_provider_weights_reloads_when_routing_version_changes(restore_provider_details, mocker):
+    mocker.patch('app.dao.provider_details_dao.redis_store.get', side_effect=[b'1', b'1', b'2'])
+    get_providers = mocker.spy(provider_details_dao, 'get_provider_details_by_notification_type')
+
+    for _ in range(3):
+        get_active_provider_weights_by_notification_type('email')
+
+    assert get_providers.call_count == 2
+
+
+def test_update_provider_details_bumps_routing_version(restore_provider_details, mocker):
+    redis_incr = mocker.patch('app.dao.provider_details_dao.redis_store.incr')
+    get_active_provider_weights_by_notification_type('email')
+    ses = get_provider_details_by_identifier('ses')
+    ses.active = False
+
+    dao_update_provider_details(ses)
+
+    redis_incr.assert_called_once_with('provider-routing-version')
+    assert get_active_provider_weights_by_notification_type('email') == []
+
+
+def test_routing_version_is_not_bumped_until_the_change_is_committed(restore_provider_details, mocker):
+    redis_incr = mocker.patch('app.dao.provider_details_dao.redis_store.incr')
+    ses = get_provider_details_by_identifier('ses')
+    ses.active = False
+
+    provider_details_dao.provider_routing_changed()
+    assert not redis_incr.called
+
+    db.session.rollback()
+    db.session.commit()
+    assert not redis_incr.called
+
+
 def test_should_not_error_if_any_provider_in_code_not_in_database(restore_provider_details):
     providers = ProviderDetails.query.all()
 
@@ -289,3 +345,27 @@ def test_get_current_sms_provider_returns_active_only(restore_provider_details):
     new_current_provider = get_current_provider('sms')
 
     assert current_provider.identifier != new_current_provider.identifier
+
+
+def test_toggle_sms_provider_shifts_weight_when_splitting_traffic(restore_provider_details):
+    mmg = get_provider_details_by_identifier('mmg')
+    firetext = get_provider_details_by_identifier('firetext')
+    mmg.weight = 15
+    firetext.weight = 5
+    dao_update_provider_details(mmg)
+    dao_update_provider_details(firetext)
+
+    dao_toggle_sms_provider('mmg')
+    assert (mmg.weight, firetext.weight) == (5, 15)
+
+    dao_toggle_sms_provider('mmg')
+    assert (mmg.weight, firetext.weight) == (0, 20)
+
+
+def test_toggle_sms_provider_switches_priority_when_not_splitting_traffic(restore_provider_details):
+    set_primary_sms_provider('mmg')
+
+    dao_toggle_sms_provider('mmg')
+
+    assert get_current_provider('sms').identifier == 'firetext'
+    assert get_provider_details_by_identifier('mmg').weight == 0
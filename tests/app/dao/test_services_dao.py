@@ -3,11 +3,13 @@ import uuid
 import functools
 
 import pytest
+from sqlalchemy import event
 from sqlalchemy.orm.exc import FlushError, NoResultFound
 from sqlalchemy.exc import IntegrityError
 from freezegun import freeze_time
 from app import db
 from app.celery.scheduled_tasks import daily_stats_template_usage_by_month
+from app.dao.fact_notification_status_dao import update_fact_notification_status
 from app.dao.inbound_numbers_dao import (
     dao_set_inbound_number_to_service,
     dao_get_available_inbound_numbers,
@@ -37,6 +39,7 @@ from app.dao.services_dao import (
     dao_fetch_monthly_historical_usage_by_template_for_service)
 from app.dao.service_permissions_dao import dao_add_service_permission, dao_remove_service_permission
 from app.dao.users_dao import save_model_user
+from app.utils import convert_utc_to_bst
 from app.models import (
     ProviderStatistics,
     VerifyCode,
@@ -662,11 +665,49 @@ def test_dao_fetch_todays_total_message_count_returns_count_for_today(notify_db,
     assert fetch_todays_total_message_count(sample_notification.service.id) == 1
 
 
+@freeze_time('2018-01-10T12:00:00')
+def test_dao_fetch_todays_total_message_count_counts_every_status_and_type_for_today(
+    notify_db,
+    notify_db_session,
+    sample_template,
+    sample_email_template
+):
+    create_notification(notify_db, notify_db_session, template=sample_template, status='delivered')
+    create_notification(notify_db, notify_db_session, template=sample_template, status='created')
+    create_notification(notify_db, notify_db_session, template=sample_email_template, status='sending')
+    create_notification(notify_db, notify_db_session, created_at=datetime(2018, 1, 9, 23, 59))
+    create_notification(notify_db, notify_db_session, key_type=KEY_TYPE_TEST)
+
+    assert fetch_todays_total_message_count(sample_template.service_id) == 3
+
+
 def test_dao_fetch_todays_total_message_count_returns_0_when_no_messages_for_today(notify_db,
                                                                                    notify_db_session):
     assert fetch_todays_total_message_count(uuid.uuid4()) == 0
 
 
+def test_dao_fetch_todays_total_message_count_uses_the_service_id_created_at_index(notify_db_session):
+    statements = []
+
+    def capture_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(db.engine, 'before_cursor_execute', capture_statement)
+    try:
+        fetch_todays_total_message_count(uuid.uuid4())
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', capture_statement)
+    statement, parameters = statements[-1]
+
+    # the test tables are tiny, so without this the planner would rather read them straight through
+    cursor = db.session.connection().connection.cursor()
+    cursor.execute('SET LOCAL enable_seqscan = off')
+    cursor.execute('EXPLAIN ' + statement, parameters)
+    plan = '\n'.join(row[0] for row in cursor.fetchall())
+
+    assert 'ix_notifications_service_id_created_at_id' in plan
+
+
 def test_dao_fetch_todays_stats_for_all_services_includes_all_services(notify_db, notify_db_session, service_factory):
     # two services, each with an email and sms notification
     service1 = service_factory.get('service 1', email_from='service.1')
@@ -755,6 +796,7 @@ def test_fetch_stats_by_date_range_for_all_services(notify_db, notify_db_session
     result_one = create_notification(notify_db, notify_db_session, created_at=datetime.now() - timedelta(days=2))
     create_notification(notify_db, notify_db_session, created_at=datetime.now() - timedelta(days=1))
     create_notification(notify_db, notify_db_session, created_at=datetime.now())
+    update_fact_notification_status_for_days_before_today(4)
 
     start_date = (datetime.utcnow() - timedelta(days=2)).date()
     end_date = (datetime.utcnow() - timedelta(days=1)).date()
@@ -767,6 +809,12 @@ def test_fetch_stats_by_date_range_for_all_services(notify_db, notify_db_session
                           result_one.service.created_at, 'sms', 'created', 2)
 
 
+def update_fact_notification_status_for_days_before_today(days):
+    today = convert_utc_to_bst(datetime.utcnow()).date()
+    for days_ago in range(1, days + 1):
+        update_fact_notification_status(today - timedelta(days=days_ago))
+
+
 @freeze_time('2001-01-01T23:59:00')
 def test_dao_suspend_service_marks_service_as_inactive_and_expires_api_keys(sample_service, sample_api_key):
     dao_suspend_service(sample_service.id)
@@ -781,7 +829,7 @@ def test_dao_suspend_service_marks_service_as_inactive_and_expires_api_keys(samp
 @pytest.mark.parametrize("start_delta, end_delta, expected",
                          [("5", "1", "4"),  # a date range less than 7 days ago returns test and normal notifications
                           ("9", "8", "1"),  # a date range older than 9 days does not return test notifications.
-                          ("8", "4", "2")])  # a date range that starts more than 7 days ago
+                          ("8", "4", "3")])  # days in the last 7 still include test notifications
 @freeze_time('2017-10-23T00:00:00')
 def test_fetch_stats_by_date_range_for_all_services_returns_test_notifications(notify_db,
                                                                                notify_db_session,
@@ -796,6 +844,7 @@ def test_fetch_stats_by_date_range_for_all_services_returns_test_notifications(n
     create_noti(created_at=datetime.now() - timedelta(days=4), key_type='test')
     create_noti(created_at=datetime.now() - timedelta(days=8), key_type='test')
     create_noti(created_at=datetime.now() - timedelta(days=8), key_type='normal')
+    update_fact_notification_status_for_days_before_today(9)
 
     start_date = (datetime.utcnow() - timedelta(days=int(start_delta))).date()
     end_date = (datetime.utcnow() - timedelta(days=int(end_delta))).date()
@@ -825,6 +874,7 @@ def test_fetch_stats_by_date_range_during_bst_hour_for_all_services_returns_test
     create_noti(created_at=datetime.now() - timedelta(days=8), key_type='normal')
     create_noti(created_at=datetime.now() - timedelta(days=9), key_type='normal')
     create_noti(created_at=datetime.now() - timedelta(days=9), key_type='test')
+    update_fact_notification_status_for_days_before_today(10)
 
     start_date = (datetime.utcnow() - timedelta(days=int(start_delta))).date()
     end_date = (datetime.utcnow() - timedelta(days=int(end_delta))).date()
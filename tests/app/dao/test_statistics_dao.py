@@ -7,6 +7,8 @@ from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 from app.dao.statistics_dao import (
     create_or_update_job_sending_statistics,
     update_job_stats_outcome_count,
+    update_job_stats_outcome_counts,
+    dao_add_job_statistics_counts,
     dao_timeout_job_statistics)
 from app.models import (
     JobStatistics,
@@ -19,6 +21,7 @@ from app.models import (
     NOTIFICATION_PERMANENT_FAILURE,
     NOTIFICATION_PENDING, NOTIFICATION_CREATED, NOTIFICATION_FAILED, NOTIFICATION_SENT, NOTIFICATION_SENDING,
     NOTIFICATION_STATUS_TYPES_COMPLETED, Notification, NOTIFICATION_STATUS_TYPES, NOTIFICATION_STATUS_SUCCESS)
+from tests.app.db import create_job
 from tests.app.conftest import sample_notification, sample_email_template, sample_template, sample_job, sample_service
 
 
@@ -929,3 +932,100 @@ def test_timeout_job_sets_all_non_delivered_states_to_error(
         assert stats.sent == count_notifications
         assert stats.delivered == count_success_notifications
         assert stats.failed == count_error_notifications
+
+
+def test_update_job_stats_outcome_counts_adds_many_outcomes_at_once(notify_db, notify_db_session, sample_job):
+    notification = sample_notification(notify_db, notify_db_session, job=sample_job)
+    create_or_update_job_sending_statistics(notification)
+
+    assert update_job_stats_outcome_counts(sample_job.id, SMS_TYPE, delivered_count=5, failed_count=2) == 1
+
+    stat = JobStatistics.query.one()
+    assert stat.sms_delivered == 5
+    assert stat.delivered == 5
+    assert stat.sms_failed == 2
+    assert stat.failed == 2
+    assert stat.emails_delivered == 0
+
+
+def test_update_job_stats_outcome_counts_returns_zero_if_job_has_no_stats(notify_db_session, sample_job):
+    assert update_job_stats_outcome_counts(sample_job.id, SMS_TYPE, delivered_count=1, failed_count=0) == 0
+
+
+def test_dao_add_job_statistics_counts_creates_and_adds_to_stats(notify_db, notify_db_session, sample_job):
+    other_job = create_job(sample_job.template)
+    notification = sample_notification(notify_db, notify_db_session, job=sample_job)
+    create_or_update_job_sending_statistics(notification)
+
+    dao_add_job_statistics_counts({
+        (str(sample_job.id), SMS_TYPE, 'delivered'): 3,
+        (str(sample_job.id), SMS_TYPE, 'failed'): 1,
+        (str(other_job.id), SMS_TYPE, 'sent'): 4,
+        (str(other_job.id), SMS_TYPE, 'failed'): 2,
+    })
+
+    stats = JobStatistics.query.filter_by(job_id=sample_job.id).one()
+    assert stats.sms_sent == 1
+    assert stats.sent == 1
+    assert stats.sms_delivered == 3
+    assert stats.delivered == 3
+    assert stats.sms_failed == 1
+    assert stats.failed == 1
+
+    other_stats = JobStatistics.query.filter_by(job_id=other_job.id).one()
+    assert other_stats.sms_sent == 4
+    assert other_stats.sent == 4
+    assert other_stats.sms_delivered == 0
+    assert other_stats.sms_failed == 2
+    assert other_stats.failed == 2
+
+
+def test_dao_add_job_statistics_counts_ignores_delivered_letters(sample_letter_job):
+    dao_add_job_statistics_counts({(str(sample_letter_job.id), LETTER_TYPE, 'delivered'): 1})
+
+    assert JobStatistics.query.count() == 0
+
+
+def test_timeout_job_statistics_only_recounts_jobs_changed_since_the_last_run(
+    notify_db, notify_db_session, sample_template, mocker
+):
+    last_run = datetime.utcnow() - timedelta(days=1)
+    mock_redis = mocker.patch('app.dao.statistics_dao.redis_store')
+    mock_redis.get.return_value = last_run.strftime('%Y-%m-%dT%H:%M:%S.%f').encode('utf-8')
+
+    settled_job = create_job(sample_template)
+    changed_job = create_job(sample_template)
+    for job in [settled_job, changed_job]:
+        notification = sample_notification(notify_db, notify_db_session, job=job, status=NOTIFICATION_CREATED)
+        create_or_update_job_sending_statistics(notification)
+
+    JobStatistics.query.update({
+        JobStatistics.created_at: last_run - timedelta(days=1),
+        JobStatistics.updated_at: last_run - timedelta(minutes=1)
+    })
+    JobStatistics.query.filter_by(job_id=changed_job.id).update({JobStatistics.updated_at: datetime.utcnow()})
+
+    assert dao_timeout_job_statistics(1) == 1
+
+    assert JobStatistics.query.filter_by(job_id=settled_job.id).one().sms_failed == 0
+    assert JobStatistics.query.filter_by(job_id=changed_job.id).one().sms_failed == 1
+    mock_redis.set.assert_called_once_with('job-statistics-timeout-watermark', mocker.ANY)
+
+
+def test_timeout_job_statistics_recounts_jobs_that_have_just_become_old_enough(
+    notify_db, notify_db_session, sample_job, mocker
+):
+    last_run = datetime.utcnow() - timedelta(days=1)
+    mock_redis = mocker.patch('app.dao.statistics_dao.redis_store')
+    mock_redis.get.return_value = last_run.strftime('%Y-%m-%dT%H:%M:%S.%f').encode('utf-8')
+
+    notification = sample_notification(notify_db, notify_db_session, job=sample_job, status=NOTIFICATION_CREATED)
+    create_or_update_job_sending_statistics(notification)
+    JobStatistics.query.update({
+        JobStatistics.created_at: last_run - timedelta(minutes=30),
+        JobStatistics.updated_at: None
+    })
+
+    assert dao_timeout_job_statistics(60 * 60) == 1
+
+    assert JobStatistics.query.one().sms_failed == 1
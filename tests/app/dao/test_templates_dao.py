@@ -1,4 +1,5 @@
 from datetime import datetime
+import json
 
 from freezegun import freeze_time
 from sqlalchemy.orm.exc import NoResultFound
@@ -7,11 +8,13 @@ import pytest
 from app.dao.templates_dao import (
     dao_create_template,
     dao_get_template_by_id_and_service_id,
+    dao_get_template_version_dict,
     dao_get_all_templates_for_service,
     dao_update_template,
     dao_get_template_versions,
     dao_get_templates_for_cache,
     dao_redact_template)
+from app.dao import templates_dao
 from app.models import Template, TemplateHistory, TemplateRedacted
 
 from tests.app.conftest import sample_template as create_sample_template
@@ -210,6 +213,53 @@ def test_get_template_by_id_and_service_returns_none_if_no_template(sample_servi
     assert 'No row was found for one' in str(e.value)
 
 
+def test_get_template_version_dict_returns_the_requested_version(sample_template):
+    sample_template.content = 'new content'
+    dao_update_template(sample_template)
+
+    template_dict = dao_get_template_version_dict(sample_template.id, 1)
+
+    assert template_dict == {
+        'id': str(sample_template.id),
+        'service_id': str(sample_template.service_id),
+        'name': sample_template.name,
+        'template_type': 'sms',
+        'content': 'This is a template:\nwith a newline',
+        'subject': None,
+        'process_type': 'normal',
+        'archived': False,
+        'version': 1,
+    }
+    assert dao_get_template_version_dict(sample_template.id, 2)['content'] == 'new content'
+
+
+def test_get_template_version_dict_only_queries_once(sample_template, mocker):
+    dao_get_template_by_id = mocker.spy(templates_dao, 'dao_get_template_by_id')
+    redis_set = mocker.patch('app.dao.templates_dao.redis_store.set')
+
+    first = dao_get_template_version_dict(sample_template.id, 1)
+    first['content'] = 'changed by the caller'
+    second = dao_get_template_version_dict(sample_template.id, 1)
+
+    assert second['content'] == sample_template.content
+    dao_get_template_by_id.assert_called_once_with(sample_template.id, 1)
+    redis_set.assert_called_once_with(
+        'template-{}-version-1'.format(sample_template.id),
+        mocker.ANY,
+        ex=24 * 60 * 60
+    )
+    assert json.loads(redis_set.call_args[0][1])['content'] == sample_template.content
+
+
+def test_get_template_version_dict_uses_redis_if_cached_there(notify_db_session, mocker, fake_uuid):
+    cached_template = {'id': fake_uuid, 'template_type': 'sms', 'content': 'from redis', 'version': 3}
+    mocker.patch('app.dao.templates_dao.redis_store.get', return_value=json.dumps(cached_template).encode('utf-8'))
+    dao_get_template_by_id = mocker.patch('app.dao.templates_dao.dao_get_template_by_id')
+
+    assert dao_get_template_version_dict(fake_uuid, 3) == cached_template
+    assert not dao_get_template_by_id.called
+
+
 def test_create_template_creates_a_history_record_with_current_data(sample_service, sample_user):
     assert Template.query.count() == 0
     assert TemplateHistory.query.count() == 0
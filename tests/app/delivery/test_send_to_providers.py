@@ -5,6 +5,7 @@ from unittest.mock import ANY, call
 
 import pytest
 from notifications_utils.recipients import validate_and_format_phone_number
+from notifications_utils.template import HTMLEmailTemplate
 from flask import current_app
 from requests import HTTPError
 
@@ -14,6 +15,7 @@ from app.dao import (provider_details_dao, notifications_dao)
 from app.dao.provider_details_dao import dao_switch_sms_provider_to_provider_with_identifier
 from app.dao.service_sms_sender_dao import dao_add_sms_sender_for_service
 from app.delivery import send_to_providers
+from app.delivery.throttle import ProviderThrottledException
 from app.models import (
     Notification,
     Organisation,
@@ -70,6 +72,35 @@ def test_should_return_highest_priority_active_provider(restore_provider_details
     assert send_to_providers.provider_to_use('sms', '1234').name == first.identifier
 
 
+@pytest.mark.parametrize('random_point, expected_provider', [
+    (0, 'mmg'),
+    (29.9, 'mmg'),
+    (30, 'firetext'),
+    (40, 'firetext'),
+])
+def test_provider_to_use_splits_traffic_by_weight(restore_provider_details, mocker, random_point, expected_provider):
+    for identifier, weight in [('mmg', 30), ('firetext', 10)]:
+        provider = provider_details_dao.get_provider_details_by_identifier(identifier)
+        provider.weight = weight
+        provider_details_dao.dao_update_provider_details(provider)
+    uniform = mocker.patch('app.delivery.send_to_providers.random.uniform', return_value=random_point)
+
+    assert send_to_providers.provider_to_use('sms', '1234').name == expected_provider
+    uniform.assert_called_once_with(0, 40)
+
+
+def test_provider_to_use_ignores_weights_of_inactive_providers(restore_provider_details):
+    mmg = provider_details_dao.get_provider_details_by_identifier('mmg')
+    mmg.weight = 100
+    mmg.active = False
+    provider_details_dao.dao_update_provider_details(mmg)
+    firetext = provider_details_dao.get_provider_details_by_identifier('firetext')
+    firetext.weight = 1
+    provider_details_dao.dao_update_provider_details(firetext)
+
+    assert send_to_providers.provider_to_use('sms', '1234').name == 'firetext'
+
+
 def test_should_send_personalised_template_to_correct_sms_provider_and_persist(
     sample_sms_template_with_html,
     mocker
@@ -103,6 +134,114 @@ def test_should_send_personalised_template_to_correct_sms_provider_and_persist(
     assert notification.personalisation == {"name": "Jo"}
 
 
+def test_send_sms_batch_to_provider_sends_notifications_in_one_batch(sample_template, mocker):
+    notifications = [
+        create_notification(template=sample_template, to_field=to, status='created')
+        for to in ['+447234123123', '+447234123124']
+    ]
+    send_sms_batch = mocker.patch('app.mmg_client.send_sms_batch', return_value={})
+    stats_mock = mocker.patch('app.delivery.send_to_providers.create_initial_notification_statistic_tasks')
+
+    assert send_to_providers.send_sms_batch_to_provider(notifications) == []
+
+    send_sms_batch.assert_called_once_with([
+        dict(
+            to=validate_and_format_phone_number(notification.to),
+            content='Sample service: This is a template:\nwith a newline',
+            reference=str(notification.id),
+            sender=current_app.config['FROM_NUMBER']
+        )
+        for notification in notifications
+    ])
+    assert stats_mock.call_args_list == [call(notification) for notification in notifications]
+    for notification in notifications:
+        assert notification.status == 'sending'
+        assert notification.sent_by == 'mmg'
+        assert notification.billable_units == 1
+
+
+def test_send_sms_batch_to_provider_leaves_out_notifications_that_cannot_be_batched(
+    sample_template,
+    mocker
+):
+    to_send_individually = [
+        create_notification(template=sample_template, key_type=KEY_TYPE_TEST),
+        create_notification(template=sample_template, international=True),
+        create_notification(template=create_template(create_service(research_mode=True, service_name='research')))
+    ]
+    already_sent = create_notification(template=sample_template, status='sending')
+    inactive_service_notification = create_notification(
+        template=create_template(create_service(active=False, service_name='inactive'))
+    )
+    send_sms_batch = mocker.patch('app.mmg_client.send_sms_batch')
+
+    assert send_to_providers.send_sms_batch_to_provider(
+        to_send_individually + [already_sent, inactive_service_notification]
+    ) == [notification.id for notification in to_send_individually]
+
+    assert not send_sms_batch.called
+    assert already_sent.status == 'sending'
+    assert inactive_service_notification.status == 'technical-failure'
+
+
+def test_send_sms_batch_to_provider_returns_failures_and_toggles_provider(sample_template, mocker):
+    sent, failed = [create_notification(template=sample_template) for _ in range(2)]
+    mocker.patch('app.mmg_client.send_sms_batch', return_value={str(failed.id): Exception('Error')})
+    mocker.patch('app.delivery.send_to_providers.create_initial_notification_statistic_tasks')
+    toggle = mocker.patch('app.delivery.send_to_providers.dao_toggle_sms_provider')
+
+    assert send_to_providers.send_sms_batch_to_provider([sent, failed]) == [failed.id]
+
+    toggle.assert_called_once_with('mmg')
+    assert sent.status == 'sending'
+    assert failed.status == 'created'
+
+
+def test_send_sms_batch_to_provider_does_not_return_sent_notifications_if_recording_them_fails(
+    sample_template,
+    mocker
+):
+    notifications = [create_notification(template=sample_template) for _ in range(2)]
+    mocker.patch('app.mmg_client.send_sms_batch', return_value={})
+    mocker.patch(
+        'app.delivery.send_to_providers.create_initial_notification_statistic_tasks',
+        side_effect=Exception('Error')
+    )
+
+    assert send_to_providers.send_sms_batch_to_provider(notifications) == []
+
+    for notification in notifications:
+        assert notification.status == 'sending'
+        assert notification.sent_by == 'mmg'
+
+
+def test_send_sms_to_provider_does_not_toggle_provider_if_throttled(sample_template, mocker):
+    notification = create_notification(template=sample_template)
+    mocker.patch(
+        'app.delivery.send_to_providers.wait_for_send_tokens', side_effect=ProviderThrottledException('throttled')
+    )
+    send_sms = mocker.patch('app.mmg_client.send_sms')
+    toggle = mocker.patch('app.delivery.send_to_providers.dao_toggle_sms_provider')
+
+    with pytest.raises(ProviderThrottledException):
+        send_to_providers.send_sms_to_provider(notification)
+
+    assert not send_sms.called
+    assert not toggle.called
+    assert notification.status == 'created'
+
+
+def test_send_sms_batch_to_provider_takes_a_send_token_per_notification(sample_template, mocker):
+    notifications = [create_notification(template=sample_template) for _ in range(3)]
+    mocker.patch('app.mmg_client.send_sms_batch', return_value={})
+    mocker.patch('app.delivery.send_to_providers.create_initial_notification_statistic_tasks')
+    wait = mocker.patch('app.delivery.send_to_providers.wait_for_send_tokens')
+
+    send_to_providers.send_sms_batch_to_provider(notifications)
+
+    wait.assert_called_once_with('mmg', 3, bulk=True)
+
+
 def test_should_send_personalised_template_to_correct_email_provider_and_persist(
     sample_email_template_with_html,
     mocker
@@ -426,6 +565,87 @@ def test_send_email_should_use_service_reply_to_email(
     )
 
 
+def mock_send_email_batch(mocker, results):
+    def send_email_batch(messages, on_sent):
+        on_sent([(index, result) for index, result in enumerate(results) if not isinstance(result, Exception)])
+        return results
+
+    return mocker.patch('app.aws_ses_client.send_email_batch', side_effect=send_email_batch)
+
+
+def test_send_email_batch_to_provider_sends_notifications_in_one_batch(sample_email_template, mocker):
+    notifications = [
+        create_notification(template=sample_email_template, to_field=to)
+        for to in ['one@example.gov.uk', 'two@example.gov.uk']
+    ]
+    send_email_batch = mock_send_email_batch(mocker, ['ref-1', 'ref-2'])
+    mocker.patch('app.delivery.send_to_providers.create_initial_notification_statistic_tasks')
+
+    assert send_to_providers.send_email_batch_to_provider(notifications) == []
+
+    messages = send_email_batch.call_args[0][0]
+    assert [message['to_addresses'] for message in messages] == ['one@example.gov.uk', 'two@example.gov.uk']
+    assert messages[0]['source'] == '"Sample service" <sample.service@{}>'.format(
+        current_app.config['NOTIFY_EMAIL_DOMAIN']
+    )
+    assert '<!DOCTYPE html' in messages[0]['html_body']
+    assert [notification.reference for notification in notifications] == ['ref-1', 'ref-2']
+    assert all(notification.status == 'sending' for notification in notifications)
+
+
+def test_send_email_batch_to_provider_returns_notifications_to_send_individually(sample_email_template, mocker):
+    test_key_notification = create_notification(template=sample_email_template, key_type=KEY_TYPE_TEST)
+    invalid_address = create_notification(template=sample_email_template, to_field='not an email address')
+    failed, sent = [create_notification(template=sample_email_template) for _ in range(2)]
+    mock_send_email_batch(mocker, [Exception('Error'), 'ref'])
+    mocker.patch('app.delivery.send_to_providers.create_initial_notification_statistic_tasks')
+
+    assert send_to_providers.send_email_batch_to_provider(
+        [test_key_notification, invalid_address, failed, sent]
+    ) == [test_key_notification.id, invalid_address.id, failed.id]
+
+    assert failed.status == 'created'
+    assert sent.status == 'sending'
+
+
+def test_send_email_batch_to_provider_does_not_return_sent_notifications_if_recording_them_fails(
+    sample_email_template,
+    mocker
+):
+    notifications = [create_notification(template=sample_email_template) for _ in range(2)]
+    mock_send_email_batch(mocker, ['ref-1', 'ref-2'])
+    mocker.patch(
+        'app.delivery.send_to_providers.create_initial_notification_statistic_tasks',
+        side_effect=Exception('Error')
+    )
+
+    assert send_to_providers.send_email_batch_to_provider(notifications) == []
+
+    assert [notification.reference for notification in notifications] == ['ref-1', 'ref-2']
+    assert all(notification.status == 'sending' for notification in notifications)
+
+
+def test_send_email_batch_to_provider_saves_each_reference_as_soon_as_ses_returns_it(sample_email_template, mocker):
+    first, second = [create_notification(template=sample_email_template) for _ in range(2)]
+    references_during_batch = []
+
+    def send_email_batch(messages, on_sent):
+        on_sent([(0, 'ref-1')])
+        references_during_batch.extend(
+            notifications_dao.get_notification_by_id(notification.id).reference for notification in [first, second]
+        )
+        on_sent([(1, 'ref-2')])
+        return ['ref-1', 'ref-2']
+
+    mocker.patch('app.aws_ses_client.send_email_batch', side_effect=send_email_batch)
+    mocker.patch('app.delivery.send_to_providers.create_initial_notification_statistic_tasks')
+
+    send_to_providers.send_email_batch_to_provider([first, second])
+
+    assert references_during_batch == ['ref-1', None]
+    assert second.reference == 'ref-2'
+
+
 def test_get_html_email_renderer_should_return_for_normal_service(sample_service):
     options = send_to_providers.get_html_email_options(sample_service)
     assert options['govuk_banner']
@@ -494,6 +714,47 @@ def test_get_html_email_renderer_handles_org_without_logo(notify_api):
     assert renderer['brand_logo'] is None
 
 
+def test_get_cached_html_email_options_only_works_out_options_once_for_branding(notify_db_session, mocker):
+    get_options = mocker.patch(
+        'app.delivery.send_to_providers.get_html_email_options',
+        return_value={'govuk_banner': True, 'brand_banner': False}
+    )
+    Service = namedtuple('Service', ['branding', 'organisation_id'])
+
+    for _ in range(2):
+        assert send_to_providers.get_cached_html_email_options(Service(BRANDING_ORG, None)) == get_options.return_value
+
+    assert get_options.call_count == 1
+
+
+def test_render_email_only_renders_emails_without_placeholders_once(notify_db_session, mocker):
+    html_template = mocker.patch('app.delivery.send_to_providers.HTMLEmailTemplate', wraps=HTMLEmailTemplate)
+    template_dict = {
+        'id': str(uuid.uuid4()), 'version': 1, 'template_type': 'email', 'subject': 'Hello', 'content': 'Same for all'
+    }
+    options = {'govuk_banner': True, 'brand_banner': False}
+
+    first = send_to_providers.render_email(template_dict, None, options)
+    second = send_to_providers.render_email(template_dict, {'name': 'Jo'}, options)
+
+    assert first == second
+    assert first[0:2] == ('Hello', 'Same for all')
+    assert '<!DOCTYPE html' in first[2]
+    assert html_template.call_count == 1
+
+
+def test_render_email_renders_personalised_emails_every_time(notify_db_session, mocker):
+    html_template = mocker.patch('app.delivery.send_to_providers.HTMLEmailTemplate', wraps=HTMLEmailTemplate)
+    template_dict = {
+        'id': str(uuid.uuid4()), 'version': 1, 'template_type': 'email', 'subject': 'Hello', 'content': 'Hi ((name))'
+    }
+    options = {'govuk_banner': True, 'brand_banner': False}
+
+    assert send_to_providers.render_email(template_dict, {'name': 'Jo'}, options)[1] == 'Hi Jo'
+    assert send_to_providers.render_email(template_dict, {'name': 'Sam'}, options)[1] == 'Hi Sam'
+    assert html_template.call_count == 2
+
+
 @pytest.mark.parametrize('base_url, expected_url', [
     # don't change localhost to prevent errors when testing locally
     ('http://localhost:6012', 'http://static-logos.notify.tools/filename.png'),
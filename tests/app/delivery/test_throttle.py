@@ -0,0 +1,95 @@
+import pytest
+
+from app.delivery.throttle import (
+    TAKE_TOKENS_SCRIPT,
+    ProviderThrottledException,
+    cache_key_for_provider_bucket,
+    wait_for_send_tokens
+)
+from tests.conftest import set_config_values
+
+
+@pytest.fixture
+def mock_redis(notify_api, mocker):
+    mocker.patch('app.delivery.throttle.redis_store.active', True)
+    return mocker.patch('app.delivery.throttle.redis_store.redis_store')
+
+
+def test_wait_for_send_tokens_takes_tokens_from_the_providers_bucket(notify_api, mock_redis, mocker):
+    mock_redis.register_script.return_value.return_value = b'0'
+    sleep = mocker.patch('app.delivery.throttle.time.sleep')
+
+    with set_config_values(notify_api, {
+        'PROVIDER_SEND_RATE_PER_SECOND': {'mmg': 20},
+        'PROVIDER_THROTTLE_MAX_WAIT_SECONDS': 5,
+    }):
+        wait_for_send_tokens('mmg', 3)
+
+    mock_redis.register_script.assert_called_once_with(TAKE_TOKENS_SCRIPT)
+    mock_redis.register_script.return_value.assert_called_once_with(
+        keys=[cache_key_for_provider_bucket('mmg')],
+        args=[3, 5, 20]
+    )
+    assert not sleep.called
+
+
+def test_wait_for_send_tokens_sleeps_until_tokens_are_due(notify_api, mock_redis, mocker):
+    mock_redis.register_script.return_value.return_value = b'0.25'
+    sleep = mocker.patch('app.delivery.throttle.time.sleep')
+
+    wait_for_send_tokens('mmg')
+
+    sleep.assert_called_once_with(0.25)
+
+
+def test_wait_for_send_tokens_takes_bulk_sends_from_both_buckets_at_once(notify_api, mock_redis, mocker):
+    mock_redis.register_script.return_value.return_value = b'0.5'
+    sleep = mocker.patch('app.delivery.throttle.time.sleep')
+
+    with set_config_values(notify_api, {
+        'PROVIDER_SEND_RATE_PER_SECOND': {'mmg': 20},
+        'PROVIDER_BULK_SEND_RATE_SHARE': 0.5,
+        'PROVIDER_THROTTLE_MAX_WAIT_SECONDS': 5,
+    }):
+        wait_for_send_tokens('mmg', 10, bulk=True)
+
+    mock_redis.register_script.return_value.assert_called_once_with(
+        keys=[cache_key_for_provider_bucket('mmg', bulk=True), cache_key_for_provider_bucket('mmg')],
+        args=[10, 5, 10, 20]
+    )
+    sleep.assert_called_once_with(0.5)
+
+
+def test_wait_for_send_tokens_raises_rather_than_waiting_too_long(notify_api, mock_redis, mocker):
+    mock_redis.register_script.return_value.return_value = b'-1'
+    sleep = mocker.patch('app.delivery.throttle.time.sleep')
+
+    with pytest.raises(ProviderThrottledException):
+        wait_for_send_tokens('mmg')
+
+    assert not sleep.called
+
+
+def test_wait_for_send_tokens_does_nothing_for_providers_without_a_rate(notify_api, mock_redis):
+    with set_config_values(notify_api, {'PROVIDER_SEND_RATE_PER_SECOND': {}}):
+        wait_for_send_tokens('mmg')
+
+    assert not mock_redis.register_script.called
+
+
+def test_wait_for_send_tokens_does_nothing_if_redis_not_enabled(notify_api, mocker):
+    mocker.patch('app.delivery.throttle.redis_store.active', False)
+    mock_redis = mocker.patch('app.delivery.throttle.redis_store.redis_store')
+
+    wait_for_send_tokens('mmg')
+
+    assert not mock_redis.register_script.called
+
+
+def test_wait_for_send_tokens_does_not_throttle_on_redis_error(notify_api, mock_redis, mocker):
+    mock_redis.register_script.return_value.side_effect = Exception('Redis down')
+    sleep = mocker.patch('app.delivery.throttle.time.sleep')
+
+    wait_for_send_tokens('mmg')
+
+    assert not sleep.called
@@ -487,6 +487,28 @@ def test_get_all_notifications_for_job_returns_correct_format(
     assert resp['notifications'][0]['status'] == sample_notification_with_job.status
 
 
+def test_export_notifications_for_job_in_order_of_row_number(
+    client, notify_db, notify_db_session, sample_job
+):
+    for row_number in [2, 0, 1]:
+        create_notification(
+            notify_db,
+            notify_db_session,
+            job=sample_job,
+            job_row_number=row_number,
+            to_field='row {}'.format(row_number)
+        )
+
+    response = client.get(
+        path='/service/{}/job/{}/notifications/export'.format(sample_job.service_id, sample_job.id),
+        headers=[create_authorization_header()]
+    )
+
+    assert response.status_code == 200
+    lines = response.get_data(as_text=True).splitlines()
+    assert [line.split(',')[:2] for line in lines[1:]] == [['1', 'row 0'], ['2', 'row 1'], ['3', 'row 2']]
+
+
 def test_get_job_by_id(notify_api, sample_job):
     job_id = str(sample_job.id)
     service_id = sample_job.service.id
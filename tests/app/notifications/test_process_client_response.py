@@ -1,9 +1,15 @@
+import json
 import uuid
 
 from app.notifications.process_client_response import (
+    apply_status_updates,
+    buffer_status_update,
+    return_status_updates_to_buffer,
     validate_callback_data,
     process_sms_client_response
 )
+from tests.app.db import create_notification
+from tests.conftest import set_config
 
 
 def test_validate_callback_data_returns_none_when_valid():
@@ -94,3 +100,90 @@ def test_process_sms_response_returns_error_for_unknown_status(mocker):
     assert success is None
     assert error == "{} callback failed: status {} not found.".format('Firetext', '000')
     stats_mock.assert_not_called()
+
+
+def test_process_sms_response_buffers_the_update_if_redis_is_enabled(notify_api, mocker):
+    mocker.patch('app.notifications.process_client_response.redis_store.active', True)
+    mock_redis = mocker.patch('app.notifications.process_client_response.redis_store.redis_store')
+    mock_redis.rpush.return_value = 1
+    send_task = mocker.patch('app.notifications.process_client_response.notify_celery.send_task')
+    update_mock = mocker.patch(
+        'app.notifications.process_client_response.notifications_dao.update_notification_status_by_id'
+    )
+    reference = str(uuid.uuid4())
+
+    success, error = process_sms_client_response(status='3', reference=reference, client_name='MMG')
+
+    assert success == "MMG callback succeeded. reference {} queued".format(reference)
+    assert error is None
+    assert not update_mock.called
+    assert json.loads(mock_redis.rpush.call_args[0][1]) == {
+        'client_name': 'MMG', 'status': 'delivered', 'notification_id': reference, 'reference': None
+    }
+    send_task.assert_called_once_with(name='process-status-updates', queue='database-tasks', countdown=0.3)
+
+
+def test_buffer_status_update_only_schedules_a_task_for_an_empty_buffer(notify_api, mocker):
+    mocker.patch('app.notifications.process_client_response.redis_store.active', True)
+    mock_redis = mocker.patch('app.notifications.process_client_response.redis_store.redis_store')
+    mock_redis.rpush.return_value = 2
+    send_task = mocker.patch('app.notifications.process_client_response.notify_celery.send_task')
+
+    assert buffer_status_update('SES', 'delivered', reference='ref')
+
+    assert not send_task.called
+
+
+def test_buffer_status_update_returns_false_if_redis_is_not_enabled(notify_api, mocker):
+    mocker.patch('app.notifications.process_client_response.redis_store.active', False)
+    mock_redis = mocker.patch('app.notifications.process_client_response.redis_store.redis_store')
+
+    assert not buffer_status_update('SES', 'delivered', reference='ref')
+
+    assert not mock_redis.rpush.called
+
+
+def test_apply_status_updates_updates_notifications_and_records_job_outcomes(
+    sample_template, sample_email_template, sample_job, mocker
+):
+    stats_mock = mocker.patch('app.notifications.process_client_response.create_outcome_job_statistic_tasks')
+    sms = create_notification(sample_template, job=sample_job, status='sending')
+    email = create_notification(sample_email_template, status='sending', reference='ses-ref')
+
+    apply_status_updates([
+        {'client_name': 'MMG', 'status': 'delivered', 'notification_id': str(sms.id), 'reference': None},
+        {'client_name': 'SES', 'status': 'permanent-failure', 'notification_id': None, 'reference': 'ses-ref'},
+        {'client_name': 'SES', 'status': 'delivered', 'notification_id': None, 'reference': 'unknown'},
+    ])
+
+    assert sms.status == 'delivered'
+    assert email.status == 'permanent-failure'
+    assert {(row.id, row.status) for row in stats_mock.call_args[0][0]} == {
+        (sms.id, 'delivered'), (email.id, 'permanent-failure')
+    }
+
+
+def test_return_status_updates_to_buffer_puts_them_back_at_the_front_in_order(notify_api, mocker):
+    mock_redis = mocker.patch('app.notifications.process_client_response.redis_store.redis_store')
+    first = {'client_name': 'SES', 'status': 'delivered', 'notification_id': None, 'reference': 'first'}
+    second = dict(first, reference='second', attempts=1)
+
+    return_status_updates_to_buffer([first, second])
+
+    key, *values = mock_redis.lpush.call_args[0]
+    assert key == 'notification-status-updates'
+    assert [json.loads(value) for value in values] == [dict(second, attempts=2), dict(first, attempts=1)]
+    assert not mock_redis.rpush.called
+
+
+def test_return_status_updates_to_buffer_moves_updates_that_keep_failing_to_the_dead_letter_list(notify_api, mocker):
+    mock_redis = mocker.patch('app.notifications.process_client_response.redis_store.redis_store')
+    update = {'client_name': 'SES', 'status': 'delivered', 'notification_id': None, 'reference': 'ref', 'attempts': 4}
+
+    with set_config(notify_api, 'STATUS_UPDATE_MAX_ATTEMPTS', 5):
+        return_status_updates_to_buffer([update])
+
+    key, value = mock_redis.rpush.call_args[0]
+    assert key == 'notification-status-updates-dead-letter'
+    assert json.loads(value) == dict(update, attempts=5)
+    assert not mock_redis.lpush.called
@@ -17,8 +17,12 @@ from app.models import (
     Template
 )
 from app.notifications.process_notifications import (
+    INCREMENT_CACHED_COUNTS_SCRIPT,
+    build_notification,
     create_content_for_notification,
+    increment_cached_counts,
     persist_notification,
+    persist_notifications,
     persist_email_reply_to_id_for_notification,
     persist_scheduled_notification,
     persist_sms_sender_id_for_notification,
@@ -58,7 +62,7 @@ def test_create_content_for_notification_allows_additional_personalisation(sampl
 
 @freeze_time("2016-01-01 11:09:00.061258")
 def test_persist_notification_creates_and_save_to_db(sample_template, sample_api_key, sample_job, mocker):
-    mocked_redis = mocker.patch('app.notifications.process_notifications.redis_store.get')
+    mocked_increment = mocker.patch('app.notifications.process_notifications.increment_cached_counts')
 
     assert Notification.query.count() == 0
     assert NotificationHistory.query.count() == 0
@@ -98,7 +102,7 @@ def test_persist_notification_creates_and_save_to_db(sample_template, sample_api
     assert notification_from_db.client_reference == notification_history_from_db.client_reference
     assert notification_from_db.created_by_id == notification_history_from_db.created_by_id
 
-    mocked_redis.assert_called_once_with(str(sample_template.service_id) + "-2016-01-01-count")
+    mocked_increment.assert_called_once_with(sample_template.service_id, [sample_template.id])
 
 
 def test_persist_notification_throws_exception_when_missing_template(sample_api_key):
@@ -118,8 +122,7 @@ def test_persist_notification_throws_exception_when_missing_template(sample_api_
 
 
 def test_cache_is_not_incremented_on_failure_to_persist_notification(sample_api_key, mocker):
-    mocked_redis = mocker.patch('app.redis_store.get')
-    mock_service_template_cache = mocker.patch('app.redis_store.get_all_from_hash')
+    mocked_increment = mocker.patch('app.notifications.process_notifications.increment_cached_counts')
     with pytest.raises(SQLAlchemyError):
         persist_notification(template_id=None,
                              template_version=None,
@@ -129,8 +132,7 @@ def test_cache_is_not_incremented_on_failure_to_persist_notification(sample_api_
                              notification_type='sms',
                              api_key_id=sample_api_key.id,
                              key_type=sample_api_key.key_type)
-    mocked_redis.assert_not_called()
-    mock_service_template_cache.assert_not_called()
+    mocked_increment.assert_not_called()
 
 
 def test_persist_notification_does_not_increment_cache_if_test_key(
@@ -138,10 +140,7 @@ def test_persist_notification_does_not_increment_cache_if_test_key(
 ):
     api_key = create_api_key(notify_db=notify_db, notify_db_session=notify_db_session, service=sample_template.service,
                              key_type='test')
-    mocker.patch('app.notifications.process_notifications.redis_store.get', return_value="cache")
-    mocker.patch('app.notifications.process_notifications.redis_store.get_all_from_hash', return_value="cache")
-    daily_limit_cache = mocker.patch('app.notifications.process_notifications.redis_store.incr')
-    template_usage_cache = mocker.patch('app.notifications.process_notifications.redis_store.increment_hash_value')
+    mocked_increment = mocker.patch('app.notifications.process_notifications.increment_cached_counts')
 
     assert Notification.query.count() == 0
     assert NotificationHistory.query.count() == 0
@@ -161,17 +160,14 @@ def test_persist_notification_does_not_increment_cache_if_test_key(
 
     assert Notification.query.count() == 1
 
-    assert not daily_limit_cache.called
-    assert not template_usage_cache.called
+    assert not mocked_increment.called
 
 
 @freeze_time("2016-01-01 11:09:00.061258")
 def test_persist_notification_with_optionals(sample_job, sample_api_key, mocker):
     assert Notification.query.count() == 0
     assert NotificationHistory.query.count() == 0
-    mocked_redis = mocker.patch('app.notifications.process_notifications.redis_store.get')
-    mock_service_template_cache = mocker.patch(
-        'app.notifications.process_notifications.redis_store.get_all_from_hash')
+    mocked_increment = mocker.patch('app.notifications.process_notifications.increment_cached_counts')
     n_id = uuid.uuid4()
     created_at = datetime.datetime(2016, 11, 11, 16, 8, 18)
     persist_notification(
@@ -197,8 +193,7 @@ def test_persist_notification_with_optionals(sample_job, sample_api_key, mocker)
     persisted_notification.job_id == sample_job.id
     assert persisted_notification.job_row_number == 10
     assert persisted_notification.created_at == created_at
-    mocked_redis.assert_called_once_with(str(sample_job.service_id) + "-2016-01-01-count")
-    mock_service_template_cache.assert_called_once_with(cache_key_for_service_template_counter(sample_job.service_id))
+    mocked_increment.assert_called_once_with(sample_job.service_id, [sample_job.template.id])
     assert persisted_notification.client_reference == "ref from client"
     assert persisted_notification.reference is None
     assert persisted_notification.international is False
@@ -207,41 +202,81 @@ def test_persist_notification_with_optionals(sample_job, sample_api_key, mocker)
     assert persisted_notification.created_by_id == sample_job.created_by_id
 
 
+def test_persist_notifications_increments_cached_counts_once_per_service(
+    sample_template, sample_email_template, sample_job, mocker
+):
+    mocked_increment = mocker.patch('app.notifications.process_notifications.increment_cached_counts')
+    notifications = [
+        build_notification(
+            template_id=template.id,
+            template_version=template.version,
+            recipient=recipient,
+            service=template.service,
+            personalisation={},
+            notification_type=template.template_type,
+            api_key_id=None,
+            key_type='normal',
+            job_id=sample_job.id
+        )
+        for template, recipient in [
+            (sample_template, '+447111111111'),
+            (sample_email_template, 'test@example.gov.uk'),
+            (sample_template, '+447111111122'),
+        ]
+    ]
+
+    persisted = persist_notifications(notifications)
+
+    assert persisted == notifications
+    assert Notification.query.count() == 3
+    mocked_increment.assert_called_once_with(
+        sample_template.service_id, [sample_template.id, sample_email_template.id, sample_template.id]
+    )
+
+
 @freeze_time("2016-01-01 11:09:00.061258")
-def test_persist_notification_increments_cache_if_key_exists(sample_template, sample_api_key, mocker):
-    mock_incr = mocker.patch('app.notifications.process_notifications.redis_store.incr')
-    mock_incr_hash_value = mocker.patch('app.notifications.process_notifications.redis_store.increment_hash_value')
+def test_increment_cached_counts_runs_one_script_for_all_counts(notify_api, mocker):
+    mocker.patch('app.notifications.process_notifications.redis_store.active', True)
+    mock_redis = mocker.patch('app.notifications.process_notifications.redis_store.redis_store')
+    mock_register_script = mock_redis.register_script
+    service_id = uuid.uuid4()
+    template_1, template_2 = uuid.uuid4(), uuid.uuid4()
 
-    persist_notification(
-        template_id=sample_template.id,
-        template_version=sample_template.version,
-        recipient='+447111111111',
-        service=sample_template.service,
-        personalisation={},
-        notification_type='sms',
-        api_key_id=sample_api_key.id,
-        key_type=sample_api_key.key_type,
-        reference="ref"
-    )
-    mock_incr.assert_not_called()
-    mock_incr_hash_value.assert_not_called()
+    increment_cached_counts(service_id, [template_1, template_2, template_1])
 
-    mocker.patch('app.notifications.process_notifications.redis_store.get', return_value=1)
-    mocker.patch('app.notifications.process_notifications.redis_store.get_all_from_hash',
-                 return_value={sample_template.id, 1})
-    persist_notification(
-        template_id=sample_template.id,
-        template_version=sample_template.version,
-        recipient='+447111111122',
-        service=sample_template.service,
-        personalisation={},
-        notification_type='sms',
-        api_key_id=sample_api_key.id,
-        key_type=sample_api_key.key_type,
-        reference="ref2")
-    mock_incr.assert_called_once_with(str(sample_template.service_id) + "-2016-01-01-count", )
-    mock_incr_hash_value.assert_called_once_with(cache_key_for_service_template_counter(sample_template.service_id),
-                                                 sample_template.id)
+    mock_register_script.assert_called_once_with(INCREMENT_CACHED_COUNTS_SCRIPT)
+    script_call = mock_register_script.return_value.call_args[1]
+    assert script_call['keys'] == [
+        str(service_id) + "-2016-01-01-count",
+        cache_key_for_service_template_counter(service_id)
+    ]
+    assert script_call['args'][0] == 3
+    assert dict(zip(script_call['args'][1::2], script_call['args'][2::2])) == {
+        str(template_1): 2,
+        str(template_2): 1
+    }
+
+
+def test_increment_cached_counts_does_nothing_if_redis_not_enabled(notify_api, mocker):
+    mocker.patch('app.notifications.process_notifications.redis_store.active', False)
+    mock_redis = mocker.patch('app.notifications.process_notifications.redis_store.redis_store')
+    mock_register_script = mock_redis.register_script
+
+    increment_cached_counts(uuid.uuid4(), [uuid.uuid4()])
+
+    assert not mock_register_script.called
+
+
+def test_increment_cached_counts_logs_and_does_not_raise_on_redis_error(notify_api, mocker):
+    mocker.patch('app.notifications.process_notifications.redis_store.active', True)
+    mock_redis = mocker.patch('app.notifications.process_notifications.redis_store.redis_store')
+    mock_register_script = mock_redis.register_script
+    mock_register_script.return_value.side_effect = Exception('redis is down')
+    mock_logger = mocker.patch('app.notifications.process_notifications.current_app.logger.exception')
+
+    increment_cached_counts(uuid.uuid4(), [uuid.uuid4()])
+
+    assert mock_logger.called
 
 
 @pytest.mark.parametrize('research_mode, requested_queue, expected_queue, notification_type, key_type',
@@ -9,9 +9,11 @@ from flask import url_for, current_app
 from freezegun import freeze_time
 
 from app.celery.scheduled_tasks import daily_stats_template_usage_by_month
+from app.dao.fact_notification_status_dao import update_fact_notification_status
 from app.dao.services_dao import dao_remove_user_from_service
 from app.dao.templates_dao import dao_redact_template
 from app.dao.users_dao import save_model_user
+from app.utils import convert_utc_to_bst
 from app.models import (
     User, Organisation, Service, ServicePermission, Notification,
     ServiceEmailReplyTo, ServiceLetterContact,
@@ -1393,6 +1395,51 @@ def test_get_all_notifications_for_service_in_order(notify_api, notify_db, notif
         assert response.status_code == 200
 
 
+def test_export_notifications_for_service_as_csv(client, notify_db, notify_db_session, sample_template):
+    with freeze_time('2017-11-27 10:00'):
+        older = create_notification(sample_template, to_field='07700900001', normalised_to='447700900001')
+    with freeze_time('2017-11-27 11:00'):
+        newer = create_notification(sample_template, to_field='07700900002', normalised_to='447700900002')
+    create_notification(create_template(create_service(service_name='other service')))
+
+    response = client.get(
+        path='/service/{}/notifications/export'.format(sample_template.service_id),
+        headers=[create_authorization_header()]
+    )
+
+    assert response.status_code == 200
+    assert response.mimetype == 'text/csv'
+    lines = response.get_data(as_text=True).splitlines()
+    assert lines[0] == 'row_number,recipient,template_name,template_type,job_name,status,created_at'
+    assert [line.split(',')[1] for line in lines[1:]] == [newer.to, older.to]
+
+
+def test_export_notifications_for_service_as_ndjson(client, sample_template):
+    notification = create_notification(sample_template, status='delivered')
+
+    response = client.get(
+        path='/service/{}/notifications/export?format=ndjson'.format(sample_template.service_id),
+        headers=[create_authorization_header()]
+    )
+
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert rows == [notification.serialize_for_csv()]
+
+
+def test_export_notifications_for_service_rejects_unknown_format(client, sample_template):
+    response = client.get(
+        path='/service/{}/notifications/export?format=xlsx'.format(sample_template.service_id),
+        headers=[create_authorization_header()]
+    )
+
+    assert response.status_code == 400
+    assert json.loads(response.get_data(as_text=True))['message'] == {
+        'format': ['xlsx is not one of [csv, ndjson]']
+    }
+
+
 def test_get_notification_for_service_without_uuid(client, notify_db, notify_db_session):
     service_1 = create_service(service_name="1", email_from='1')
     response = client.get(
@@ -1591,6 +1638,7 @@ def test_get_detailed_service(notify_db, notify_db_session, notify_api, sample_s
             create_sample_notification(notify_db, notify_db_session, status='delivered')
         with freeze_time('2000-01-02T12:00:00'):
             create_sample_notification(notify_db, notify_db_session, status='created')
+            update_fact_notification_status(date(2000, 1, 1))
             resp = client.get(
                 '/service/{}?detailed=True&today_only={}'.format(sample_service.id, today_only),
                 headers=[create_authorization_header()]
@@ -1775,8 +1823,9 @@ def test_get_detailed_services_includes_services_with_no_notifications(notify_db
 def test_get_detailed_services_only_includes_todays_notifications(notify_db, notify_db_session):
     from app.service.rest import get_detailed_services
 
-    create_sample_notification(notify_db, notify_db_session, created_at=datetime(2015, 10, 9, 23, 59))
-    create_sample_notification(notify_db, notify_db_session, created_at=datetime(2015, 10, 10, 0, 0))
+    # today is the day in London, which started at 23:00 UTC
+    create_sample_notification(notify_db, notify_db_session, created_at=datetime(2015, 10, 9, 22, 59))
+    create_sample_notification(notify_db, notify_db_session, created_at=datetime(2015, 10, 9, 23, 0))
     create_sample_notification(notify_db, notify_db_session, created_at=datetime(2015, 10, 10, 12, 0))
 
     with freeze_time('2015-10-10T12:00:00'):
@@ -1806,6 +1855,8 @@ def test_get_detailed_services_for_date_range(notify_db, notify_db_session, set_
 
         start_date = (datetime.utcnow() - timedelta(days=2)).date()
         end_date = (datetime.utcnow() - timedelta(days=1)).date()
+        for days_ago in range(1, 5):
+            update_fact_notification_status(convert_utc_to_bst(datetime.utcnow()).date() - timedelta(days=days_ago))
 
     data = get_detailed_services(only_active=False, include_from_test_key=True,
                                  start_date=start_date, end_date=end_date)
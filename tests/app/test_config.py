@@ -63,13 +63,14 @@ def test_cloudfoundry_config_has_different_defaults():
 def test_queue_names_all_queues_correct():
     # Need to ensure that all_queues() only returns queue names used in API
     queues = QueueNames.all_queues()
-    assert len(queues) == 10
+    assert len(queues) == 11
     assert set([
         QueueNames.PRIORITY,
         QueueNames.PERIODIC,
         QueueNames.DATABASE,
         QueueNames.SEND_SMS,
         QueueNames.SEND_EMAIL,
+        QueueNames.SEND_BULK,
         QueueNames.RESEARCH_MODE,
         QueueNames.STATISTICS,
         QueueNames.JOBS,
@@ -1,7 +1,9 @@
-from datetime import datetime
+from datetime import date, datetime
 import pytest
 
 from app.utils import (
+    ExpiringLRUCache,
+    get_london_day_bounds_in_utc,
     get_london_midnight_in_utc,
     get_midnight_for_day_before,
     convert_utc_to_bst,
@@ -17,6 +19,16 @@ def test_get_london_midnight_in_utc_returns_expected_date(date, expected_date):
     assert get_london_midnight_in_utc(date) == expected_date
 
 
+@pytest.mark.parametrize('day, expected_bounds', [
+    (date(2016, 1, 15), (datetime(2016, 1, 15, 0, 0), datetime(2016, 1, 16, 0, 0))),
+    (date(2016, 6, 15), (datetime(2016, 6, 14, 23, 0), datetime(2016, 6, 15, 23, 0))),
+    (date(2017, 3, 26), (datetime(2017, 3, 26, 0, 0), datetime(2017, 3, 26, 23, 0))),    # 2017 BST switchover
+    (date(2017, 10, 29), (datetime(2017, 10, 28, 23, 0), datetime(2017, 10, 30, 0, 0))),
+])
+def test_get_london_day_bounds_in_utc_returns_expected_bounds(day, expected_bounds):
+    assert get_london_day_bounds_in_utc(day) == expected_bounds
+
+
 @pytest.mark.parametrize('date, expected_date', [
     (datetime(2016, 1, 15, 0, 30), datetime(2016, 1, 14, 0, 0)),
     (datetime(2016, 7, 15, 0, 0), datetime(2016, 7, 13, 23, 0)),
@@ -44,3 +56,48 @@ def test_convert_bst_to_utc():
     bst_datetime = datetime.strptime(bst, "%Y-%m-%d %H:%M")
     utc = convert_bst_to_utc(bst_datetime)
     assert utc == datetime(2017, 5, 12, 12, 15)
+
+
+def test_expiring_lru_cache_returns_values_until_they_expire(mocker):
+    mock_monotonic = mocker.patch('app.utils.monotonic', return_value=100)
+    cache = ExpiringLRUCache(max_size=10)
+    cache.set('key', 'value', ttl=30)
+
+    mock_monotonic.return_value = 129
+    assert cache.get('key') == 'value'
+
+    mock_monotonic.return_value = 130
+    assert cache.get('key') is None
+
+
+def test_expiring_lru_cache_evicts_least_recently_used():
+    cache = ExpiringLRUCache(max_size=2)
+    cache.set('a', 1, ttl=30)
+    cache.set('b', 2, ttl=30)
+    cache.get('a')
+    cache.set('c', 3, ttl=30)
+
+    assert cache.get('a') == 1
+    assert cache.get('b') is None
+    assert cache.get('c') == 3
+
+
+def test_expiring_lru_cache_does_not_store_values_with_no_ttl():
+    cache = ExpiringLRUCache(max_size=2)
+    cache.set('a', 1, ttl=0)
+
+    assert cache.get('a') is None
+
+
+def test_expiring_lru_cache_delete_and_clear():
+    cache = ExpiringLRUCache(max_size=2)
+    cache.set('a', 1, ttl=30)
+    cache.set('b', 2, ttl=30)
+
+    cache.delete('a')
+    cache.delete('not-there')
+    assert cache.get('a') is None
+    assert cache.get('b') == 2
+
+    cache.clear()
+    assert cache.get('b') is None
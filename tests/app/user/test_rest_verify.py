@@ -200,7 +200,7 @@ def test_send_user_sms_code(client,
 
     app.celery.provider_tasks.deliver_sms.apply_async.assert_called_once_with(
         ([str(notification.id)]),
-        queue="notify-internal-tasks"
+        queue="priority-tasks"
     )
 
 
@@ -228,7 +228,7 @@ def test_send_user_code_for_sms_with_optional_to_field(client,
     assert notification.to == to_number
     app.celery.provider_tasks.deliver_sms.apply_async.assert_called_once_with(
         ([str(notification.id)]),
-        queue="notify-internal-tasks"
+        queue="priority-tasks"
     )
 
 
@@ -359,7 +359,7 @@ def test_send_user_email_code(admin_request, mocker, sample_user, email_2fa_code
     assert noti.personalisation['name'] == 'Test User'
     deliver_email.assert_called_once_with(
         [str(noti.id)],
-        queue='notify-internal-tasks'
+        queue='priority-tasks'
     )
 
 
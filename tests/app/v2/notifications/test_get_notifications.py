@@ -1,9 +1,11 @@
 import datetime
 import pytest
 from flask import json, url_for
+from freezegun import freeze_time
 
 from app import DATETIME_FORMAT
 from tests import create_authorization_header
+from tests.conftest import set_config
 from tests.app.db import (
     create_notification,
     create_template,
@@ -547,6 +549,74 @@ def test_get_all_notifications_filter_by_id_no_notifications_if_last_notificatio
     assert len(json_response['notifications']) == 0
 
 
+def test_get_all_notifications_next_link_pages_with_a_cursor(client, notify_api, sample_template):
+    with freeze_time('2017-11-27 10:00:00'):
+        oldest = create_notification(template=sample_template)
+    with freeze_time('2017-11-27 11:00:00'):
+        middle = create_notification(template=sample_template)
+    with freeze_time('2017-11-27 12:00:00'):
+        newest = create_notification(template=sample_template)
+
+    auth_header = create_authorization_header(service_id=sample_template.service_id)
+    with set_config(notify_api, 'API_PAGE_SIZE', 2):
+        response = client.get(path='/v2/notifications', headers=[auth_header])
+        first_page = json.loads(response.get_data(as_text=True))
+
+        assert [n['id'] for n in first_page['notifications']] == [str(newest.id), str(middle.id)]
+        assert 'cursor=' in first_page['links']['next']
+
+        response = client.get(path=first_page['links']['next'], headers=[auth_header])
+        second_page = json.loads(response.get_data(as_text=True))
+
+    assert response.status_code == 200
+    assert [n['id'] for n in second_page['notifications']] == [str(oldest.id)]
+
+
+def test_get_all_notifications_next_link_still_has_older_than(client, notify_api, sample_template):
+    with freeze_time('2017-11-27 10:00:00'):
+        create_notification(template=sample_template)
+    with freeze_time('2017-11-27 11:00:00'):
+        newest = create_notification(template=sample_template)
+
+    auth_header = create_authorization_header(service_id=sample_template.service_id)
+    with set_config(notify_api, 'API_PAGE_SIZE', 1):
+        response = client.get(path='/v2/notifications', headers=[auth_header])
+
+    json_response = json.loads(response.get_data(as_text=True))
+    assert 'older_than={}'.format(newest.id) in json_response['links']['next']
+    assert 'cursor=' in json_response['links']['next']
+
+
+def test_get_all_notifications_cursor_breaks_ties_on_created_at_by_id(client, notify_api, sample_template):
+    with freeze_time('2017-11-27 10:00:00'):
+        notifications = sorted(
+            [create_notification(template=sample_template) for _ in range(3)],
+            key=lambda notification: str(notification.id),
+            reverse=True
+        )
+
+    auth_header = create_authorization_header(service_id=sample_template.service_id)
+    with set_config(notify_api, 'API_PAGE_SIZE', 1):
+        seen = []
+        path = '/v2/notifications'
+        for _ in notifications:
+            response = json.loads(client.get(path=path, headers=[auth_header]).get_data(as_text=True))
+            seen += [n['id'] for n in response['notifications']]
+            path = response['links']['next']
+
+    assert seen == [str(notification.id) for notification in notifications]
+
+
+def test_get_all_notifications_invalid_cursor(client, sample_notification):
+    auth_header = create_authorization_header(service_id=sample_notification.service_id)
+    response = client.get(path='/v2/notifications?cursor=not-a-cursor', headers=[auth_header])
+
+    json_response = json.loads(response.get_data(as_text=True))
+
+    assert response.status_code == 400
+    assert json_response['errors'][0]['message'] == "cursor is not valid"
+
+
 def test_get_all_notifications_filter_multiple_query_parameters(client, sample_email_template):
     # this is the notification we are looking for
     older_notification = create_notification(
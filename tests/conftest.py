@@ -10,6 +10,10 @@ import pytest
 import sqlalchemy
 
 from app import create_app, db
+from app.dao.provider_details_dao import provider_routing_cache
+from app.dao.services_dao import service_api_keys_cache
+from app.dao.templates_dao import template_version_cache
+from app.delivery.send_to_providers import html_email_options_cache, rendered_email_cache
 
 
 @pytest.fixture(scope='session')
@@ -96,6 +100,11 @@ def notify_db(notify_api, worker_id):
 def notify_db_session(notify_db):
     yield notify_db
 
+    service_api_keys_cache.clear()
+    template_version_cache.clear()
+    provider_routing_cache.clear()
+    html_email_options_cache.clear()
+    rendered_email_cache.clear()
     notify_db.session.remove()
     for tbl in reversed(notify_db.metadata.sorted_tables):
         if tbl.name not in ["provider_details",